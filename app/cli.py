@@ -0,0 +1,155 @@
+"""
+Command line entry point for indexing jobs.
+
+    python -m app.cli index --csv data/data.csv --stream --chunk-size 5000
+    python -m app.cli index --write-staging data/staged.arrow
+    python -m app.cli index --from-staging data/staged.arrow
+    python -m app.cli vector-index --from-staging data/staged.arrow
+    python -m app.cli autocomplete
+    python -m app.cli export-onnx
+    python -m app.cli embedding-server --backend onnx_int8
+    python -m app.cli shard-sizing --documents 5000000 --document-kb 12
+    python -m app.cli replay-dead-letters
+"""
+import argparse
+
+from app.config import DATA_CSV_PATH, INDEX_NAME, BULK_DEAD_LETTER_PATH, EMBEDDING_ONNX_PATH, EMBEDDING_SERVER_ADDRESS, EMBEDDING_SERVER_BACKEND
+from app.elasticsearch.bulk import replay_dead_letters
+from app.elasticsearch.index import (
+    alias_exists,
+    build_index,
+    build_vector_index_from_staging,
+    incremental_index_documents,
+    get_index_sizing,
+    recommend_shard_count
+)
+from app.services.autocomplete import AutocompleteBuilder
+from app.services.embedding_backends import BACKEND_NAMES, export_onnx, serve_embeddings
+
+def index_command(args):
+    """
+    Build a new index version and swap the alias, or update the live index in place
+    """
+    if args.incremental and args.from_staging:
+        print("--incremental cannot be combined with --from-staging.")
+        return
+    
+    if args.incremental and alias_exists():
+        report = incremental_index_documents(args.csv)
+        print(f"Indexing complete. Added: {report['added']}, Updated: {report['updated']}, "
+              f"Unchanged: {report['unchanged']}, Deleted: {report['deleted']}, Failed: {report['failed']}")
+        return
+    
+    if args.incremental:
+        print(f"Index alias '{INDEX_NAME}' not found, running a full build.")
+    
+    report = build_index(args.csv, stream=args.stream, chunk_size=args.chunk_size, thread_count=args.threads,
+                         write_staging=args.write_staging, from_staging=args.from_staging)
+    print(f"Indexing complete. Index: {report['index']}, "
+          f"Successfully indexed: {report['indexed']}, Failed: {len(report['failed'])}")
+
+def vector_index_command(args):
+    """
+    Build the local vector index from a staging file, without Elasticsearch
+    """
+    build_vector_index_from_staging(args.from_staging)
+
+def autocomplete_command(args):
+    """
+    Rewrite the autocomplete file with the latest popular queries
+    """
+    builder = AutocompleteBuilder.load()
+    if builder is None:
+        print("Autocomplete not found, build it with `python -m app.cli index`.")
+        return
+    builder.save()
+
+def export_onnx_command(args):
+    """
+    Export the embedding model to ONNX (and an int8 copy) for the onnx backends
+    """
+    export_onnx(args.output, quantize=not args.no_int8)
+
+def embedding_server_command(args):
+    """
+    Run the shared model server used by EMBEDDING_BACKEND=remote
+    """
+    serve_embeddings(args.address, args.backend)
+
+def shard_sizing_command(args):
+    """
+    Recommend a primary shard count for a planned catalog, or for the live index
+    """
+    if args.documents:
+        sizing = recommend_shard_count(args.documents, args.document_kb * 1024)
+    else:
+        sizing = get_index_sizing()
+    
+    print(f"Documents: {sizing['documents']}, primary size: {sizing['primary_size_gb']} GB, "
+          f"kNN working set: {sizing['vector_memory_gb']} GB")
+    limited_by = f" (limited by {sizing['limited_by']})" if sizing["limited_by"] else ""
+    print(f"Recommended shards: {sizing['shards']}{limited_by}, {sizing['shard_size_gb']} GB and "
+          f"{sizing['shard_vector_memory_gb']} GB of vectors per shard")
+    print(f"Vector memory across the cluster with {sizing['replicas']} replica(s): "
+          f"{sizing['cluster_vector_memory_gb']} GB")
+
+def replay_dead_letters_command(args):
+    """
+    Send the documents that failed to index again
+    """
+    report = replay_dead_letters(args.path, args.threads)
+    if report is not None:
+        print(f"Replay complete. Indexed: {report['indexed']}, Failed: {report['failed']}, "
+              f"Kept for deleted or replaced indices: {report['skipped']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Amazon product search admin commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    index_parser = subparsers.add_parser("index", help="Index products from a CSV file")
+    index_parser.add_argument("--csv", default=DATA_CSV_PATH, help="Path to the product review CSV")
+    index_parser.add_argument("--incremental", action="store_true",
+                              help="Only reindex products whose content changed (full build if the alias is missing)")
+    index_parser.add_argument("--stream", action="store_true", help="Stream the CSV in chunks with bounded memory")
+    index_parser.add_argument("--chunk-size", type=int, default=None, help="CSV rows per chunk in streaming mode")
+    index_parser.add_argument("--threads", type=int, default=None, help="Threads sending bulk requests")
+    index_parser.add_argument("--write-staging", metavar="PATH", help="Also write the embedded documents to a staging file")
+    index_parser.add_argument("--from-staging", metavar="PATH",
+                              help="Load embedded documents from a staging file instead of the CSV")
+    index_parser.set_defaults(func=index_command)
+    
+    vector_index_parser = subparsers.add_parser("vector-index", help="Build the local vector index from a staging file")
+    vector_index_parser.add_argument("--from-staging", metavar="PATH", required=True, help="Staging file to load")
+    vector_index_parser.set_defaults(func=vector_index_command)
+    
+    autocomplete_parser = subparsers.add_parser("autocomplete", help="Refresh popular queries in the autocomplete")
+    autocomplete_parser.set_defaults(func=autocomplete_command)
+    
+    export_parser = subparsers.add_parser("export-onnx", help="Export the embedding model to ONNX")
+    export_parser.add_argument("--output", default=EMBEDDING_ONNX_PATH, help="Path of the ONNX model")
+    export_parser.add_argument("--no-int8", action="store_true", help="Skip writing the int8 quantized copy")
+    export_parser.set_defaults(func=export_onnx_command)
+    
+    server_parser = subparsers.add_parser("embedding-server", help="Serve the embedding model to other processes")
+    server_parser.add_argument("--address", default=EMBEDDING_SERVER_ADDRESS, help="Unix socket path or host:port")
+    server_parser.add_argument("--backend", default=EMBEDDING_SERVER_BACKEND,
+                               choices=[name for name in BACKEND_NAMES if name != "remote"])
+    server_parser.set_defaults(func=embedding_server_command)
+    
+    sizing_parser = subparsers.add_parser("shard-sizing", help="Recommend a shard count")
+    sizing_parser.add_argument("--documents", type=int, default=None,
+                               help="Planned number of products (default: size the live index)")
+    sizing_parser.add_argument("--document-kb", type=float, default=10.0,
+                               help="Average on-disk size of a product, vectors included")
+    sizing_parser.set_defaults(func=shard_sizing_command)
+    
+    replay_parser = subparsers.add_parser("replay-dead-letters", help="Index the documents that failed to index again")
+    replay_parser.add_argument("--path", default=BULK_DEAD_LETTER_PATH, help="Dead-letter file to replay")
+    replay_parser.add_argument("--threads", type=int, default=None, help="Threads sending bulk requests")
+    replay_parser.set_defaults(func=replay_dead_letters_command)
+    
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,123 @@ ELASTICSEARCH_HOST = os.environ.get("ELASTICSEARCH_HOST", "localhost")
 ELASTICSEARCH_PORT = int(os.environ.get("ELASTICSEARCH_PORT", 9200))
 ELASTICSEARCH_USERNAME = os.environ.get("ELASTICSEARCH_USERNAME", "")
 ELASTICSEARCH_PASSWORD = os.environ.get("ELASTICSEARCH_PASSWORD", "")
+ES_CONNECTIONS_PER_NODE = int(os.environ.get("ES_CONNECTIONS_PER_NODE", 32))  # Async client connection pool size
+ES_REQUEST_TIMEOUT = float(os.environ.get("ES_REQUEST_TIMEOUT", 10))
+ES_MAX_RETRIES = int(os.environ.get("ES_MAX_RETRIES", 3))
 
 # Index settings
-INDEX_NAME = "amazon_products"
-EMBEDDING_DIMENSION = 384  # Default for sentence-transformers/all-MiniLM-L6-v2
\ No newline at end of file
+INDEX_NAME = "amazon_products"  # Alias pointing at the live amazon_products_v{n} index
+INDEX_NUMBER_OF_SHARDS = int(os.environ.get("INDEX_NUMBER_OF_SHARDS", 1))  # Primary shards of new index versions, see `app.cli shard-sizing`
+INDEX_NUMBER_OF_REPLICAS = int(os.environ.get("INDEX_NUMBER_OF_REPLICAS", 0))
+INDEX_ROUTING_FIELD = os.environ.get("INDEX_ROUTING_FIELD", "")  # Empty routes by _id, primary_category keeps a category on one shard
+INDEX_REQUEST_CACHE = os.environ.get("INDEX_REQUEST_CACHE", "true").lower() == "true"  # Shard request cache of new index versions
+REVIEW_INDEX_NAME = "amazon_reviews"  # Alias pointing at the live amazon_reviews_v{n} index
+REVIEW_INDEX_ENABLED = os.environ.get("REVIEW_INDEX_ENABLED", "false").lower() == "true"  # Serve full reviews from the review index
+INDEX_REFRESH_INTERVAL = os.environ.get("INDEX_REFRESH_INTERVAL", "1s")
+INDEX_KEEP_VERSIONS = int(os.environ.get("INDEX_KEEP_VERSIONS", 2))  # Old versions kept for rollback
+EMBEDDING_DIMENSION = 384  # Default for sentence-transformers/all-MiniLM-L6-v2
+
+# text_vector storage and kNN settings
+VECTOR_INDEX_TYPE = os.environ.get("VECTOR_INDEX_TYPE", "hnsw")  # hnsw or int8_hnsw (ES 8.12+, checked when an index is created)
+HNSW_M = int(os.environ.get("HNSW_M", 16))  # Neighbors per HNSW node
+HNSW_EF_CONSTRUCTION = int(os.environ.get("HNSW_EF_CONSTRUCTION", 100))  # Candidates considered while building the graph
+KNN_NUM_CANDIDATES = int(os.environ.get("KNN_NUM_CANDIDATES", 100))  # Default candidates per shard, overridable per request
+VECTOR_DECIMALS = int(os.environ["VECTOR_DECIMALS"]) if os.environ.get("VECTOR_DECIMALS") else None  # Round vectors sent to ES
+
+# Embedding settings
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 64))
+EMBEDDING_WORKERS = int(os.environ.get("EMBEDDING_WORKERS", 1))  # >1 starts a process pool
+EMBEDDING_EXECUTOR_WORKERS = int(os.environ.get("EMBEDDING_EXECUTOR_WORKERS", 2))  # Threads embedding queries for async handlers
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")  # torch, torch_int8, onnx, onnx_int8, remote or hash
+QUERY_BATCH_MAX_WAIT_MS = float(os.environ.get("QUERY_BATCH_MAX_WAIT_MS", 2))  # Micro-batching window for query embeddings, 0 disables it
+QUERY_BATCH_MAX_SIZE = int(os.environ.get("QUERY_BATCH_MAX_SIZE", 32))  # Queries that close a micro-batch early
+EMBEDDING_PRELOAD = os.environ.get("EMBEDDING_PRELOAD", "false").lower() == "true"  # Load the model at app startup instead of first use
+EMBEDDING_MAX_SEQ_LENGTH = int(os.environ.get("EMBEDDING_MAX_SEQ_LENGTH", 256))  # Tokens per text, longer texts are truncated
+EMBEDDING_ONNX_PATH = os.environ.get("EMBEDDING_ONNX_PATH", "data/onnx/all-MiniLM-L6-v2.onnx")  # Exported on first use
+EMBEDDING_SERVER_ADDRESS = os.environ.get("EMBEDDING_SERVER_ADDRESS", "data/embedding.sock")  # Unix socket path or host:port
+EMBEDDING_SERVER_AUTHKEY = os.environ.get("EMBEDDING_SERVER_AUTHKEY", "")  # Shared secret of server and clients, required for TCP
+EMBEDDING_SERVER_TIMEOUT = float(os.environ.get("EMBEDDING_SERVER_TIMEOUT", 30))  # Seconds a client waits for a reply
+EMBEDDING_SERVER_BACKEND = os.environ.get("EMBEDDING_SERVER_BACKEND", "torch")  # Backend the model server runs
+INDEX_BATCH_SIZE = int(os.environ.get("INDEX_BATCH_SIZE", 256))  # Documents embedded per call while indexing
+INDEX_CHUNK_SIZE = int(os.environ.get("INDEX_CHUNK_SIZE", 5000))  # CSV rows per chunk in streaming mode
+
+# Bulk ingestion settings
+BULK_THREAD_COUNT = int(os.environ.get("BULK_THREAD_COUNT", 2))  # Threads sending bulk requests
+BULK_CHUNK_BYTES = int(os.environ.get("BULK_CHUNK_BYTES", 5 * 1024 * 1024))  # Target bulk request size, halved on rejections
+BULK_MIN_CHUNK_BYTES = int(os.environ.get("BULK_MIN_CHUNK_BYTES", 256 * 1024))  # Smallest size rejections shrink requests to
+BULK_MAX_CHUNK_DOCS = int(os.environ.get("BULK_MAX_CHUNK_DOCS", 2000))  # Most actions per bulk request
+BULK_MAX_RETRIES = int(os.environ.get("BULK_MAX_RETRIES", 8))  # Retries of rejected (429) documents before dead-lettering
+BULK_INITIAL_BACKOFF = float(os.environ.get("BULK_INITIAL_BACKOFF", 0.5))  # Seconds, doubled per retry with full jitter
+BULK_MAX_BACKOFF = float(os.environ.get("BULK_MAX_BACKOFF", 30))  # Seconds
+BULK_DEAD_LETTER_PATH = os.environ.get("BULK_DEAD_LETTER_PATH", "data/dead_letters.jsonl")  # Permanently failed actions
+
+# Embedding cache settings
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", "data/embedding_cache.sqlite")  # Empty disables the disk cache
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", 100000))
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", 10000))  # In-process LRU for queries
+EMBEDDING_CACHE_TOUCH_SECONDS = float(os.environ.get("EMBEDDING_CACHE_TOUCH_SECONDS", 30))  # How often hit recency is written
+
+# Paging settings
+MAX_RESULT_WINDOW = int(os.environ.get("MAX_RESULT_WINDOW", 1000))  # Largest from + size, use cursor paging beyond it
+PIT_KEEP_ALIVE = os.environ.get("PIT_KEEP_ALIVE", "1m")  # How long a cursor stays valid between pages
+
+# Result payload settings
+REVIEW_PREVIEW_SIZE = int(os.environ.get("REVIEW_PREVIEW_SIZE", 3))  # Reviews stored per product for result previews
+REVIEW_PREVIEW_CHARS = int(os.environ.get("REVIEW_PREVIEW_CHARS", 300))  # Preview review text is cut to this length
+REVIEWS_PAGE_SIZE = int(os.environ.get("REVIEWS_PAGE_SIZE", 20))  # Default page size of the product reviews endpoint
+
+# Shard routing and sizing settings
+SEARCH_REQUEST_CACHE = os.environ.get("SEARCH_REQUEST_CACHE", "true").lower() == "true"  # Cache faceted and aggregation responses per shard
+SEARCH_PREFERENCE = os.environ.get("SEARCH_PREFERENCE", "")  # Empty for adaptive replica selection, "query" pins a query to the same shard copies, or an ES preference
+SHARD_TARGET_SIZE_GB = float(os.environ.get("SHARD_TARGET_SIZE_GB", 30))  # Largest recommended primary shard on disk
+SHARD_TARGET_VECTOR_GB = float(os.environ.get("SHARD_TARGET_VECTOR_GB", 4))  # Largest recommended kNN working set per shard
+SHARD_MAX_DOCUMENTS = int(os.environ.get("SHARD_MAX_DOCUMENTS", 200_000_000))  # Most documents recommended per shard
+
+# Facet settings
+FACET_SIZE = int(os.environ.get("FACET_SIZE", 20))  # Buckets per facet in faceted search
+FACET_OPTIONS_SIZE = int(os.environ.get("FACET_OPTIONS_SIZE", 1000))  # Values per filter in the sidebar
+FACET_WARM_ENTRIES = int(os.environ.get("FACET_WARM_ENTRIES", 100))  # Hottest facet counts recomputed after a reindex
+
+# Search result cache settings
+RESULT_CACHE_BACKEND = os.environ.get("RESULT_CACHE_BACKEND", "memory")  # memory, redis or none
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", 300))  # Seconds
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", 10000))  # In-process backend only
+RESULT_CACHE_VERSION_CHECK_SECONDS = float(os.environ.get("RESULT_CACHE_VERSION_CHECK_SECONDS", 5))
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+# Reciprocal Rank Fusion hybrid search settings
+HYBRID_RRF_RANK_CONSTANT = int(os.environ.get("HYBRID_RRF_RANK_CONSTANT", 60))
+HYBRID_RRF_WINDOW_SIZE = int(os.environ.get("HYBRID_RRF_WINDOW_SIZE", 50))  # Candidates fetched per retriever
+HYBRID_RRF_BM25_WEIGHT = float(os.environ.get("HYBRID_RRF_BM25_WEIGHT", 1.0))
+HYBRID_RRF_KNN_WEIGHT = float(os.environ.get("HYBRID_RRF_KNN_WEIGHT", 1.0))
+HYBRID_RRF_SERVER_SIDE = os.environ.get("HYBRID_RRF_SERVER_SIDE", "false").lower() == "true"  # Fuse in ES (8.8+), ignores weights
+
+# Local vector index settings
+SEMANTIC_BACKEND = os.environ.get("SEMANTIC_BACKEND", "elasticsearch")  # elasticsearch or local
+VECTOR_INDEX_PATH = os.environ.get("VECTOR_INDEX_PATH", "data/vector_index")
+VECTOR_INDEX_MODE = os.environ.get("VECTOR_INDEX_MODE", "exact")  # exact or ivf
+VECTOR_INDEX_NLIST = int(os.environ.get("VECTOR_INDEX_NLIST", 256))  # IVF lists
+VECTOR_INDEX_NPROBE = int(os.environ.get("VECTOR_INDEX_NPROBE", 16))  # IVF lists scanned per query
+
+# Autocomplete settings
+AUTOCOMPLETE_PATH = os.environ.get("AUTOCOMPLETE_PATH", "data/autocomplete.json")  # Built by the index command
+AUTOCOMPLETE_QUERIES_PATH = os.environ.get("AUTOCOMPLETE_QUERIES_PATH", "data/popular_queries.json")  # Query counts
+AUTOCOMPLETE_TOP_K = int(os.environ.get("AUTOCOMPLETE_TOP_K", 10))  # Suggestions precomputed per prefix
+AUTOCOMPLETE_PRECOMPUTED_PREFIX = int(os.environ.get("AUTOCOMPLETE_PRECOMPUTED_PREFIX", 4))  # Longest precomputed prefix
+AUTOCOMPLETE_MIN_QUERY_COUNT = int(os.environ.get("AUTOCOMPLETE_MIN_QUERY_COUNT", 3))  # Searches before a query is suggested
+AUTOCOMPLETE_MAX_TRACKED_QUERIES = int(os.environ.get("AUTOCOMPLETE_MAX_TRACKED_QUERIES", 10000))  # Distinct queries counted between saves
+AUTOCOMPLETE_MAX_SAVED_QUERIES = int(os.environ.get("AUTOCOMPLETE_MAX_SAVED_QUERIES", 100000))  # Most frequent queries kept in the counts file
+AUTOCOMPLETE_MAX_QUERY_LENGTH = int(os.environ.get("AUTOCOMPLETE_MAX_QUERY_LENGTH", 64))  # Longer queries are not counted
+AUTOCOMPLETE_QUERIES_FLUSH_SECONDS = float(os.environ.get("AUTOCOMPLETE_QUERIES_FLUSH_SECONDS", 60))  # How often counts are saved
+
+# Spelling correction settings
+SPELLING_PATH = os.environ.get("SPELLING_PATH", "data/spelling.json")  # Built by the index command, empty disables correction
+SPELLING_MAX_EDIT_DISTANCE = int(os.environ.get("SPELLING_MAX_EDIT_DISTANCE", 2))  # Most edits corrected per term
+SPELLING_PREFIX_LENGTH = int(os.environ.get("SPELLING_PREFIX_LENGTH", 7))  # Term prefix the delete dictionary is built from
+SPELLING_MIN_COUNT = int(os.environ.get("SPELLING_MIN_COUNT", 2))  # Occurrences before a term is added to the dictionary
+
+# Instrumentation settings
+SLOW_QUERY_LOG_MS = float(os.environ["SLOW_QUERY_LOG_MS"]) if os.environ.get("SLOW_QUERY_LOG_MS") else None  # Unset disables
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "false").lower() == "true"  # Never enable in production
+PROFILER = os.environ.get("PROFILER", "cprofile")  # cprofile or pyinstrument
@@ -0,0 +1,302 @@
+"""
+Parallel bulk ingestion with byte-sized requests, backoff on rejections and a
+dead-letter file for documents that cannot be indexed.
+"""
+import os
+import queue
+import random
+import re
+import threading
+import time
+
+import orjson
+from elasticsearch import ApiError, ConnectionError, ConnectionTimeout
+from elasticsearch.helpers import expand_action
+
+from app.elasticsearch.client import es_client
+from app.config import (
+    BULK_THREAD_COUNT,
+    BULK_CHUNK_BYTES,
+    BULK_MIN_CHUNK_BYTES,
+    BULK_MAX_CHUNK_DOCS,
+    BULK_MAX_RETRIES,
+    BULK_INITIAL_BACKOFF,
+    BULK_MAX_BACKOFF,
+    BULK_DEAD_LETTER_PATH
+)
+
+# Bulk item and request statuses that mean "try again later"
+RETRY_STATUSES = (429,)
+
+def get_alias_name(index_name):
+    """The alias a versioned {alias}_v{n} index is served under, or the name itself"""
+    match = re.fullmatch(r"(.+)_v\d+", index_name)
+    return match.group(1) if match else index_name
+
+def dumps(value):
+    """Serialize one bulk line; numpy vectors are written without a tolist() copy"""
+    return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+
+class BulkIngestor:
+    """
+    Send bulk requests from worker threads.
+
+    Each action is serialized once and packed into requests of about chunk_bytes,
+    so products with many reviews do not make oversized requests. The queue holds
+    at most two requests per thread, which blocks the producer while
+    Elasticsearch falls behind. Documents rejected with 429 are retried with
+    exponential backoff and full jitter; every rejection halves the request size
+    and successful requests grow it back. Documents that still fail are appended
+    to the dead-letter file, which replay_dead_letters sends again.
+
+        with BulkIngestor(thread_count=4) as ingestor:
+            ingestor.add_all(actions)
+        report = ingestor.report()
+    """
+
+    def __init__(self, client=None, thread_count=None, chunk_bytes=None, max_chunk_docs=None, max_retries=None,
+                 dead_letter_path=BULK_DEAD_LETTER_PATH):
+        self.client = client or es_client
+        self.thread_count = max(1, thread_count or BULK_THREAD_COUNT)
+        self.max_chunk_bytes = chunk_bytes or BULK_CHUNK_BYTES
+        self.chunk_bytes = self.max_chunk_bytes
+        self.max_chunk_docs = max_chunk_docs or BULK_MAX_CHUNK_DOCS
+        self.max_retries = BULK_MAX_RETRIES if max_retries is None else max_retries
+        self.dead_letter_path = dead_letter_path
+        self.stats = {"indexed": 0, "failed": 0, "rejected": 0, "retries": 0, "requests": 0, "bytes": 0}
+        self.errors = []
+        self._queue = queue.Queue(maxsize=2 * self.thread_count)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._chunk, self._chunk_size = [], 0
+        self._dead_letter = None
+        self._started = None
+        self._seconds = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        for _ in range(self.thread_count):
+            thread = threading.Thread(target=self._worker, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def add(self, action):
+        """Queue one action, as accepted by the elasticsearch.helpers bulk functions"""
+        meta, source = expand_action(action)
+        lines = [dumps(meta)] if source is None else [dumps(meta), dumps(source)]
+        size = sum(len(line) + 1 for line in lines)
+        with self._lock:
+            chunk_bytes = self.chunk_bytes
+        if self._chunk and (self._chunk_size + size > chunk_bytes or len(self._chunk) >= self.max_chunk_docs):
+            self.flush()
+        self._chunk.append((lines, size))
+        self._chunk_size += size
+
+    def add_all(self, actions):
+        for action in actions:
+            self.add(action)
+
+    def flush(self):
+        """Hand the pending actions to a worker, blocking while the queue is full"""
+        if self._chunk:
+            self._queue.put(self._chunk)
+            self._chunk, self._chunk_size = [], 0
+
+    def close(self):
+        """Send the remaining actions, wait for the workers and return the report"""
+        self.flush()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._seconds = time.perf_counter() - self._started
+        if self._dead_letter is not None:
+            self._dead_letter.close()
+            self._dead_letter = None
+
+        report = self.report()
+        dead_letters = f" (written to '{self.dead_letter_path}')" if report["failed"] and self.dead_letter_path else ""
+        print(f"Bulk ingestion: indexed {report['indexed']}, failed {report['failed']}{dead_letters}, "
+              f"rejected {report['rejected']}, {report['docs_per_sec']:.1f} docs/s, {report['mb_per_sec']:.2f} MB/s")
+        return report
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def report(self):
+        seconds = self._seconds if self._seconds is not None else time.perf_counter() - self._started
+        with self._lock:
+            return {
+                **self.stats,
+                "errors": list(self.errors),
+                "seconds": seconds,
+                "docs_per_sec": self.stats["indexed"] / seconds if seconds else 0.0,
+                "mb_per_sec": self.stats["bytes"] / (1024 * 1024) / seconds if seconds else 0.0,
+                "chunk_bytes": self.chunk_bytes
+            }
+
+    def _worker(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                return
+            try:
+                self._send(chunk)
+            except Exception as e:
+                # Never lose a chunk to an unexpected error
+                self._fail(chunk, {"type": type(e).__name__, "reason": str(e)})
+
+    def _send(self, chunk):
+        for attempt in range(self.max_retries + 1):
+            retry = []
+            try:
+                response = self.client.bulk(operations=[line for lines, _ in chunk for line in lines])
+            except ApiError as e:
+                if e.meta.status not in RETRY_STATUSES:
+                    self._fail(chunk, {"status": e.meta.status, "reason": str(e)})
+                    return
+                retry = chunk
+            except (ConnectionError, ConnectionTimeout):
+                retry = chunk
+            else:
+                failed, indexed, indexed_bytes = [], 0, 0
+                if not response["errors"]:
+                    indexed, indexed_bytes = len(chunk), sum(size for _, size in chunk)
+                else:
+                    for document, item in zip(chunk, response["items"]):
+                        result = next(iter(item.values()))
+                        if "error" not in result:
+                            indexed += 1
+                            indexed_bytes += document[1]
+                        elif result.get("status") in RETRY_STATUSES:
+                            retry.append(document)
+                        else:
+                            failed.append((document, item))
+                with self._lock:
+                    self.stats["requests"] += 1
+                    self.stats["indexed"] += indexed
+                    self.stats["bytes"] += indexed_bytes
+                for document, item in failed:
+                    self._fail([document], item)
+
+            if not retry:
+                self._resize(rejected=False)
+                return
+            self._resize(rejected=True)
+            with self._lock:
+                self.stats["rejected"] += len(retry)
+                if attempt < self.max_retries:
+                    self.stats["retries"] += 1
+            if attempt < self.max_retries:
+                # Full jitter keeps the threads from retrying in lockstep
+                time.sleep(random.uniform(0, min(BULK_MAX_BACKOFF, BULK_INITIAL_BACKOFF * 2 ** attempt)))
+            chunk = retry
+
+        self._fail(chunk, {"status": 429, "reason": f"Still rejected after {self.max_retries} retries"})
+
+    def _resize(self, rejected):
+        """Halve the request size on a rejection, grow it by a tenth after a clean request"""
+        with self._lock:
+            if rejected:
+                self.chunk_bytes = max(min(BULK_MIN_CHUNK_BYTES, self.max_chunk_bytes), self.chunk_bytes // 2)
+            else:
+                self.chunk_bytes = min(self.max_chunk_bytes, self.chunk_bytes + self.chunk_bytes // 10)
+
+    def _fail(self, documents, error):
+        """Count failed documents and append them to the dead-letter file"""
+        with self._lock:
+            self.stats["failed"] += len(documents)
+            if len(self.errors) < 100:
+                self.errors.append(error)
+            if not self.dead_letter_path:
+                return
+            if self._dead_letter is None:
+                os.makedirs(os.path.dirname(self.dead_letter_path) or ".", exist_ok=True)
+                self._dead_letter = open(self.dead_letter_path, "ab")
+            error_json = dumps(error)
+            for lines, _ in documents:
+                # Record the alias too, so a replay can tell whether the index is still the live one
+                (meta,) = orjson.loads(lines[0]).values()
+                alias = dumps(get_alias_name(meta.get("_index", "")))
+                source = b',"source":' + lines[1] if len(lines) > 1 else b""
+                self._dead_letter.write(b'{"error":' + error_json + b',"alias":' + alias + b',"action":' + lines[0]
+                                        + source + b"}\n")
+            self._dead_letter.flush()
+
+def to_action(entry):
+    """The bulk action of a dead-letter entry in the helpers action format"""
+    (op_type, meta), = entry["action"].items()
+    action = {"_op_type": op_type, **{f"_{key}" if not key.startswith("_") else key: value
+                                      for key, value in meta.items()}}
+    if "source" in entry:
+        action["_source"] = entry["source"]
+    return action
+
+def iter_dead_letters(path):
+    """Yield (raw line, entry) for each entry of a dead-letter file"""
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield line, orjson.loads(line)
+
+def is_replayable(index_name, alias, client=None):
+    """
+    True if index_name still exists and is the index behind its alias (or has no
+    alias). A failed build deletes its index and a newer build moves the alias;
+    replaying into either would auto-create an index with dynamic mappings or
+    write into a stale version.
+    """
+    client = client or es_client
+    if alias != index_name and client.indices.exists_alias(name=alias):
+        return index_name in client.indices.get_alias(name=alias)
+    return bool(client.indices.exists(index=index_name))
+
+def replay_dead_letters(path=None, thread_count=None):
+    """
+    Send the actions of a dead-letter file again. Actions that fail again, and
+    actions whose index is gone or no longer behind its alias, are written to a
+    new dead-letter file at the same path. A leftover file of an interrupted
+    replay is replayed too. Returns the report, or None if there is nothing to replay.
+    """
+    path = path or BULK_DEAD_LETTER_PATH
+    replaying = f"{path}.replaying"
+    if os.path.exists(replaying):
+        # An earlier replay was interrupted; merge instead of overwriting its entries
+        if os.path.exists(path):
+            with open(replaying, "ab") as merged, open(path, "rb") as f:
+                for line in f:
+                    merged.write(line)
+            os.remove(path)
+    elif os.path.exists(path):
+        os.replace(path, replaying)
+    else:
+        print(f"No dead letters at '{path}'")
+        return None
+
+    replayable = {}
+    skipped = []
+    with BulkIngestor(thread_count=thread_count, dead_letter_path=path) as ingestor:
+        for line, entry in iter_dead_letters(replaying):
+            (meta,) = entry["action"].values()
+            index_name = meta.get("_index", "")
+            target = (index_name, entry.get("alias") or get_alias_name(index_name))
+            if target not in replayable:
+                replayable[target] = is_replayable(*target)
+            if replayable[target]:
+                ingestor.add(to_action(entry))
+            else:
+                skipped.append(line)
+
+    if skipped:
+        with open(path, "ab") as f:
+            f.writelines(line if line.endswith(b"\n") else line + b"\n" for line in skipped)
+        stale = sorted(index_name for (index_name, _), ok in replayable.items() if not ok)
+        print(f"Kept {len(skipped)} dead letters for deleted or replaced indices: {', '.join(stale)}. "
+              f"Rebuild the index, or edit their _index to replay them.")
+    os.remove(replaying)
+    return {**ingestor.report(), "skipped": len(skipped)}
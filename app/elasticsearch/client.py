@@ -1,13 +1,16 @@
-from elasticsearch import Elasticsearch
+from elasticsearch import Elasticsearch, AsyncElasticsearch
 from app.config import (
     ELASTICSEARCH_HOST,
     ELASTICSEARCH_PORT,
     ELASTICSEARCH_USERNAME,
-    ELASTICSEARCH_PASSWORD
+    ELASTICSEARCH_PASSWORD,
+    ES_CONNECTIONS_PER_NODE,
+    ES_REQUEST_TIMEOUT,
+    ES_MAX_RETRIES
 )
 
-def get_elasticsearch_client():
-    """Create and return Elasticsearch client instance"""
+def get_connection_params():
+    """Connection parameters shared by the sync and async clients"""
     connection_params = {
         "hosts": [f"http://{ELASTICSEARCH_HOST}:{ELASTICSEARCH_PORT}"]
     }
@@ -15,6 +18,24 @@ def get_elasticsearch_client():
     if ELASTICSEARCH_USERNAME and ELASTICSEARCH_PASSWORD:
         connection_params["basic_auth"] = (ELASTICSEARCH_USERNAME, ELASTICSEARCH_PASSWORD)
         
-    return Elasticsearch(**connection_params)
+    return connection_params
+
+def get_elasticsearch_client():
+    """Create and return Elasticsearch client instance"""
+    return Elasticsearch(**get_connection_params())
+
+def get_async_elasticsearch_client():
+    """
+    Create and return an AsyncElasticsearch client with a connection pool sized
+    for concurrent search requests
+    """
+    return AsyncElasticsearch(
+        **get_connection_params(),
+        connections_per_node=ES_CONNECTIONS_PER_NODE,
+        request_timeout=ES_REQUEST_TIMEOUT,
+        max_retries=ES_MAX_RETRIES,
+        retry_on_timeout=True
+    )
 
-es_client = get_elasticsearch_client()
\ No newline at end of file
+es_client = get_elasticsearch_client()
+async_es_client = get_async_elasticsearch_client()
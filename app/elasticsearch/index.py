@@ -1,35 +1,177 @@
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk, BulkIndexError
-import pandas as pd
-from app.elasticsearch.client import es_client
-from app.config import INDEX_NAME
-from app.services.embedding import get_text_embedding
-
-def create_index():
-    """Create the index with appropriate mappings for product data"""
+import math
+import os
+import time
+import numpy as np
+from elasticsearch.helpers import scan
+from app.elasticsearch.bulk import BulkIngestor
+from app.elasticsearch.client import es_client, async_es_client
+from app.config import (
+    INDEX_NAME,
+    INDEX_BATCH_SIZE,
+    INDEX_NUMBER_OF_SHARDS,
+    INDEX_NUMBER_OF_REPLICAS,
+    INDEX_ROUTING_FIELD,
+    INDEX_REQUEST_CACHE,
+    REVIEW_INDEX_NAME,
+    REVIEW_INDEX_ENABLED,
+    INDEX_REFRESH_INTERVAL,
+    INDEX_KEEP_VERSIONS,
+    SPELLING_PATH,
+    DATA_METADATA_PATH,
+    SEMANTIC_BACKEND,
+    EMBEDDING_DIMENSION,
+    VECTOR_INDEX_TYPE,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    VECTOR_DECIMALS,
+    SHARD_TARGET_SIZE_GB,
+    SHARD_TARGET_VECTOR_GB,
+    SHARD_MAX_DOCUMENTS
+)
+from app.services.embedding import get_text_embeddings
+from app.services.vector_index import VectorIndexBuilder, SOURCE_FIELDS
+from app.services.autocomplete import AutocompleteBuilder
+from app.services.spelling import SpellingBuilder
+from app.utils.data_loader import (
+    MetadataCollector,
+    is_missing,
+    load_csv_data,
+    iter_product_documents,
+    iter_csv_chunks
+)
+from app.utils.staging import StagingWriter, iter_staged_documents
+
+# Analyzers shared by the product and review indices
+ANALYSIS_SETTINGS = {
+    "analyzer": {
+        "custom_analyzer": {
+            "type": "custom",
+            "tokenizer": "standard",
+            "filter": ["lowercase", "english_stop", "english_stemmer"]
+        }
+    },
+    "filter": {
+        "english_stop": {
+            "type": "stop",
+            "stopwords": "_english_"
+        },
+        "english_stemmer": {
+            "type": "stemmer",
+            "language": "english"
+        }
+    }
+}
+
+def get_vector_index_options(index_type=None, m=None, ef_construction=None):
+    """
+    HNSW options of the text_vector field. int8_hnsw quantizes the vectors held in
+    the HNSW graph to int8, about a quarter of the memory of float32.
+    """
+    return {
+        "type": index_type or VECTOR_INDEX_TYPE,
+        "m": m or HNSW_M,
+        "ef_construction": ef_construction or HNSW_EF_CONSTRUCTION
+    }
+
+# Oldest Elasticsearch version that accepts each text_vector index type
+VECTOR_INDEX_TYPE_VERSIONS = {"hnsw": (8, 0), "int8_hnsw": (8, 12)}
+
+def check_vector_index_options(options, client=None):
+    """
+    Raise ValueError if the cluster can't create text_vector with these options,
+    instead of failing on a mapping error halfway through a reindex. The cluster
+    version is only read for index types newer than 8.0.
+    """
+    index_type = options["type"]
+    if index_type not in VECTOR_INDEX_TYPE_VERSIONS:
+        raise ValueError(f"Unknown vector index type '{index_type}', expected one of: "
+                         f"{', '.join(VECTOR_INDEX_TYPE_VERSIONS)}")
+    required = VECTOR_INDEX_TYPE_VERSIONS[index_type]
+    if required <= (8, 0):
+        return
+    number = (client or es_client).info()["version"]["number"]
+    version = tuple(int(part) for part in number.split(".")[:2])
+    if version < required:
+        raise ValueError(f"Vector index type '{index_type}' needs Elasticsearch {'.'.join(map(str, required))}+, "
+                         f"the cluster runs {number}. Set VECTOR_INDEX_TYPE=hnsw or upgrade the cluster.")
+
+def get_vector_memory_per_document(dims=None, index_type=None, m=None):
+    """
+    Bytes per document that kNN search wants in memory (the page cache): the
+    vector as held in the HNSW graph plus its bottom-layer neighbor links
+    """
+    dims = dims or EMBEDDING_DIMENSION
+    vector_bytes = dims * (1 if (index_type or VECTOR_INDEX_TYPE) == "int8_hnsw" else 4)
+    # Up to 2 * m neighbors per node on the bottom layer, stored as 4-byte ids
+    return vector_bytes + 2 * (m or HNSW_M) * 4
+
+def recommend_shard_count(document_count, document_bytes, vector_bytes=None, replicas=None):
+    """
+    Recommend a primary shard count for document_count products of document_bytes
+    on disk each (vectors included).
+
+    Each limit gives a minimum shard count: SHARD_TARGET_SIZE_GB of disk per
+    shard, SHARD_TARGET_VECTOR_GB of kNN working set per shard (a kNN search
+    walks one HNSW graph per shard, so smaller graphs search in parallel), and
+    SHARD_MAX_DOCUMENTS. Returns the recommendation with the estimates behind it.
+    """
+    vector_bytes = get_vector_memory_per_document() if vector_bytes is None else vector_bytes
+    replicas = INDEX_NUMBER_OF_REPLICAS if replicas is None else replicas
+    gb = 1024 ** 3
+    total_gb = document_count * document_bytes / gb
+    vector_gb = document_count * vector_bytes / gb
+    
+    limits = {
+        "size": math.ceil(total_gb / SHARD_TARGET_SIZE_GB),
+        "vectors": math.ceil(vector_gb / SHARD_TARGET_VECTOR_GB),
+        "documents": math.ceil(document_count / SHARD_MAX_DOCUMENTS)
+    }
+    shards = max(1, *limits.values())
+    return {
+        "documents": document_count,
+        "primary_size_gb": round(total_gb, 3),
+        "vector_memory_gb": round(vector_gb, 3),
+        "shards": shards,
+        "limited_by": max(limits, key=limits.get) if shards > 1 else None,
+        "shard_size_gb": round(total_gb / shards, 3),
+        "shard_vector_memory_gb": round(vector_gb / shards, 3),
+        # Every replica holds a full copy of the vectors
+        "cluster_vector_memory_gb": round(vector_gb * (1 + replicas), 3),
+        "replicas": replicas
+    }
+
+def get_index_sizing(index_name=INDEX_NAME):
+    """
+    Recommend a shard count from the document count and size of an existing index
+    """
+    stats = es_client.indices.stats(index=index_name, metric=["docs", "store"])["_all"]["primaries"]
+    document_count = stats["docs"]["count"]
+    document_bytes = stats["store"]["size_in_bytes"] / document_count if document_count else 0
+    return recommend_shard_count(document_count, document_bytes)
+
+def get_document_routing(document):
+    """Custom routing value of a document, or None when documents are routed by _id"""
+    if not INDEX_ROUTING_FIELD:
+        return None
+    return document.get(INDEX_ROUTING_FIELD)
+
+def create_index(index_name, bulk_load=False, vector_index_options=None):
+    """
+    Create the index with appropriate mappings for product data.
+
+    With bulk_load, refresh and replicas are disabled until finish_bulk_load is called.
+    vector_index_options overrides the configured HNSW options of text_vector.
+    With INDEX_ROUTING_FIELD set, every document must be indexed with its routing value.
+    With REVIEW_INDEX_ENABLED, reviews are still indexed for matching but left out of
+    the stored _source; the full reviews are served from the review index.
+    """
     index_settings = {
         "settings": {
-            "number_of_shards": 1,
-            "number_of_replicas": 0,
-            "analysis": {
-                "analyzer": {
-                    "custom_analyzer": {
-                        "type": "custom",
-                        "tokenizer": "standard",
-                        "filter": ["lowercase", "english_stop", "english_stemmer"]
-                    }
-                },
-                "filter": {
-                    "english_stop": {
-                        "type": "stop",
-                        "stopwords": "_english_"
-                    },
-                    "english_stemmer": {
-                        "type": "stemmer",
-                        "language": "english"
-                    }
-                }
-            }
+            "number_of_shards": INDEX_NUMBER_OF_SHARDS,
+            "number_of_replicas": 0 if bulk_load else INDEX_NUMBER_OF_REPLICAS,
+            "refresh_interval": "-1" if bulk_load else INDEX_REFRESH_INTERVAL,
+            "requests.cache.enable": INDEX_REQUEST_CACHE,
+            "analysis": ANALYSIS_SETTINGS
         },
         "mappings": {
             "properties": {
@@ -48,6 +190,7 @@ def create_index():
                 },
                 "brand": {"type": "keyword"},
                 "categories": {"type": "keyword"},
+                "primary_category": {"type": "keyword"},
                 "manufacturer": {"type": "keyword"},
                 "reviews": {
                     "properties": {
@@ -64,86 +207,537 @@ def create_index():
                         "username": {"type": "keyword"}
                     }
                 },
+                "review_count": {"type": "integer"},
+                "avg_rating": {"type": "scaled_float", "scaling_factor": 100},
+                "rating_histogram": {
+                    "properties": {str(star): {"type": "integer"} for star in range(1, 6)}
+                },
+                "review_preview": {"type": "object", "enabled": False},
                 "text_vector": {
                     "type": "dense_vector",
-                    "dims": 384,
+                    "dims": EMBEDDING_DIMENSION,
                     "index": True,
-                    "similarity": "cosine"
+                    "similarity": "cosine",
+                    "index_options": vector_index_options or get_vector_index_options()
                 },
-                "suggest": {"type": "completion"}
+                "suggest": {"type": "completion"},
+                "content_hash": {"type": "keyword"}
             }
         }
     }
+    if INDEX_ROUTING_FIELD:
+        index_settings["mappings"]["_routing"] = {"required": True}
+    if REVIEW_INDEX_ENABLED:
+        index_settings["mappings"]["_source"] = {"excludes": ["reviews"]}
     
     # Create the index
-    if not es_client.indices.exists(index=INDEX_NAME):
-        es_client.indices.create(index=INDEX_NAME, body=index_settings)
-        print(f"Created index '{INDEX_NAME}'")
+    if not es_client.indices.exists(index=index_name):
+        check_vector_index_options(index_settings["mappings"]["properties"]["text_vector"]["index_options"])
+        es_client.indices.create(index=index_name, body=index_settings)
+        print(f"Created index '{index_name}'")
     else:
-        print(f"Index '{INDEX_NAME}' already exists")
+        print(f"Index '{index_name}' already exists")
 
-def prepare_documents_from_csv(csv_path):
+def create_review_index(index_name, bulk_load=False):
     """
-    Process the CSV data and prepare documents for Elasticsearch
+    Create a review index: one document per review, routed by product id so the
+    reviews of a product are paged from a single shard
     """
-    df = pd.read_csv(csv_path)
+    index_settings = {
+        "settings": {
+            "number_of_shards": INDEX_NUMBER_OF_SHARDS,
+            "number_of_replicas": 0 if bulk_load else INDEX_NUMBER_OF_REPLICAS,
+            "refresh_interval": "-1" if bulk_load else INDEX_REFRESH_INTERVAL,
+            "analysis": ANALYSIS_SETTINGS
+        },
+        "mappings": {
+            "_routing": {"required": True},
+            "properties": {
+                "product_id": {"type": "keyword"},
+                "position": {"type": "integer"},
+                "date": {"type": "date"},
+                "rating": {"type": "float"},
+                "text": {"type": "text", "analyzer": "custom_analyzer"},
+                "title": {"type": "text", "analyzer": "custom_analyzer"},
+                "username": {"type": "keyword"}
+            }
+        }
+    }
     
-    # Group by product ID to combine reviews
-    grouped = df.groupby(['id', 'name', 'brand', 'categories', 'manufacturer'])
+    if not es_client.indices.exists(index=index_name):
+        es_client.indices.create(index=index_name, body=index_settings)
+        print(f"Created index '{index_name}'")
+    else:
+        print(f"Index '{index_name}' already exists")
+
+def finish_bulk_load(index_name):
+    """Restore refresh and replicas after a bulk load and make the documents searchable"""
+    es_client.indices.put_settings(index=index_name, settings={
+        "index": {
+            "refresh_interval": INDEX_REFRESH_INTERVAL,
+            "number_of_replicas": INDEX_NUMBER_OF_REPLICAS
+        }
+    })
+    es_client.indices.refresh(index=index_name)
+
+def get_index_versions(alias=INDEX_NAME):
+    """
+    Return the versions of the existing {alias}_v{n} indices, sorted ascending
+    """
+    indices = es_client.indices.get(index=f"{alias}_v*", allow_no_indices=True)
+    versions = []
+    for name in indices:
+        suffix = name[len(alias) + 2:]
+        if suffix.isdigit():
+            versions.append(int(suffix))
+    return sorted(versions)
+
+def alias_exists(alias=INDEX_NAME):
+    """Check that the live alias exists"""
+    return bool(es_client.indices.exists_alias(name=alias))
+
+def swap_alias(index_name, alias=INDEX_NAME):
+    """
+    Atomically point the alias at index_name, detaching it from the previous index
+    """
+    actions = []
+    if alias_exists(alias):
+        for old_index in es_client.indices.get_alias(name=alias):
+            actions.append({"remove": {"index": old_index, "alias": alias}})
+    elif es_client.indices.exists(index=alias):
+        # A concrete index from before aliases were used blocks the alias name
+        actions.append({"remove_index": {"index": alias}})
+    actions.append({"add": {"index": index_name, "alias": alias}})
+    
+    es_client.indices.update_aliases(actions=actions)
+    print(f"Alias '{alias}' now points to '{index_name}'")
+
+def get_index_version():
+    """
+    Return a string identifying the live index contents: the concrete index behind
+    the alias plus the content version recorded by the last incremental update
+    """
+    return format_index_version(es_client.indices.get_mapping(index=INDEX_NAME))
+
+async def async_get_index_version():
+    """
+    Async version of get_index_version
+    """
+    return format_index_version(await async_es_client.indices.get_mapping(index=INDEX_NAME))
+
+def format_index_version(mappings):
+    versions = []
+    for name, mapping in sorted(mappings.items()):
+        meta = mapping["mappings"].get("_meta", {})
+        versions.append(f"{name}:{meta.get('content_version', 0)}")
+    return ",".join(versions)
+
+def mark_index_updated(index_name=INDEX_NAME):
+    """Record a new content version after documents were changed in place"""
+    es_client.indices.put_mapping(index=index_name, meta={"content_version": str(time.time_ns())})
+
+def delete_old_versions(keep=None, alias=INDEX_NAME):
+    """Delete old versioned indices, keeping the newest ones for rollback"""
+    keep = INDEX_KEEP_VERSIONS if keep is None else keep
+    versions = get_index_versions(alias)
+    for version in versions[:max(len(versions) - keep, 0)]:
+        es_client.indices.delete(index=f"{alias}_v{version}")
+        print(f"Deleted old index '{alias}_v{version}'")
+
+def get_embedding_text(document):
+    """
+    Build the concatenated text that is embedded for a product document
+    """
+    return f"{document['name']} {document['brand']} {','.join(document['categories'])} " + " ".join([r['text'] for r in document['reviews']])
+
+def embed_documents(documents, batch_size=None, workers=None):
+    """
+    Add a text_vector to each document, embedding the whole list in batched calls
+    """
+    texts = [get_embedding_text(document) for document in documents]
+    embeddings = get_text_embeddings(texts, batch_size=batch_size, workers=workers)
+    for document, embedding in zip(documents, embeddings):
+        document['text_vector'] = embedding
+    return documents
+
+def to_index_action(document, index_name=INDEX_NAME):
+    """
+    Wrap a product document in a bulk index action. With VECTOR_DECIMALS the
+    vector is rounded to shorten the bulk JSON; ES stores it as float32 either way.
+    The vector stays a float32 array, which the bulk ingestor serializes with its
+    shortest float32 representation.
+    """
+    if VECTOR_DECIMALS is not None:
+        document = {**document, 'text_vector': np.round(np.asarray(document['text_vector'], dtype=np.float32),
+                                                        VECTOR_DECIMALS)}
+    action = {
+        "_index": index_name,
+        "_id": document['id'],
+        "_source": document
+    }
+    routing = get_document_routing(document)
+    if routing is not None:
+        action["_routing"] = routing
+    return action
+
+def to_review_actions(document, index_name=REVIEW_INDEX_NAME):
+    """
+    Bulk index actions of the reviews of a product document for the review index,
+    routed by product id
+    """
+    for position, review in enumerate(document['reviews']):
+        source = {key: None if is_missing(value) else value for key, value in review.items()}
+        yield {
+            "_index": index_name,
+            "_id": f"{document['id']}:{position}",
+            "_routing": document['id'],
+            "_source": {**source, "product_id": document['id'], "position": position}
+        }
+
+def index_reviews(documents, index_name, thread_count=None):
+    """
+    Send the reviews of product documents to a review index. Returns the indexed
+    and failed counts and a sample of the errors.
+    """
+    with BulkIngestor(thread_count=thread_count) as ingestor:
+        for document in documents:
+            ingestor.add_all(to_review_actions(document, index_name))
+    report = ingestor.report()
+    return report["indexed"], report["failed"], report["errors"]
+
+def delete_reviews(product_ids, index_name=REVIEW_INDEX_NAME, batch_size=1000):
+    """Delete every review of the given products from a review index"""
+    for start in range(0, len(product_ids), batch_size):
+        es_client.delete_by_query(index=index_name, query={"terms": {"product_id": product_ids[start:start + batch_size]}},
+                                  conflicts="proceed", refresh=True)
+
+def prepare_documents_from_csv(csv_path, batch_size=None, workers=None, index_name=INDEX_NAME, metadata=None):
+    """
+    Process the CSV data and prepare documents for Elasticsearch.
+
+    Documents are collected into batches of INDEX_BATCH_SIZE and each batch is
+    embedded in one call. The loaded data is also added to the metadata collector.
+    """
+    df = load_csv_data(csv_path)
+    if metadata is not None:
+        metadata.update(df)
     
     documents = []
+    batch = []
     
-    for (id, name, brand, categories, manufacturer), group in grouped:
-        reviews = []
-        
-        for _, row in group.iterrows():
-            if pd.notna(row['reviews.text']):  # Only include reviews with text
-                reviews.append({
-                    'date': row.get('reviews.date', ''),
-                    'rating': float(row.get('reviews.rating', 0)),
-                    'text': row.get('reviews.text', ''),
-                    'title': row.get('reviews.title', ''),
-                    'username': row.get('reviews.username', '')
-                })
+    for document in iter_product_documents(df):
+        batch.append(document)
+        if len(batch) >= INDEX_BATCH_SIZE:
+            documents.extend(to_index_action(doc, index_name) for doc in embed_documents(batch, batch_size, workers))
+            batch = []
+    
+    if batch:
+        documents.extend(to_index_action(doc, index_name) for doc in embed_documents(batch, batch_size, workers))
+    
+    return documents
+
+def bulk_index_documents(csv_path, index_name=INDEX_NAME, on_document=None, metadata=None, review_index_name=None,
+                         thread_count=None):
+    """
+    Index the documents in bulk. on_document is called with each embedded document.
+    With review_index_name the reviews are also sent to that review index.
+    """
+    documents = prepare_documents_from_csv(csv_path, index_name=index_name, metadata=metadata)
+    if on_document is not None:
+        for action in documents:
+            on_document(action["_source"])
+    print(f"Prepared {len(documents)} documents for indexing")
+    with BulkIngestor(thread_count=thread_count) as ingestor:
+        ingestor.add_all(documents)
+    report = ingestor.report()
+    success, failed = report["indexed"], report["errors"]
+    print(f"Successfully indexed {success} documents. Failed: {report['failed']}")
+    
+    if review_index_name is not None:
+        reviews_indexed, reviews_failed, _ = index_reviews((action["_source"] for action in documents), review_index_name,
+                                                     thread_count)
+        print(f"Indexed {reviews_indexed} reviews. Failed: {reviews_failed}")
+        es_client.indices.refresh(index=review_index_name)
+    
+    # Refresh once at the end rather than after every bulk chunk
+    es_client.indices.refresh(index=index_name)
+
+    return success, failed
+
+def streaming_index_documents(csv_path, chunk_size=None, thread_count=None, index_name=INDEX_NAME, on_document=None,
+                              metadata=None, review_index_name=None):
+    """
+    Index the documents chunk by chunk so that peak memory is bounded by the chunk size.
+
+    Each chunk is embedded while the bulk threads send the previous ones.
+    on_document is called with each embedded document.
+    Returns a report with per-chunk progress, failure counters and throughput.
+    """
+    chunks = (embed_documents(documents) for documents in iter_csv_chunks(csv_path, chunk_size, metadata))
+    return index_document_chunks(chunks, thread_count, index_name, on_document, review_index_name)
+
+def staged_index_documents(staging_path, thread_count=None, index_name=INDEX_NAME, on_document=None, metadata=None,
+                           review_index_name=None):
+    """
+    Index the embedded documents of a staging file without parsing the CSV or
+    running the model. Returns the same report as streaming_index_documents.
+    """
+    def chunks():
+        for documents in iter_staged_documents(staging_path):
+            for doc in documents:
+                if metadata is not None:
+                    metadata.add_document(doc)
+                if on_document is not None:
+                    on_document(doc)
+            yield documents
+    
+    return index_document_chunks(chunks(), thread_count, index_name, review_index_name=review_index_name)
+
+def index_document_chunks(chunks, thread_count=None, index_name=INDEX_NAME, on_document=None, review_index_name=None):
+    """
+    Send chunks of embedded documents through one BulkIngestor and refresh once
+    at the end. The ingestor's queue blocks the next chunk while Elasticsearch
+    falls behind. With review_index_name the reviews of each chunk are sent to
+    that review index by a second ingestor.
+    """
+    products = BulkIngestor(thread_count=thread_count).start()
+    reviews = BulkIngestor(thread_count=thread_count).start() if review_index_name is not None else None
+    report = {"indexed": 0, "failed": 0, "chunks": [], "errors": [], "reviews_indexed": 0, "reviews_failed": 0}
+    queued = 0
+    
+    try:
+        for chunk_number, documents in enumerate(chunks, start=1):
+            if on_document is not None:
+                for doc in documents:
+                    on_document(doc)
+            products.add_all(to_index_action(doc, index_name) for doc in documents)
+            if reviews is not None:
+                for doc in documents:
+                    reviews.add_all(to_review_actions(doc, review_index_name))
+            
+            queued += len(documents)
+            progress = products.report()
+            report["chunks"].append({"chunk": chunk_number, "documents": len(documents)})
+            print(f"Chunk {chunk_number}: queued {len(documents)} (total queued {queued}, "
+                  f"indexed {progress['indexed']}, failed {progress['failed']})")
+    finally:
+        product_report = products.close()
+        review_report = reviews.close() if reviews is not None else None
+    
+    report["indexed"], report["failed"] = product_report["indexed"], product_report["failed"]
+    report["errors"] = product_report["errors"]
+    report["throughput"] = {key: product_report[key]
+                            for key in ["seconds", "docs_per_sec", "mb_per_sec", "requests", "rejected", "retries"]}
+    
+    es_client.indices.refresh(index=index_name)
+    if review_report is not None:
+        report["reviews_indexed"], report["reviews_failed"] = review_report["indexed"], review_report["failed"]
+        report["errors"].extend(review_report["errors"][:max(100 - len(report["errors"]), 0)])
+        es_client.indices.refresh(index=review_index_name)
+        print(f"Indexed {report['reviews_indexed']} reviews. Failed: {report['reviews_failed']}")
+    return report
+
+def get_indexed_hashes(index_name=INDEX_NAME):
+    """
+    Return a dict of product id -> (content hash, routing) for the documents already in the index
+    """
+    if not es_client.indices.exists(index=index_name):
+        return {}
+    
+    hits = scan(es_client, index=index_name, query={"_source": ["content_hash"], "query": {"match_all": {}}})
+    return {hit["_id"]: (hit["_source"].get("content_hash"), hit.get("_routing")) for hit in hits}
+
+def build_vector_index_from_es(index_name=INDEX_NAME):
+    """
+    Rebuild the local vector index from the vectors stored in Elasticsearch
+    """
+    builder = VectorIndexBuilder()
+    fields = list(dict.fromkeys(SOURCE_FIELDS + ["manufacturer", "text_vector"]))
+    for hit in scan(es_client, index=index_name, query={"_source": fields, "query": {"match_all": {}}}):
+        builder.add(hit["_source"])
+    return builder.save()
+
+def incremental_index_documents(csv_path, index_name=INDEX_NAME):
+    """
+    Only re-embed and upsert products whose content hash changed, and delete
+    products that are no longer in the CSV. With REVIEW_INDEX_ENABLED the reviews
+    of changed and deleted products are replaced in the review index.
+
+    Returns a report with added, updated, unchanged, deleted and failed counts.
+    """
+    existing = get_indexed_hashes(index_name)
+    review_index_name = REVIEW_INDEX_NAME if REVIEW_INDEX_ENABLED and alias_exists(REVIEW_INDEX_NAME) else None
+    if REVIEW_INDEX_ENABLED and review_index_name is None:
+        print(f"Review index alias '{REVIEW_INDEX_NAME}' not found, run a full build to create it.")
+    df = load_csv_data(csv_path)
+    metadata = MetadataCollector()
+    metadata.update(df)
+    
+    # Update the autocomplete file in place, or rebuild it if it is missing
+    autocomplete_builder = AutocompleteBuilder.load()
+    rebuild_autocomplete = autocomplete_builder is None
+    if rebuild_autocomplete:
+        autocomplete_builder = AutocompleteBuilder()
+    # Term counts are cheap to recount, so the spelling dictionary is always rebuilt from the full CSV
+    spelling_builder = SpellingBuilder()
+    
+    report = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0, "failed": 0, "errors": []}
+    seen = set()
+    changed = []
+    moved = []
+    
+    for document in iter_product_documents(df):
+        seen.add(document['id'])
+        spelling_builder.add(document)
+        if rebuild_autocomplete:
+            autocomplete_builder.add(document)
+        indexed_hash, indexed_routing = existing.get(document['id'], (None, None))
         
-        # Skip products with no reviews
-        if not reviews:
+        if indexed_hash == document['content_hash']:
+            report["unchanged"] += 1
             continue
-            
-        # Create concatenated text for embedding
-        text_for_embedding = f"{name} {brand} {categories} " + " ".join([r['text'] for r in reviews])
         
-        # Get embedding for the document
-        text_embedding = get_text_embedding(text_for_embedding)
+        report["added" if indexed_hash is None else "updated"] += 1
+        changed.append(document)
+        if indexed_hash is not None and indexed_routing != get_document_routing(document):
+            # The new version lands on another shard, so the old one must be deleted explicitly
+            moved.append((document['id'], indexed_routing))
+    
+    removed = [(doc_id, routing) for doc_id, (_, routing) in existing.items() if doc_id not in seen]
+    report["deleted"] = len(removed)
+    
+    def actions():
+        for doc_id, routing in moved + removed:
+            action = {"_op_type": "delete", "_index": index_name, "_id": doc_id}
+            if routing is not None:
+                action["_routing"] = routing
+            yield action
         
-        document = {
-            'id': id,
-            'name': name,
-            'brand': brand,
-            'categories': categories.split(',') if pd.notna(categories) else [],
-            'manufacturer': manufacturer if pd.notna(manufacturer) else '',
-            'reviews': reviews,
-            'text_vector': text_embedding
-        }
+        # Embed changed products batch by batch as the bulk threads send them
+        for start in range(0, len(changed), INDEX_BATCH_SIZE):
+            for doc in embed_documents(changed[start:start + INDEX_BATCH_SIZE]):
+                yield to_index_action(doc, index_name)
+    
+    if changed or removed:
+        with BulkIngestor() as ingestor:
+            ingestor.add_all(actions())
+        bulk_report = ingestor.report()
+        report["failed"] += bulk_report["failed"]
+        report["errors"].extend(bulk_report["errors"])
+        es_client.indices.refresh(index=index_name)
+        mark_index_updated(index_name)
+        
+        if review_index_name is not None:
+            delete_reviews([document['id'] for document in changed] + [doc_id for doc_id, _ in removed],
+                           review_index_name)
+            _, reviews_failed, _ = index_reviews(changed, review_index_name)
+            report["failed"] += reviews_failed
+            es_client.indices.refresh(index=review_index_name)
         
-        documents.append({
-            "_index": INDEX_NAME,
-            "_id": id,
-            "_source": document
-        })
+        if SEMANTIC_BACKEND == "local":
+            build_vector_index_from_es(index_name)
     
-    return documents
+    if changed or removed or rebuild_autocomplete:
+        for document in changed:
+            autocomplete_builder.add(document)
+        for doc_id, _ in removed:
+            autocomplete_builder.remove(doc_id)
+        autocomplete_builder.save()
+    if changed or removed or not os.path.exists(SPELLING_PATH):
+        spelling_builder.save()
+    
+    metadata.save(DATA_METADATA_PATH)
+    
+    print(f"Incremental indexing: added {report['added']}, updated {report['updated']}, "
+          f"unchanged {report['unchanged']}, deleted {report['deleted']}, failed {report['failed']}")
+    return report
 
-def bulk_index_documents(csv_path):
-    """Index the documents in bulk"""
-    documents = prepare_documents_from_csv(csv_path)
-    success, failed = 0, []
-    print(f"Prepared {len(documents)} documents for indexing")
+def build_index(csv_path, stream=False, chunk_size=None, thread_count=None, write_staging=None, from_staging=None):
+    """
+    Build a new amazon_products_v{n} index from the CSV and atomically swap the alias to it.
+
+    With write_staging, the embedded documents are also written to a staging file.
+    With from_staging, documents are loaded from a staging file instead of the CSV
+    and nothing is embedded.
+
+    Refresh and replicas are disabled during the bulk load and restored afterwards.
+    With REVIEW_INDEX_ENABLED a review index of the same version is built alongside
+    and its alias swapped too.
+    Returns the new index name and the indexed/failed counts.
+    """
+    versions = get_index_versions()
+    version = (versions[-1] if versions else 0) + 1
+    index_name = f"{INDEX_NAME}_v{version}"
+    review_index_name = f"{REVIEW_INDEX_NAME}_v{version}" if REVIEW_INDEX_ENABLED else None
+    
+    # Build the autocomplete, the spelling dictionary, the local vector index and the staging file
+    # from the same embedded documents
+    vector_index_builder = VectorIndexBuilder() if SEMANTIC_BACKEND == "local" else None
+    autocomplete_builder = AutocompleteBuilder()
+    spelling_builder = SpellingBuilder()
+    staging_writer = StagingWriter(write_staging) if write_staging else None
+    metadata = MetadataCollector()
+    
+    def on_document(document):
+        autocomplete_builder.add(document)
+        spelling_builder.add(document)
+        if vector_index_builder is not None:
+            vector_index_builder.add(document)
+        if staging_writer is not None:
+            staging_writer.add(document)
+    
+    create_index(index_name, bulk_load=True)
+    if review_index_name is not None:
+        create_review_index(review_index_name, bulk_load=True)
     try:
-        success, _ = bulk(es_client, documents, refresh=True)
-        print(f"Successfully indexed {success} documents. Failed: {failed}")
-    except BulkIndexError as e:
-        failed = e.errors
-        print(f"{len(failed)} document(s) failed to index.")
+        if from_staging:
+            stream_report = staged_index_documents(from_staging, thread_count, index_name=index_name,
+                                                   on_document=on_document, metadata=metadata,
+                                                   review_index_name=review_index_name)
+            indexed, failed = stream_report["indexed"], stream_report["errors"]
+        elif stream:
+            stream_report = streaming_index_documents(csv_path, chunk_size, thread_count,
+                                                      index_name=index_name, on_document=on_document, metadata=metadata,
+                                                      review_index_name=review_index_name)
+            indexed, failed = stream_report["indexed"], stream_report["errors"]
+        else:
+            indexed, failed = bulk_index_documents(csv_path, index_name=index_name, on_document=on_document,
+                                                   metadata=metadata, review_index_name=review_index_name,
+                                                   thread_count=thread_count)
+        finish_bulk_load(index_name)
+        if review_index_name is not None:
+            finish_bulk_load(review_index_name)
+    except Exception:
+        # Leave the live aliases untouched if the build fails
+        es_client.indices.delete(index=index_name, ignore_unavailable=True)
+        if review_index_name is not None:
+            es_client.indices.delete(index=review_index_name, ignore_unavailable=True)
+        if staging_writer is not None:
+            staging_writer.abort()
+        raise
+    
+    # Reviews first, so products in the new version always find theirs
+    if review_index_name is not None:
+        swap_alias(review_index_name, REVIEW_INDEX_NAME)
+        delete_old_versions(alias=REVIEW_INDEX_NAME)
+    swap_alias(index_name)
+    delete_old_versions()
+    metadata.save(DATA_METADATA_PATH)
+    autocomplete_builder.save()
+    spelling_builder.save()
+    if staging_writer is not None:
+        staging_writer.close()
+    if vector_index_builder is not None:
+        vector_index_builder.save()
+    
+    return {"index": index_name, "indexed": indexed, "failed": failed}
 
-    return success, failed
\ No newline at end of file
+def build_vector_index_from_staging(staging_path):
+    """
+    Build the local vector index straight from a staging file, without Elasticsearch
+    """
+    builder = VectorIndexBuilder()
+    for documents in iter_staged_documents(staging_path):
+        for document in documents:
+            builder.add(document)
+    return builder.save()
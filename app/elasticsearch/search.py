@@ -1,28 +1,168 @@
+from elasticsearch import NotFoundError
 from elasticsearch_dsl import Search, Q
-from app.elasticsearch.client import es_client
-from app.config import INDEX_NAME
-from app.services.embedding import get_text_embedding
+from elasticsearch_dsl.response import Response
+from app.elasticsearch.client import es_client, async_es_client
+import asyncio
+import hashlib
+import json
+from app.config import (
+    INDEX_NAME,
+    INDEX_ROUTING_FIELD,
+    REVIEW_INDEX_NAME,
+    REVIEW_INDEX_ENABLED,
+    SEARCH_REQUEST_CACHE,
+    SEARCH_PREFERENCE,
+    PIT_KEEP_ALIVE,
+    KNN_NUM_CANDIDATES,
+    FACET_SIZE,
+    FACET_OPTIONS_SIZE,
+    HYBRID_RRF_RANK_CONSTANT,
+    HYBRID_RRF_WINDOW_SIZE,
+    HYBRID_RRF_BM25_WEIGHT,
+    HYBRID_RRF_KNN_WEIGHT,
+    HYBRID_RRF_SERVER_SIDE
+)
+from app.services.embedding import get_query_embedding, aget_query_embedding
+from app.services.metrics import record_es_took
 
-def basic_search(query, size=10):
+# Fields returned for every search type; full reviews, vectors and bookkeeping fields are never shipped
+RESULT_SOURCE_FIELDS = ["id", "name", "brand", "categories", "manufacturer", "review_count", "avg_rating",
+                        "rating_histogram", "review_preview"]
+
+# Review fields highlighted in results. With REVIEW_INDEX_ENABLED the review text is
+# left out of the product _source, which the highlighter reads, so none are requested.
+REVIEW_HIGHLIGHT_FIELDS = [] if REVIEW_INDEX_ENABLED else ["reviews.text", "reviews.title"]
+
+# Sort used for point-in-time search_after paging
+PIT_SORT = [{"_score": {"order": "desc"}}, {"_shard_doc": {"order": "asc"}}]
+
+# Sort option -> sort clauses on the product-level review fields; relevance keeps the score order
+SORT_OPTIONS = {
+    "relevance": None,
+    "rating": [{"avg_rating": {"order": "desc", "missing": "_last"}}, {"review_count": {"order": "desc"}},
+               {"_score": {"order": "desc"}}],
+    "reviews": [{"review_count": {"order": "desc"}}, {"avg_rating": {"order": "desc", "missing": "_last"}},
+                {"_score": {"order": "desc"}}]
+}
+
+def get_sort_clauses(sort=None, pit=None):
     """
-    Enhanced basic keyword search with better relevance
+    Sort clauses of a sort option, or None for relevance. Point-in-time paging
+    always sorts, with _shard_doc as the tiebreaker.
+    """
+    clauses = SORT_OPTIONS[sort or "relevance"]
+    if pit is None:
+        return clauses
+    return (clauses or PIT_SORT[:1]) + PIT_SORT[1:]
+
+def get_search_index(pit=None):
+    """Requests with a point in time must not name an index"""
+    return None if pit else INDEX_NAME
+
+def get_routing(filters=None):
+    """
+    Routing of a search filtered on INDEX_ROUTING_FIELD: only the shards holding
+    the filtered values are searched. None searches every shard.
+    """
+    values = (filters or {}).get(INDEX_ROUTING_FIELD) if INDEX_ROUTING_FIELD else None
+    if not values:
+        return None
+    return ",".join(values) if isinstance(values, list) else values
+
+def get_preference(query, filters=None):
+    """
+    Shard copy preference of a search. With SEARCH_PREFERENCE=query the same query
+    and filters always go to the same copies, whose request caches already hold them.
+    """
+    if SEARCH_PREFERENCE != "query":
+        return SEARCH_PREFERENCE or None
+    key = json.dumps([query, filters], sort_keys=True, default=str)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+def get_search_params(query, filters=None, pit=None, request_cache=False):
+    """
+    Query string parameters of a search: routing, preference and, for faceted and
+    aggregation requests, request_cache. A point in time already fixes the shards.
+    """
+    if pit is not None:
+        return {}
+    params = {}
+    routing = get_routing(filters)
+    if routing:
+        params["routing"] = routing
+    preference = get_preference(query, filters)
+    if preference:
+        params["preference"] = preference
+    if request_cache and SEARCH_REQUEST_CACHE:
+        params["request_cache"] = True
+    return params
+
+def update_pit(pit, response):
+    """
+    Keep the point in time id returned with a page. Elasticsearch may change it
+    between requests, and the next page must be requested with the latest id.
+    """
+    if pit is not None:
+        pit["id"] = response["pit_id"]
+
+def paginate_search(s, size=10, from_=0, pit=None, sort=None):
+    """
+    Apply _source filtering, sorting and paging to an elasticsearch_dsl Search.
+
+    pit is None for from/size paging, or {"id": ..., "search_after": [...]} for
+    point-in-time search_after paging. sort is a SORT_OPTIONS key.
+    """
+    s = s.source(RESULT_SOURCE_FIELDS)
+    sort_clauses = get_sort_clauses(sort, pit)
+    if pit is None:
+        if sort_clauses:
+            s = s.sort(*sort_clauses)
+        return s[from_:from_ + size]
+
+    s = s.index().sort(*sort_clauses).extra(size=size, pit={"id": pit["id"], "keep_alive": PIT_KEEP_ALIVE})
+    if pit.get("search_after"):
+        s = s.extra(search_after=pit["search_after"])
+    return s
+
+def paginate_body(body, size=10, from_=0, pit=None, sort=None):
+    """
+    Apply _source filtering, sorting and paging to a raw search body, like paginate_search
+    """
+    body["_source"] = RESULT_SOURCE_FIELDS
+    body["size"] = size
+    sort_clauses = get_sort_clauses(sort, pit)
+    if sort_clauses:
+        body["sort"] = sort_clauses
+    if pit is None:
+        if from_:
+            body["from"] = from_
+        return body
+
+    body["pit"] = {"id": pit["id"], "keep_alive": PIT_KEEP_ALIVE}
+    if pit.get("search_after"):
+        body["search_after"] = pit["search_after"]
+    return body
+
+def build_basic_search(query, size=10):
+    """
+    Build the enhanced basic keyword search with better relevance
     """
     s = Search(using=es_client, index=INDEX_NAME)
-    
+
     # Build the should clauses list
     should_clauses = [
         # Exact matches in name and brand (high boost)
         Q("match_phrase", name={"query": query, "boost": 5.0}),
         Q("match_phrase", brand={"query": query, "boost": 4.0}),
-        
+
         # General field matching
-        Q("multi_match", 
-          query=query, 
+        Q("multi_match",
+          query=query,
           fields=["name^3", "brand^2", "categories", "reviews.text", "reviews.title^2"],
           type="best_fields",
           minimum_should_match="30%")
     ]
-    
+
     # Conditionally add the phrase_prefix query only if query has fewer than 3 words
     if len(query.split()) < 3:
         should_clauses.append(
@@ -31,125 +171,127 @@ def basic_search(query, size=10):
               fields=["name", "reviews.title", "reviews.text"],
               type="phrase_prefix")
         )
-    
+
     # Create the bool query with the should clauses
     q = Q("bool", should=should_clauses)
-    
+
     s = s.query(q)
-    
+
     # Add highlighting
     s = s.highlight_options(pre_tags=['<strong>'], post_tags=['</strong>'])
-    s = s.highlight('name', 'brand', 'reviews.text', 'reviews.title')
-    
-    response = s.execute()
-    
-    return response.hits
+    s = s.highlight('name', 'brand', *REVIEW_HIGHLIGHT_FIELDS)
+
+    return s
 
-def fuzzy_search(query, size=10):
+def build_fuzzy_search(query, size=10):
     """
-    Fuzzy search to handle typos and spelling errors
+    Build the fuzzy search to handle typos and spelling errors.
+
+    Queries are spelling corrected before they get here, so fuzziness is only a
+    fallback for the short name and brand fields; fuzzy expansion over the large
+    review term dictionary was the most expensive part of this query.
     """
     s = Search(using=es_client, index=INDEX_NAME)
-    
-    # Multi-match with fuzziness
-    q = Q("multi_match", 
-          query=query, 
-          fields=["name^3", "brand^2", "categories", "reviews.text", "reviews.title^2"],
-          fuzziness="AUTO")
-    
-    s = s.query(q)
-    response = s.execute()
-    
-    return response.hits
 
-def suggestion_search(prefix, size=5):
+    q = Q("bool", should=[
+        Q("multi_match",
+          query=query,
+          fields=["name^3", "brand^2", "categories", "reviews.text", "reviews.title^2"]),
+        Q("multi_match",
+          query=query,
+          fields=["name^3", "brand^2"],
+          fuzziness="AUTO",
+          prefix_length=1)
+    ])
+
+    return s.query(q)
+
+def build_suggestion_body(prefix, size=5):
     """
-    Provide search suggestions based on product name
+    Build the completion suggester request for product names, weighted by reviews
     """
-    suggest_query = {
+    return {
+        "_source": ["name"],
         "suggest": {
             "name-suggest": {
                 "prefix": prefix,
                 "completion": {
-                    "field": "name.completion",
-                    "size": size
+                    "field": "suggest",
+                    "size": size,
+                    "skip_duplicates": True
                 }
             }
         }
     }
-    
-    response = es_client.search(index=INDEX_NAME, body=suggest_query)
-    suggestions = response["suggest"]["name-suggest"][0]["options"]
-    
-    return [suggestion["text"] for suggestion in suggestions]
 
-def facet_search(query, filters=None, size=10):
+# Facet name -> field aggregated (and filtered) for it
+FACET_FIELDS = {
+    "brands": "brand",
+    "categories": "categories",
+    "manufacturers": "manufacturer",
+    "ratings": "avg_rating"
+}
+
+RATING_RANGES = [
+    {"to": 1.0},
+    {"from": 1.0, "to": 2.0},
+    {"from": 2.0, "to": 3.0},
+    {"from": 3.0, "to": 4.0},
+    {"from": 4.0, "to": 5.0},
+    {"from": 5.0}
+]
+
+def build_facet_aggs(filters=None, size=FACET_SIZE):
     """
-    Faceted search with filtering
+    Build the facet aggregations.
+
+    Hits are filtered with a post_filter, so each facet is wrapped in a filter
+    aggregation that applies every filter except the facet's own. Selecting a
+    brand narrows the category counts but keeps the counts of the other brands.
+    """
+    aggs = {}
+    for name, field in FACET_FIELDS.items():
+        other_filters = {key: value for key, value in (filters or {}).items() if key != field}
+        if name == "ratings":
+            buckets = {"range": {"field": field, "ranges": RATING_RANGES}}
+        else:
+            buckets = {"terms": {"field": field, "size": size}}
+        aggs[name] = {
+            "filter": {"bool": {"filter": build_filter_queries(other_filters)}},
+            "aggs": {"buckets": buckets}
+        }
+    return aggs
+
+def build_facet_search(query, filters=None, size=10, include_facets=True):
+    """
+    Build the faceted search with filtering and, unless include_facets is False
+    (e.g. when the counts are cached), facet aggregations
     """
     s = Search(using=es_client, index=INDEX_NAME)
-    
+
     # Base query
     base_query = Q("multi_match", query=query, fields=["name^3", "brand^2", "categories", "reviews.text", "reviews.title^2"])
     s = s.query(base_query)
-    
-    # Apply filters if provided
-    if filters:
-        for field, values in filters.items():
-            if field == "reviews.rating" and isinstance(values, dict) and "range" in values:
-                # Handle rating range filter
-                range_params = values["range"]
-                s = s.filter("range", **{field: range_params})
-            elif isinstance(values, list):
-                # Create a should query for multiple values of the same field (OR operation)
-                if values:  # Only if the list is not empty
-                    should_queries = [Q("term", **{field: value}) for value in values]
-                    s = s.filter('bool', should=should_queries, minimum_should_match=1)
-            else:
-                # Single value filter
-                s = s.filter("term", **{field: values})
-    
-    # Add aggregations for facets
-    s.aggs.bucket("brands", "terms", field="brand", size=20)
-    s.aggs.bucket("categories", "terms", field="categories", size=20)
-    s.aggs.bucket("manufacturers", "terms", field="manufacturer", size=20)
-    s.aggs.bucket("ratings", "range", field="reviews.rating", ranges=[
-        {"to": 1.0},
-        {"from": 1.0, "to": 2.0},
-        {"from": 2.0, "to": 3.0},
-        {"from": 3.0, "to": 4.0},
-        {"from": 4.0, "to": 5.0},
-        {"from": 5.0}
-    ])
-    
-    # Limit size
-    s = s[0:size]
-    
-    response = s.execute()
-    
-    return {
-        "hits": response.hits,
-        "facets": {
-            "brands": response.aggregations.brands.buckets,
-            "categories": response.aggregations.categories.buckets,
-            "manufacturers": response.aggregations.manufacturers.buckets,
-            "ratings": response.aggregations.ratings.buckets
-        }
-    }
 
-def semantic_search(query, filters=None, size=10):
+    # Filters only narrow the hits; the facet aggregations apply them per facet
+    filter_queries = build_filter_queries(filters)
+    if filter_queries:
+        s = s.post_filter("bool", filter=filter_queries)
+
+    if include_facets:
+        s = s.update_from_dict({"aggs": build_facet_aggs(filters)})
+
+    return s
+
+def build_filter_queries(filters):
     """
-    Semantic search using vector embeddings with pre-filtering
+    Convert search filters to a list of Elasticsearch filter clauses
     """
-    # Get vector embedding for the query
-    query_vector = get_text_embedding(query)
-    
-    # Create filter queries if filters are provided
     filter_queries = []
     if filters:
         for field, values in filters.items():
-            if field == "reviews.rating" and isinstance(values, dict) and "range" in values:
-                # Handle rating range filter
+            if isinstance(values, dict) and "range" in values:
+                # Handle range filters, e.g. on avg_rating
                 range_params = values["range"]
                 filter_queries.append({"range": {field: range_params}})
             elif isinstance(values, list):
@@ -160,19 +302,27 @@ def semantic_search(query, filters=None, size=10):
             else:
                 # Handle single value
                 filter_queries.append({"term": {field: values}})
-    
+    return filter_queries
+
+def build_semantic_body(query_vector, filters=None, size=10, from_=0, num_candidates=None):
+    """
+    Build the kNN search body with pre-filtering. Pages are cut from the top from_ + size neighbors.
+
+    num_candidates (default KNN_NUM_CANDIDATES) trades latency for recall; it is
+    raised to at least k.
+    """
+    filter_queries = build_filter_queries(filters)
+
     # Construct the search body with knn as a top-level parameter
-    search_body = {
-        "size": size,
-        "_source": ["id", "name", "brand", "categories", "reviews"],
+    search_body = paginate_body({
         "knn": {
             "field": "text_vector",
             "query_vector": query_vector,
-            "k": size,
-            "num_candidates": 100
+            "k": from_ + size,
+            "num_candidates": max(num_candidates or KNN_NUM_CANDIDATES, from_ + size)
         }
-    }
-    
+    }, size, from_)
+
     # Add filter if needed
     if filter_queries:
         search_body["knn"]["filter"] = {
@@ -180,40 +330,14 @@ def semantic_search(query, filters=None, size=10):
                 "filter": filter_queries
             }
         }
-    
-    response = es_client.search(
-        index=INDEX_NAME,
-        body=search_body
-    )
-    
-    return response["hits"]["hits"]
 
-def hybrid_search(query, filters=None, size=10):
+    return search_body
+
+def build_keyword_query(query, filter_queries):
     """
-    Hybrid search combining keyword and semantic search with improved relevance
+    Build the keyword part of the hybrid searches
     """
-    # Get vector embedding for the query
-    query_vector = get_text_embedding(query)
-    
-    # Create filter queries if filters are provided
-    filter_queries = []
-    if filters:
-        for field, values in filters.items():
-            if field == "reviews.rating" and isinstance(values, dict) and "range" in values:
-                # Handle rating range filter
-                range_params = values["range"]
-                filter_queries.append({"range": {field: range_params}})
-            elif isinstance(values, list):
-                # Handle list of values (OR operation)
-                if values:
-                    terms_query = {"terms": {field: values}}
-                    filter_queries.append(terms_query)
-            else:
-                # Handle single value
-                filter_queries.append({"term": {field: values}})
-    print(f"Hybrid search filters: {filter_queries}")
-    # Prepare the hybrid query with required keyword match
-    hybrid_query = {
+    return {
         "bool": {
             "must": [
                 # Require at least some keyword match (filters out completely irrelevant docs)
@@ -234,38 +358,423 @@ def hybrid_search(query, filters=None, size=10):
                         "type": "phrase",  # Favor exact phrases
                         "boost": 2.0
                     }
-                },
-                # Vector similarity with controlled influence
-                {
-                    "script_score": {
-                        "query": {"match_all": {}},
-                        "script": {
-                            "source": "cosineSimilarity(params.query_vector, 'text_vector') * 0.5",  # Reduced from 0.7
-                            "params": {"query_vector": query_vector}
-                        }
-                    }
                 }
             ],
             "filter": filter_queries
         }
     }
-    print(f"Final query: {hybrid_query}")
-    response = es_client.search(
-        index=INDEX_NAME,
-        body={
-            "size": size,
-            "query": hybrid_query,
-            "_source": ["id", "name", "brand", "categories", "reviews"],
-            "highlight": {
-                "fields": {
-                    "name": {},
-                    "reviews.text": {},
-                    "reviews.title": {},
-                },
-                "pre_tags": ["<strong>"],
-                "post_tags": ["</strong>"]
+
+def build_hybrid_body(query, query_vector, filters=None, size=10):
+    """
+    Build the hybrid search body combining keyword and vector similarity
+    """
+    filter_queries = build_filter_queries(filters)
+    # Prepare the hybrid query with required keyword match
+    hybrid_query = build_keyword_query(query, filter_queries)
+    # Vector similarity with controlled influence
+    hybrid_query["bool"]["should"].append({
+        "script_score": {
+            "query": {"match_all": {}},
+            "script": {
+                "source": "cosineSimilarity(params.query_vector, 'text_vector') * 0.5",  # Reduced from 0.7
+                "params": {"query_vector": query_vector}
             }
         }
+    })
+    return {
+        "size": size,
+        "query": hybrid_query,
+        "_source": RESULT_SOURCE_FIELDS,
+        "highlight": {
+            "fields": {field: {} for field in ["name"] + REVIEW_HIGHLIGHT_FIELDS},
+            "pre_tags": ["<strong>"],
+            "post_tags": ["</strong>"]
+        }
+    }
+
+def build_rrf_bodies(query, query_vector, filters=None, size=10, num_candidates=None):
+    """
+    Build the BM25 and approximate kNN requests fused by the RRF hybrid mode.
+
+    Each request retrieves a window of at least HYBRID_RRF_WINDOW_SIZE candidates.
+    """
+    filter_queries = build_filter_queries(filters)
+    window = max(size, HYBRID_RRF_WINDOW_SIZE)
+
+    bm25_body = {
+        "size": window,
+        "query": build_keyword_query(query, filter_queries),
+        "_source": RESULT_SOURCE_FIELDS,
+        "highlight": {
+            "fields": {field: {} for field in ["name"] + REVIEW_HIGHLIGHT_FIELDS},
+            "pre_tags": ["<strong>"],
+            "post_tags": ["</strong>"]
+        }
+    }
+    knn_body = build_semantic_body(query_vector, filters, window, num_candidates=num_candidates)
+
+    return bm25_body, knn_body
+
+def build_rrf_server_body(query, query_vector, filters=None, size=10, from_=0, num_candidates=None):
+    """
+    Build a single request fused by Elasticsearch's own RRF ranking (ES 8.8+).
+    Elasticsearch does not support per-retriever weights here, and rejects
+    `from` and highlighting combined with `rank`, so only first pages without
+    highlights can be served. Raises ValueError for a later page.
+    """
+    if from_:
+        raise ValueError("Paging with from is not supported by server-side RRF (HYBRID_RRF_SERVER_SIDE)")
+    bm25_body, knn_body = build_rrf_bodies(query, query_vector, filters, size, num_candidates)
+    bm25_body["size"] = size
+    bm25_body.pop("highlight")
+    bm25_body["knn"] = knn_body["knn"]
+    bm25_body["rank"] = {
+        "rrf": {
+            "window_size": max(size, HYBRID_RRF_WINDOW_SIZE),
+            "rank_constant": HYBRID_RRF_RANK_CONSTANT
+        }
+    }
+    return bm25_body
+
+def reciprocal_rank_fusion(result_lists, weights, rank_constant=60, size=10):
+    """
+    Fuse ranked hit lists with Reciprocal Rank Fusion.
+
+    Each hit scores sum(weight / (rank_constant + rank)) over the lists it appears in.
+    The first list's copy of a hit is kept, so put the list with highlights first.
+    """
+    scores = {}
+    hits = {}
+    for result_hits, weight in zip(result_lists, weights):
+        for rank, hit in enumerate(result_hits, start=1):
+            scores[hit["_id"]] = scores.get(hit["_id"], 0.0) + weight / (rank_constant + rank)
+            hits.setdefault(hit["_id"], hit)
+
+    ranked = sorted(scores, key=scores.get, reverse=True)[:size]
+    return [{**hits[doc_id], "_score": scores[doc_id]} for doc_id in ranked]
+
+def get_facet_counts(aggregations):
+    """
+    Convert the facet aggregations of a response to {facet: [{"key", "doc_count"}]}
+    """
+    return {
+        name: [{"key": bucket["key"], "doc_count": bucket["doc_count"]}
+               for bucket in aggregations[name]["buckets"]["buckets"]]
+        for name in FACET_FIELDS
+    }
+
+def get_facet_results(response):
+    """
+    Split a faceted search response into hits and facet counts (None without aggregations)
+    """
+    aggregations = response.to_dict().get("aggregations")
+    return {
+        "hits": response.hits,
+        "facets": get_facet_counts(aggregations) if aggregations else None
+    }
+
+def build_facet_options_body(size=FACET_OPTIONS_SIZE):
+    """
+    Aggregate every brand, category and manufacturer in the index, for the filter sidebar
+    """
+    return {
+        "size": 0,
+        "aggs": {
+            name: {"terms": {"field": field, "size": size}}
+            for name, field in FACET_FIELDS.items() if name != "ratings"
+        }
+    }
+
+def get_facet_options(response):
+    """Sorted facet values from a build_facet_options_body response"""
+    return {name: sorted(bucket["key"] for bucket in aggregation["buckets"])
+            for name, aggregation in response["aggregations"].items()}
+
+def basic_search(query, size=10, from_=0, pit=None, sort=None):
+    """
+    Enhanced basic keyword search with better relevance
+    """
+    s = paginate_search(build_basic_search(query, size), size, from_, pit, sort)
+    response = s.params(**get_search_params(query, pit=pit)).execute()
+    record_es_took(response)
+    update_pit(pit, response)
+
+    return response.hits
+
+def fuzzy_search(query, size=10, from_=0, pit=None, sort=None):
+    """
+    Fuzzy search to handle typos and spelling errors
+    """
+    s = paginate_search(build_fuzzy_search(query, size), size, from_, pit, sort)
+    response = s.params(**get_search_params(query, pit=pit)).execute()
+    record_es_took(response)
+    update_pit(pit, response)
+
+    return response.hits
+
+def suggestion_search(prefix, size=5):
+    """
+    Provide search suggestions based on product name
+    """
+    response = es_client.search(index=INDEX_NAME, body=build_suggestion_body(prefix, size))
+    suggestions = response["suggest"]["name-suggest"][0]["options"]
+
+    # Inputs include word suffixes of the name, so return the name itself
+    return [suggestion["_source"]["name"] for suggestion in suggestions]
+
+def facet_search(query, filters=None, size=10, from_=0, pit=None, include_facets=True, sort=None):
+    """
+    Faceted search with filtering
+    """
+    s = paginate_search(build_facet_search(query, filters, size, include_facets), size, from_, pit, sort)
+    response = s.params(**get_search_params(query, filters, pit, request_cache=include_facets)).execute()
+    record_es_took(response)
+    update_pit(pit, response)
+
+    return get_facet_results(response)
+
+def semantic_search(query, filters=None, size=10, from_=0, num_candidates=None, query_vector=None):
+    """
+    Semantic search using vector embeddings with pre-filtering
+    """
+    # Get vector embedding for the query, unless the caller already has it
+    if query_vector is None:
+        query_vector = get_query_embedding(query)
+
+    response = es_client.search(
+        index=INDEX_NAME,
+        body=build_semantic_body(query_vector, filters, size, from_, num_candidates),
+        **get_search_params(query, filters)
+    )
+    record_es_took(response)
+
+    return response["hits"]["hits"]
+
+def hybrid_search(query, filters=None, size=10, from_=0, pit=None, query_vector=None, sort=None):
+    """
+    Hybrid search combining keyword and semantic search with improved relevance
+    """
+    # Get vector embedding for the query, unless the caller already has it
+    if query_vector is None:
+        query_vector = get_query_embedding(query)
+
+    response = es_client.search(
+        index=get_search_index(pit),
+        body=paginate_body(build_hybrid_body(query, query_vector, filters, size), size, from_, pit, sort),
+        **get_search_params(query, filters, pit)
     )
-    
-    return response["hits"]["hits"]
\ No newline at end of file
+    record_es_took(response)
+    update_pit(pit, response)
+
+    return response["hits"]["hits"]
+
+def rrf_hybrid_search(query, filters=None, size=10, from_=0, num_candidates=None, query_vector=None):
+    """
+    Hybrid search fusing BM25 and approximate kNN results with Reciprocal Rank Fusion
+    """
+    if query_vector is None:
+        query_vector = get_query_embedding(query)
+
+    if HYBRID_RRF_SERVER_SIDE:
+        response = es_client.search(index=INDEX_NAME, body=build_rrf_server_body(query, query_vector, filters, size, from_, num_candidates),
+                                   **get_search_params(query, filters))
+        record_es_took(response)
+        return response["hits"]["hits"]
+
+    # Both requests go out in one msearch round trip and run concurrently in ES
+    bm25_body, knn_body = build_rrf_bodies(query, query_vector, filters, from_ + size, num_candidates)
+    header = {"index": INDEX_NAME, **get_search_params(query, filters)}
+    response = es_client.msearch(searches=[header, bm25_body, header, knn_body])
+    record_es_took(response)
+
+    result_lists = []
+    for item in response["responses"]:
+        if "error" in item:
+            raise RuntimeError(f"RRF hybrid sub-search failed: {item['error']}")
+        result_lists.append(item["hits"]["hits"])
+
+    fused = reciprocal_rank_fusion(result_lists, [HYBRID_RRF_BM25_WEIGHT, HYBRID_RRF_KNN_WEIGHT],
+                                   HYBRID_RRF_RANK_CONSTANT, from_ + size)
+    return fused[from_:]
+
+def open_point_in_time():
+    """
+    Open a point in time on the live index for search_after paging
+    """
+    return es_client.open_point_in_time(index=INDEX_NAME, keep_alive=PIT_KEEP_ALIVE)["id"]
+
+def close_point_in_time(pit_id):
+    """
+    Release a point in time after its last page; one that already expired is ignored
+    """
+    try:
+        es_client.close_point_in_time(id=pit_id)
+    except NotFoundError:
+        pass
+
+async def execute_async(s):
+    """
+    Execute an elasticsearch_dsl Search with the async client
+    """
+    response = await async_es_client.search(index=s._index, body=s.to_dict(), **s._params)
+    return Response(s, response.body)
+
+async def async_basic_search(query, size=10, from_=0, pit=None, sort=None):
+    """
+    Async version of basic_search
+    """
+    s = paginate_search(build_basic_search(query, size), size, from_, pit, sort)
+    response = await execute_async(s.params(**get_search_params(query, pit=pit)))
+    record_es_took(response)
+    update_pit(pit, response)
+
+    return response.hits
+
+async def async_fuzzy_search(query, size=10, from_=0, pit=None, sort=None):
+    """
+    Async version of fuzzy_search
+    """
+    s = paginate_search(build_fuzzy_search(query, size), size, from_, pit, sort)
+    response = await execute_async(s.params(**get_search_params(query, pit=pit)))
+    record_es_took(response)
+    update_pit(pit, response)
+
+    return response.hits
+
+async def async_suggestion_search(prefix, size=5):
+    """
+    Async version of suggestion_search
+    """
+    response = await async_es_client.search(index=INDEX_NAME, body=build_suggestion_body(prefix, size))
+    suggestions = response["suggest"]["name-suggest"][0]["options"]
+
+    # Inputs include word suffixes of the name, so return the name itself
+    return [suggestion["_source"]["name"] for suggestion in suggestions]
+
+async def async_facet_search(query, filters=None, size=10, from_=0, pit=None, include_facets=True, sort=None):
+    """
+    Async version of facet_search
+    """
+    s = paginate_search(build_facet_search(query, filters, size, include_facets), size, from_, pit, sort)
+    response = await execute_async(s.params(**get_search_params(query, filters, pit, request_cache=include_facets)))
+    record_es_took(response)
+    update_pit(pit, response)
+
+    return get_facet_results(response)
+
+async def async_semantic_search(query, filters=None, size=10, from_=0, num_candidates=None, query_vector=None):
+    """
+    Async version of semantic_search. The query is embedded on the embedding executor.
+    """
+    if query_vector is None:
+        query_vector = await aget_query_embedding(query)
+
+    response = await async_es_client.search(
+        index=INDEX_NAME,
+        body=build_semantic_body(query_vector, filters, size, from_, num_candidates),
+        **get_search_params(query, filters)
+    )
+    record_es_took(response)
+
+    return response["hits"]["hits"]
+
+async def async_hybrid_search(query, filters=None, size=10, from_=0, pit=None, query_vector=None, sort=None):
+    """
+    Async version of hybrid_search. The query is embedded on the embedding executor.
+    """
+    if query_vector is None:
+        query_vector = await aget_query_embedding(query)
+
+    response = await async_es_client.search(
+        index=get_search_index(pit),
+        body=paginate_body(build_hybrid_body(query, query_vector, filters, size), size, from_, pit, sort),
+        **get_search_params(query, filters, pit)
+    )
+    record_es_took(response)
+    update_pit(pit, response)
+
+    return response["hits"]["hits"]
+
+async def async_rrf_hybrid_search(query, filters=None, size=10, from_=0, num_candidates=None, query_vector=None):
+    """
+    Async version of rrf_hybrid_search. The BM25 and kNN requests run concurrently.
+    """
+    if query_vector is None:
+        query_vector = await aget_query_embedding(query)
+
+    if HYBRID_RRF_SERVER_SIDE:
+        response = await async_es_client.search(index=INDEX_NAME, body=build_rrf_server_body(query, query_vector, filters, size, from_, num_candidates),
+                                               **get_search_params(query, filters))
+        record_es_took(response)
+        return response["hits"]["hits"]
+
+    bm25_body, knn_body = build_rrf_bodies(query, query_vector, filters, from_ + size, num_candidates)
+    params = get_search_params(query, filters)
+    bm25_response, knn_response = await asyncio.gather(
+        async_es_client.search(index=INDEX_NAME, body=bm25_body, **params),
+        async_es_client.search(index=INDEX_NAME, body=knn_body, **params)
+    )
+    record_es_took(bm25_response, knn_response)
+
+    fused = reciprocal_rank_fusion(
+        [bm25_response["hits"]["hits"], knn_response["hits"]["hits"]],
+        [HYBRID_RRF_BM25_WEIGHT, HYBRID_RRF_KNN_WEIGHT],
+        HYBRID_RRF_RANK_CONSTANT,
+        from_ + size
+    )
+    return fused[from_:]
+
+async def async_open_point_in_time():
+    """
+    Async version of open_point_in_time
+    """
+    response = await async_es_client.open_point_in_time(index=INDEX_NAME, keep_alive=PIT_KEEP_ALIVE)
+    return response["id"]
+
+async def async_close_point_in_time(pit_id):
+    """
+    Async version of close_point_in_time
+    """
+    try:
+        await async_es_client.close_point_in_time(id=pit_id)
+    except NotFoundError:
+        pass
+
+async def async_get_product_reviews(product_id, from_=0, size=20):
+    """
+    Return the total and a page of the full reviews of a product, or None if the
+    product does not exist. With REVIEW_INDEX_ENABLED only the page is fetched,
+    from the review index.
+    """
+    if REVIEW_INDEX_ENABLED:
+        response = await async_es_client.search(
+            index=REVIEW_INDEX_NAME,
+            query={"term": {"product_id": product_id}},
+            sort=[{"position": {"order": "asc"}}],
+            from_=from_,
+            size=size,
+            routing=product_id,
+            track_total_hits=True,
+            source_excludes=["product_id", "position"]
+        )
+        total = response["hits"]["total"]["value"]
+        if not total:
+            return None
+        return total, [hit["_source"] for hit in response["hits"]["hits"]]
+
+    if INDEX_ROUTING_FIELD:
+        # A get needs the routing value, which the id alone does not give
+        response = await async_es_client.search(index=INDEX_NAME, query={"ids": {"values": [product_id]}},
+                                                source_includes=["reviews"], size=1)
+        hits = response["hits"]["hits"]
+        if not hits:
+            return None
+        source = hits[0]["_source"]
+    else:
+        try:
+            response = await async_es_client.get(index=INDEX_NAME, id=product_id, source_includes=["reviews"])
+        except NotFoundError:
+            return None
+        source = response["_source"]
+    reviews = source.get("reviews", [])
+    return len(reviews), reviews[from_:from_ + size]
@@ -1,140 +1,331 @@
 import uvicorn
-from fastapi import FastAPI, Request, Form, Query
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Request, Form, Query, HTTPException, BackgroundTasks
+from fastapi.responses import HTMLResponse, ORJSONResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from typing import Optional, List
+import asyncio
 import os
 import json
 
-from app.elasticsearch.index import create_index, bulk_index_documents
-from app.utils.data_loader import create_metadata_file
+from app.elasticsearch.index import (
+    alias_exists,
+    build_index,
+    incremental_index_documents
+)
 from app.services.search import SearchService
+from app.services.embedding import embedding_cache, get_cache_stats, get_model
+from app.services.autocomplete import save_query_counts, save_query_counts_periodically
+from app.services.spelling import get_spelling
+from app.services.vector_index import get_vector_index, VectorIndexUnavailable
+from app.services.facets import aget_facet_options, refresh_facets
+from app.services.metrics import track_request, span, render_metrics
+from app.services.profiling import start_profiler, stop_profiler
+from app.elasticsearch.client import async_es_client
 
 from app.config import (
-    DATA_CSV_PATH,
+    INDEX_NAME,
     DATA_METADATA_PATH,
+    MAX_RESULT_WINDOW,
+    REVIEWS_PAGE_SIZE,
+    PROFILING_ENABLED,
+    EMBEDDING_PRELOAD,
+    SEMANTIC_BACKEND,
 )
 
-app = FastAPI(title="Amazon Product Search")
+# Responses are serialized with orjson
+app = FastAPI(title="Amazon Product Search", default_response_class=ORJSONResponse)
 
 # Mount static files and templates
 templates = Jinja2Templates(directory="templates")
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
-create_index()
-print("Index creation complete.")
 
-# Create metadata file
-print(f"Creating metadata file at {DATA_METADATA_PATH}...")
-metadata = create_metadata_file(DATA_CSV_PATH, DATA_METADATA_PATH)
-print(f"Created metadata with {len(metadata['categories'])} categories, {len(metadata['brands'])} brands, and {len(metadata['manufacturers'])} manufacturers")
+# Filter options used when the index cannot be reached (written by the index build command)
+metadata = {"categories": [], "brands": [], "manufacturers": []}
+if os.path.exists(DATA_METADATA_PATH):
+    with open(DATA_METADATA_PATH, "r") as f:
+        metadata = json.load(f)
+
+if PROFILING_ENABLED:
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        """
+        Return a profile of the request instead of its body when the X-Profile header
+        is set. The profile keeps the response's status code and starts with its
+        status line, followed by the response body when the request failed.
+        """
+        profiler = start_profiler() if "x-profile" in request.headers else None
+        if profiler is None:
+            return await call_next(request)
+        try:
+            response = await call_next(request)
+            body = b"".join([chunk async for chunk in response.body_iterator])
+        finally:
+            report = stop_profiler(profiler)
+        summary = f"{request.method} {request.url.path} -> {response.status_code}\n"
+        if response.status_code >= 400:
+            summary += body.decode("utf-8", errors="replace") + "\n"
+        return PlainTextResponse(f"{summary}\n{report}", status_code=response.status_code,
+                                 headers={"X-Profiled-Status": str(response.status_code)})
+
+# Saves the popular query counts while the app runs
+query_counts_task = None
+
+@app.on_event("startup")
+async def verify_index():
+    """
+    Check that the live index alias exists. Indexing is done by `python -m app.cli index`.
+    """
+    if await async_es_client.indices.exists_alias(name=INDEX_NAME):
+        print(f"Index alias '{INDEX_NAME}' found.")
+    else:
+        print(f"Index alias '{INDEX_NAME}' not found. Build it with `python -m app.cli index`.")
+
+    global query_counts_task
+    query_counts_task = asyncio.ensure_future(save_query_counts_periodically())
+
+    # Build the spelling dictionary before the first query rather than on it
+    await asyncio.get_running_loop().run_in_executor(None, get_spelling)
+
+    if SEMANTIC_BACKEND == "local":
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, get_vector_index)
+        except VectorIndexUnavailable as e:
+            print(e)
 
-# Index documents
-print(f"Indexing documents from {DATA_CSV_PATH}...")
-success, failed = bulk_index_documents(DATA_CSV_PATH)
-print(f"Indexing complete. Successfully indexed: {success}, Failed: {failed}")
+    if EMBEDDING_PRELOAD:
+        # Pay the model load at startup rather than on the first semantic query
+        await asyncio.get_running_loop().run_in_executor(None, get_model)
 
-# Load metadata for filtering options
-with open(os.path.join("data", "metadata.json"), "r") as f:
-    metadata = json.load(f)
+@app.on_event("shutdown")
+async def close_clients():
+    """
+    Close the async Elasticsearch connection pool, save popular queries and
+    write the buffered embedding cache recency
+    """
+    if query_counts_task is not None:
+        query_counts_task.cancel()
+    await async_es_client.close()
+    save_query_counts()
+    if embedding_cache is not None:
+        embedding_cache.flush()
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """Render the main search page"""
+    options = await aget_facet_options() or metadata
     return templates.TemplateResponse(
         "index.html", 
         {
             "request": request,
-            "categories": metadata["categories"],
-            "brands": metadata["brands"],
-            "manufacturers": metadata["manufacturers"]
+            "categories": options["categories"],
+            "brands": options["brands"],
+            "manufacturers": options["manufacturers"]
         }
     )
 
-@app.get("/api/search")
-async def search(
-    q: str = Query(..., min_length=1),
-    search_type: str = Query("hybrid", regex="^(basic|fuzzy|faceted|semantic|hybrid)$"),
-    category: Optional[List[str]] = Query(None),
-    brand: Optional[List[str]] = Query(None),
-    manufacturer: Optional[str] = Query(None),
-    min_rating: float = Query(0.0, ge=0.0, le=5.0),
-    max_rating: float = Query(5.0, ge=0.0, le=5.0),
-    size: int = Query(10, ge=1, le=100)
-):
+SEARCH_TYPES = ["basic", "fuzzy", "faceted", "semantic", "hybrid", "hybrid_rrf"]
+
+def build_filters(category, brand, manufacturer, min_rating, max_rating, primary_category=None):
     """
-    Search API endpoint
+    Build the search filters from the query parameters
     """
-    # Prepare filters
     filters = {}
     if category:
         filters["categories"] = category
+    if primary_category:
+        filters["primary_category"] = primary_category
     if brand:
         filters["brand"] = brand
     if manufacturer:
         filters["manufacturer"] = manufacturer
-
-    print(f"Search query: {q}, Type: {search_type}, Filters: {filters}, Size: {size}")
-        
-    # Add rating filter
+    
+    # Rating filter on the average rating computed at index time
     if min_rating > 0.0 or max_rating < 5.0:
-        filters["reviews.rating"] = {
+        filters["avg_rating"] = {
             "range": {
                 "gte": min_rating,
                 "lte": max_rating
             }
         }
+    return filters
+
+@app.get("/api/search")
+async def search(
+    q: str = Query(..., min_length=1),
+    search_type: str = Query("hybrid", regex="^(basic|fuzzy|faceted|semantic|hybrid|hybrid_rrf)$"),
+    category: Optional[List[str]] = Query(None),
+    primary_category: Optional[List[str]] = Query(None),
+    brand: Optional[List[str]] = Query(None),
+    manufacturer: Optional[str] = Query(None),
+    min_rating: float = Query(0.0, ge=0.0, le=5.0),
+    max_rating: float = Query(5.0, ge=0.0, le=5.0),
+    size: int = Query(10, ge=1, le=100),
+    from_: int = Query(0, alias="from", ge=0),
+    cursor: Optional[str] = Query(None),
+    num_candidates: Optional[int] = Query(None, ge=1, le=10000),
+    sort: str = Query("relevance", regex="^(relevance|rating|reviews)$"),
+    correct: bool = Query(True)
+):
+    """
+    Search API endpoint.
+
+    Page with `from` up to MAX_RESULT_WINDOW results. For deeper paging pass
+    `cursor=*` and then the returned `next_cursor` to get each following page.
+    `num_candidates` overrides the kNN candidates of semantic and hybrid_rrf search.
+    `primary_category` filters on a product's top-level category; with
+    INDEX_ROUTING_FIELD=primary_category only the shards holding it are searched.
+    `sort` orders basic, fuzzy, faceted and hybrid results by average rating or
+    review count instead of relevance. Misspelled query terms are corrected before
+    searching and the response includes `corrected_query`; pass `correct=false`
+    to search for the query as typed.
+    """
+    if from_ + size > MAX_RESULT_WINDOW:
+        raise HTTPException(status_code=400, detail=f"from + size must not exceed {MAX_RESULT_WINDOW}, use cursor paging instead")
+    if cursor is not None and from_:
+        raise HTTPException(status_code=400, detail="from cannot be combined with cursor")
+
+    filters = build_filters(category, brand, manufacturer, min_rating, max_rating, primary_category)
     
-    # Execute search
-    if search_type == "faceted":
-        results = SearchService.search(q, search_type=search_type, filters=filters, size=size)
-        return {
-            "results": [hit.to_dict() for hit in results["hits"]],
-            "facets": {
-                "brands": [{"key": bucket.key, "doc_count": bucket.doc_count} for bucket in results["facets"]["brands"]],
-                "categories": [{"key": bucket.key, "doc_count": bucket.doc_count} for bucket in results["facets"]["categories"]],
-                "manufacturers": [{"key": bucket.key, "doc_count": bucket.doc_count} for bucket in results["facets"]["manufacturers"]],
-                "ratings": [{"key": bucket.key, "doc_count": bucket.doc_count} for bucket in results["facets"]["ratings"]]
-            }
-        }
-    else:
-        # For non-faceted search types, we need to apply the filters in the service layer
-        results = SearchService.search(q, search_type=search_type, filters=filters, size=size)
-        if search_type in ["semantic", "hybrid"]:
-            # Format results from direct ES response
-            return {
-                "results": [{"id": hit["_id"], **hit["_source"]} for hit in results]
-            }
-        else:
-            # Format results from elasticsearch_dsl response
-            return {
-                "results": [hit.to_dict() for hit in results]
-            }
+    with track_request("search", search_type, q) as timer:
+        try:
+            payload = await SearchService.async_search(q, search_type=search_type, filters=filters, size=size,
+                                                       from_=from_, cursor=cursor, num_candidates=num_candidates,
+                                                       sort=sort, correct=correct)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except VectorIndexUnavailable as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        
+        with span("serialize"):
+            response = ORJSONResponse(payload)
+        response.headers["Server-Timing"] = timer.server_timing()
+        return response
+
+@app.get("/api/search/multi")
+async def multi_search(
+    q: str = Query(..., min_length=1),
+    search_type: List[str] = Query(["basic", "semantic", "hybrid"]),
+    category: Optional[List[str]] = Query(None),
+    primary_category: Optional[List[str]] = Query(None),
+    brand: Optional[List[str]] = Query(None),
+    manufacturer: Optional[str] = Query(None),
+    min_rating: float = Query(0.0, ge=0.0, le=5.0),
+    max_rating: float = Query(5.0, ge=0.0, le=5.0),
+    size: int = Query(10, ge=1, le=100),
+    from_: int = Query(0, alias="from", ge=0),
+    num_candidates: Optional[int] = Query(None, ge=1, le=10000),
+    correct: bool = Query(True)
+):
+    """
+    Run several search types (repeat `search_type`) for one query concurrently and
+    return each result set with its timing
+    """
+    unknown = [value for value in search_type if value not in SEARCH_TYPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown search type(s): {', '.join(unknown)}")
+    if from_ + size > MAX_RESULT_WINDOW:
+        raise HTTPException(status_code=400, detail=f"from + size must not exceed {MAX_RESULT_WINDOW}")
+    
+    filters = build_filters(category, brand, manufacturer, min_rating, max_rating, primary_category)
+    
+    with track_request("search_multi", "multi", q) as timer:
+        payload = await SearchService.async_multi_search(q, search_type, filters=filters, size=size, from_=from_,
+                                                         num_candidates=num_candidates, correct=correct)
+        with span("serialize"):
+            response = ORJSONResponse(payload)
+        response.headers["Server-Timing"] = timer.server_timing()
+        return response
+
+@app.get("/api/products/{product_id}/reviews")
+async def product_reviews(
+    product_id: str,
+    from_: int = Query(0, alias="from", ge=0),
+    size: int = Query(REVIEWS_PAGE_SIZE, ge=1, le=100)
+):
+    """
+    Page through the full reviews of a product; search results only carry a preview
+    """
+    with track_request("product_reviews", "reviews"):
+        payload = await SearchService.async_get_product_reviews(product_id, from_=from_, size=size)
+    if payload is None:
+        raise HTTPException(status_code=404, detail=f"Product {product_id} not found")
+    return payload
 
 @app.get("/api/suggestions")
 async def suggestions(prefix: str = Query(..., min_length=1)):
     """
     Get search suggestions based on prefix
     """
-    suggestions = SearchService.get_suggestions(prefix)
+    with track_request("suggestions", "suggestions", prefix):
+        suggestions = await SearchService.async_get_suggestions(prefix)
     return {"suggestions": suggestions}
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Request and stage latency histograms in the Prometheus text format
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/stats/embedding-cache")
+async def embedding_cache_stats():
+    """
+    Hit/miss counters of the query and disk embedding caches
+    """
+    return get_cache_stats()
+
+# Plain functions, so FastAPI runs them on its thread pool: counting Redis entries scans keys
+@app.get("/api/stats/result-cache")
+def result_cache_stats():
+    """
+    Hit ratio and latency saved by the search result cache
+    """
+    return SearchService.get_cache_stats()
+
+@app.get("/api/stats/facet-cache")
+def facet_cache_stats():
+    """
+    Hit ratio of the facet count cache
+    """
+    return SearchService.get_facet_cache_stats()
+
 @app.post("/api/index")
-async def index_data(csv_path: str = Form(...)):
+def index_data(
+    background_tasks: BackgroundTasks,
+    csv_path: str = Form(...),
+    mode: str = Form("bulk", regex="^(bulk|stream|incremental)$"),
+    chunk_size: Optional[int] = Form(None, ge=1)
+):
     """
-    Create index and load data (admin operation)
+    Build or update the index from a CSV file (admin operation). The hottest
+    facet counts are recomputed after the response is sent.
     """
     try:
-        # Create the index
-        create_index()
+        if mode == "incremental" and alias_exists():
+            # Only re-embed products whose content changed
+            report = incremental_index_documents(csv_path)
+            SearchService.invalidate_cache()
+            background_tasks.add_task(refresh_facets)
+            return {
+                "success": True,
+                "added": report["added"],
+                "updated": report["updated"],
+                "unchanged": report["unchanged"],
+                "deleted": report["deleted"],
+                "failed_documents": report["errors"]
+            }
         
-        # Index the documents
-        success, failed = bulk_index_documents(csv_path)
+        # Build a new index version and swap the alias to it
+        report = build_index(csv_path, stream=(mode == "stream"), chunk_size=chunk_size)
+        SearchService.invalidate_cache()
+        background_tasks.add_task(refresh_facets)
         
         return {
             "success": True,
-            "indexed_documents": success,
-            "failed_documents": failed
+            "index": report["index"],
+            "indexed_documents": report["indexed"],
+            "failed_documents": report["failed"]
         }
     except Exception as e:
         return {
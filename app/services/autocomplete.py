@@ -0,0 +1,262 @@
+import asyncio
+import bisect
+import fcntl
+import heapq
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+from app.config import (
+    AUTOCOMPLETE_PATH,
+    AUTOCOMPLETE_QUERIES_PATH,
+    AUTOCOMPLETE_TOP_K,
+    AUTOCOMPLETE_PRECOMPUTED_PREFIX,
+    AUTOCOMPLETE_MIN_QUERY_COUNT,
+    AUTOCOMPLETE_MAX_TRACKED_QUERIES,
+    AUTOCOMPLETE_MAX_SAVED_QUERIES,
+    AUTOCOMPLETE_MAX_QUERY_LENGTH,
+    AUTOCOMPLETE_QUERIES_FLUSH_SECONDS
+)
+
+def normalize_suggestion(text):
+    """Lowercase and collapse whitespace so prefixes match case-insensitively"""
+    return re.sub(r"\s+", " ", str(text).strip().lower())
+
+def get_suggestion_keys(text):
+    """
+    Return the keys a suggestion is found under: the whole text and every
+    suffix starting at a word, so "kindle" also completes "amazon kindle paperwhite"
+    """
+    words = normalize_suggestion(text).split(" ")
+    return [" ".join(words[i:]) for i in range(len(words)) if words[i]]
+
+def get_product_weight(document):
+    """
+    Rank products by review count and average rating
+    """
+    reviews = document.get("reviews") or []
+    ratings = [review["rating"] for review in reviews
+               if review.get("rating") is not None and not math.isnan(review["rating"])]
+    if not ratings:
+        return 0.0
+    avg_rating = sum(ratings) / len(ratings)
+    return len(reviews) * avg_rating
+
+def build_suggest_field(document):
+    """
+    Build the completion suggester input for the ES `suggest` field, used as fallback
+    """
+    return {
+        "input": get_suggestion_keys(document["name"]),
+        "weight": max(1, int(round(get_product_weight(document))))
+    }
+
+class Autocomplete:
+    """
+    In-memory autocomplete over product names and popular queries.
+
+    Keys (normalized word-start suffixes) are kept in one sorted list. The top-k
+    suggestions of every prefix up to precomputed_prefix characters are computed
+    when the structure is built, since short prefixes match the most keys. Longer
+    prefixes match a narrow range of the sorted keys, found with bisect.
+    """
+
+    def __init__(self, entries, top_k=None, precomputed_prefix=None):
+        # entries is a list of (text, weight)
+        self.top_k = top_k or AUTOCOMPLETE_TOP_K
+        self.precomputed_prefix = precomputed_prefix or AUTOCOMPLETE_PRECOMPUTED_PREFIX
+
+        # Highest weight first, so entry ids also order suggestions
+        entries = sorted(entries, key=lambda entry: -entry[1])
+        self.texts = [text for text, _ in entries]
+
+        pairs = []
+        for entry_id, (text, _) in enumerate(entries):
+            for key in get_suggestion_keys(text):
+                pairs.append((key, entry_id))
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.key_entries = [entry_id for _, entry_id in pairs]
+
+        self.top = {}
+        for entry_id, text in enumerate(self.texts):
+            prefixes = {key[:length] for key in get_suggestion_keys(text)
+                        for length in range(1, min(len(key), self.precomputed_prefix) + 1)}
+            for prefix in prefixes:
+                suggestions = self.top.setdefault(prefix, [])
+                if len(suggestions) < self.top_k:
+                    suggestions.append(entry_id)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def suggest(self, prefix, size=5):
+        """
+        Return up to size suggestions for a prefix, highest weight first
+        """
+        prefix = normalize_suggestion(prefix)
+        if not prefix:
+            return []
+
+        if len(prefix) <= self.precomputed_prefix and size <= self.top_k:
+            return [self.texts[entry_id] for entry_id in self.top.get(prefix, [])[:size]]
+
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + "\uffff", start)
+        entry_ids = heapq.nsmallest(size, set(self.key_entries[start:end]))
+        return [self.texts[entry_id] for entry_id in entry_ids]
+
+class AutocompleteBuilder:
+    """
+    Collect product suggestions at index time and write the autocomplete file.
+
+    The file keeps one entry per product id, so an incremental reindex can load
+    it, apply the changed and deleted products and save it again.
+    """
+
+    def __init__(self, products=None):
+        self.products = products or {}
+
+    @classmethod
+    def load(cls, path=None):
+        """Load the products of an existing autocomplete file, or None if there is none"""
+        path = path or AUTOCOMPLETE_PATH
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return cls(json.load(f)["products"])
+
+    def add(self, document):
+        self.products[str(document["id"])] = [document["name"], get_product_weight(document)]
+
+    def remove(self, product_id):
+        self.products.pop(str(product_id), None)
+
+    def save(self, path=None):
+        """
+        Write the products and the current popular queries to the autocomplete file
+        """
+        path = path or AUTOCOMPLETE_PATH
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        queries = {query: count for query, count in load_query_counts().items()
+                   if count >= AUTOCOMPLETE_MIN_QUERY_COUNT}
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"products": self.products, "queries": queries}, f)
+        os.replace(tmp_path, path)
+        print(f"Saved autocomplete with {len(self.products)} products and {len(queries)} queries to '{path}'")
+
+def load_autocomplete(path):
+    """Build the in-memory structure from an autocomplete file"""
+    with open(path, "r") as f:
+        data = json.load(f)
+
+    # The same text can be a product name and a query; keep the highest weight
+    weights = {}
+    for text, weight in list(data["products"].values()) + list(data["queries"].items()):
+        weights[text] = max(weight, weights.get(text, 0))
+    return Autocomplete(list(weights.items()))
+
+_loaded_autocomplete = None
+_loaded_mtime = None
+_load_lock = threading.Lock()
+
+def get_autocomplete():
+    """
+    Return the autocomplete structure at AUTOCOMPLETE_PATH, reloading it after a
+    rebuild, or None if it has not been built
+    """
+    global _loaded_autocomplete, _loaded_mtime
+    try:
+        mtime = os.path.getmtime(AUTOCOMPLETE_PATH)
+    except OSError:
+        return None
+
+    with _load_lock:
+        if _loaded_autocomplete is None or mtime != _loaded_mtime:
+            _loaded_autocomplete = load_autocomplete(AUTOCOMPLETE_PATH)
+            _loaded_mtime = mtime
+        return _loaded_autocomplete
+
+# Searches counted since the last save, merged into AUTOCOMPLETE_QUERIES_PATH
+_query_counts = Counter()
+_query_lock = threading.Lock()
+
+# Long digit runs (phone, card, order and account numbers) are never counted or suggested
+PRIVATE_PATTERN = re.compile(r"\d{5,}")
+
+def is_recordable_query(query):
+    """
+    True if a preprocessed query may become a suggestion: it has a letter, is at
+    most AUTOCOMPLETE_MAX_QUERY_LENGTH characters and has no long digit runs
+    """
+    return (2 <= len(query) <= AUTOCOMPLETE_MAX_QUERY_LENGTH and any(c.isalpha() for c in query)
+            and not PRIVATE_PATTERN.search(query))
+
+def record_query(query):
+    """
+    Count a (preprocessed) search query for popular query suggestions. Once
+    AUTOCOMPLETE_MAX_TRACKED_QUERIES distinct queries are counted, new ones are
+    ignored until the next save.
+    """
+    if not is_recordable_query(query):
+        return
+    with _query_lock:
+        if query in _query_counts or len(_query_counts) < AUTOCOMPLETE_MAX_TRACKED_QUERIES:
+            _query_counts[query] += 1
+
+def load_query_counts(path=None):
+    """Return the saved query counts"""
+    path = path or AUTOCOMPLETE_QUERIES_PATH
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+def save_query_counts(path=None):
+    """
+    Merge the queries counted in this process into the query counts file.
+
+    Every worker saves into the same file, so the read-merge-write holds an
+    exclusive lock on a lock file next to it. Only the
+    AUTOCOMPLETE_MAX_SAVED_QUERIES most frequent queries are kept.
+    """
+    global _query_counts
+    path = path or AUTOCOMPLETE_QUERIES_PATH
+    with _query_lock:
+        counts, _query_counts = _query_counts, Counter()
+    if not counts:
+        return
+
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            merged = Counter(load_query_counts(path))
+            merged.update(counts)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(dict(merged.most_common(AUTOCOMPLETE_MAX_SAVED_QUERIES)), f)
+            os.replace(tmp_path, path)
+    except Exception:
+        # Keep the counts for the next save
+        with _query_lock:
+            _query_counts.update(counts)
+        raise
+
+async def save_query_counts_periodically(interval=None):
+    """
+    Save the counted queries every AUTOCOMPLETE_QUERIES_FLUSH_SECONDS, so a
+    worker that is killed loses at most one interval of counts
+    """
+    interval = interval or AUTOCOMPLETE_QUERIES_FLUSH_SECONDS
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, save_query_counts)
+        except Exception as e:
+            print(f"Could not save query counts: {e}")
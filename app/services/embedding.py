@@ -1,26 +1,204 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from app.config import (
-    EMBEDDING_DIMENSION
+    EMBEDDING_DIMENSION,
+    EMBEDDING_BACKEND,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_WORKERS,
+    EMBEDDING_EXECUTOR_WORKERS,
+    QUERY_BATCH_MAX_WAIT_MS,
+    QUERY_BATCH_MAX_SIZE,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    EMBEDDING_CACHE_TOUCH_SECONDS
 )
+from app.services.embedding_backends import create_backend, get_model_key
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_cache import EmbeddingCache, LRUCache
 
-# Load the model
-model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+# The model is loaded on first use by get_model(), so importing this module
+# (e.g. for keyword search or CLI commands) does not load torch
+_model = None
+_model_lock = threading.Lock()
 
-def get_text_embedding(text):
+# Persistent cache shared by indexing and querying, and an in-process tier for queries
+embedding_cache = (
+    EmbeddingCache(EMBEDDING_CACHE_PATH, get_model_key(EMBEDDING_BACKEND), EMBEDDING_CACHE_MAX_ENTRIES,
+                   EMBEDDING_CACHE_TOUCH_SECONDS)
+    if EMBEDDING_CACHE_PATH else None
+)
+query_embedding_cache = LRUCache(QUERY_EMBEDDING_CACHE_SIZE)
+
+# Bounded executor that keeps query embedding off the event loop
+_embedding_executor = ThreadPoolExecutor(max_workers=EMBEDDING_EXECUTOR_WORKERS, thread_name_prefix="embedding")
+
+# Micro-batcher of query embeddings, created on first use in the running event loop
+_query_batcher = None
+
+# Multi-process pool used by get_text_embeddings, started on first use
+_process_pool = None
+
+def get_model():
     """
-    Get vector embedding for text using sentence transformers
+    Return the embedding backend selected by EMBEDDING_BACKEND, loading it on first use
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = create_backend(EMBEDDING_BACKEND)
+    return _model
+
+def normalize_text(text):
+    """
+    Normalize text before embedding. Returns None if the text is too short to embed.
     """
     if not text or len(text.strip()) < 3:
-        return np.zeros(EMBEDDING_DIMENSION).tolist()  # Return zero vector if text is empty
-    
+        return None
+
     text = text.lower().strip()
-    
+
     # Truncate text if too long (prevent memory issues)
     if len(text) > 100000:
         text = text[:100000]
-        
+
+    return text
+
+def get_text_embedding(text):
+    """
+    Get vector embedding for text using sentence transformers
+    """
+    text = normalize_text(text)
+    if text is None:
+        return np.zeros(EMBEDDING_DIMENSION).tolist()  # Return zero vector if text is empty
+
+    if embedding_cache is not None:
+        cached = embedding_cache.get(text)
+        if cached is not None:
+            return cached
+
     # Generate embedding
-    embedding = model.encode(text)
-    
-    return embedding.tolist()
\ No newline at end of file
+    embedding = get_model().encode([text])[0].tolist()
+
+    if embedding_cache is not None:
+        embedding_cache.put(text, embedding)
+
+    return embedding
+
+def get_query_embedding(query):
+    """
+    Get vector embedding for a search query, serving repeated queries from memory
+    """
+    key = normalize_text(query)
+    if key is None:
+        return np.zeros(EMBEDDING_DIMENSION).tolist()
+
+    embedding = query_embedding_cache.get(key)
+    if embedding is None:
+        embedding = _embed_query(key)
+
+    return embedding
+
+async def aget_query_embedding(query):
+    """
+    Async version of get_query_embedding. Cache misses are encoded on a bounded
+    thread pool so the event loop is not blocked by the model, and concurrent
+    misses are micro-batched into one model call (see QUERY_BATCH_MAX_WAIT_MS).
+    """
+    key = normalize_text(query)
+    if key is None:
+        return np.zeros(EMBEDDING_DIMENSION).tolist()
+
+    embedding = query_embedding_cache.get(key)
+    if embedding is None and QUERY_BATCH_MAX_WAIT_MS > 0:
+        embedding = await get_query_batcher().embed(key)
+    elif embedding is None:
+        loop = asyncio.get_running_loop()
+        embedding = await loop.run_in_executor(_embedding_executor, _embed_query, key)
+
+    return embedding
+
+def get_query_batcher():
+    """
+    Return the micro-batcher that encodes concurrent query embeddings together
+    """
+    global _query_batcher
+    loop = asyncio.get_running_loop()
+    if _query_batcher is None or _query_batcher.loop is not loop:
+        _query_batcher = EmbeddingBatcher(_embed_queries, _embedding_executor, QUERY_BATCH_MAX_SIZE,
+                                          QUERY_BATCH_MAX_WAIT_MS / 1000)
+    return _query_batcher
+
+def _embed_query(key):
+    """Embed a normalized query and store it in the in-process cache"""
+    embedding = get_text_embedding(key)
+    query_embedding_cache.put(key, embedding)
+    return embedding
+
+def _embed_queries(keys):
+    """Embed normalized queries in one model call and store them in the in-process cache"""
+    embeddings = get_text_embeddings(keys, batch_size=len(keys), workers=1)
+    for key, embedding in zip(keys, embeddings):
+        query_embedding_cache.put(key, embedding)
+    return embeddings
+
+def get_process_pool(workers):
+    """
+    Start (once) and return the sentence-transformers multi-process pool
+    """
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = get_model().model.start_multi_process_pool(target_devices=["cpu"] * workers)
+    return _process_pool
+
+def stop_process_pool():
+    """Stop the multi-process pool if it was started"""
+    global _process_pool
+    if _process_pool is not None:
+        from sentence_transformers import SentenceTransformer
+
+        SentenceTransformer.stop_multi_process_pool(_process_pool)
+        _process_pool = None
+
+def get_text_embeddings(texts, batch_size=None, workers=None):
+    """
+    Get vector embeddings for a list of texts in batched model calls.
+
+    With workers > 1 the batches are spread across a pool of worker processes
+    (torch backend only; other backends ignore workers).
+    Texts that are too short get a zero vector, like get_text_embedding.
+    """
+    batch_size = batch_size or EMBEDDING_BATCH_SIZE
+    workers = workers or EMBEDDING_WORKERS
+
+    normalized = [normalize_text(text) for text in texts]
+    unique_texts = list(dict.fromkeys(text for text in normalized if text is not None))
+
+    # Only texts missing from the cache go to the model
+    found = embedding_cache.get_many(unique_texts) if embedding_cache is not None else {}
+    to_encode = [text for text in unique_texts if text not in found]
+
+    if to_encode:
+        model = get_model()
+        if workers > 1 and model.supports_process_pool:
+            encoded = model.model.encode_multi_process(to_encode, get_process_pool(workers), batch_size=batch_size)
+        else:
+            encoded = model.encode(to_encode, batch_size=batch_size)
+
+        new_embeddings = [(text, embedding.tolist()) for text, embedding in zip(to_encode, encoded)]
+        found.update(new_embeddings)
+        if embedding_cache is not None:
+            embedding_cache.put_many(new_embeddings)
+
+    zero_vector = np.zeros(EMBEDDING_DIMENSION).tolist()
+    return [found[text] if text is not None else list(zero_vector) for text in normalized]
+
+def get_cache_stats():
+    """Hit/miss counters for the embedding caches"""
+    return {
+        "query_cache": query_embedding_cache.stats(),
+        "disk_cache": embedding_cache.stats() if embedding_cache is not None else None
+    }
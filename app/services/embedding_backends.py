@@ -0,0 +1,311 @@
+"""
+Embedding model backends.
+
+Every backend exposes encode(texts, batch_size) returning a float32 array of
+normalized embeddings, one row per text. The heavy imports (torch,
+sentence-transformers, onnxruntime) happen when a backend is created, not when
+this module is imported.
+
+- torch: sentence-transformers on PyTorch
+- torch_int8: the same model with its Linear layers dynamically quantized to int8
+- onnx: the transformer exported to ONNX and run with ONNX Runtime
+  (needs `pip install onnxruntime`); the export is created on first use
+- onnx_int8: the ONNX export with int8 weights from ONNX Runtime dynamic quantization
+- remote: a shared model server process (see serve_embeddings), so the web
+  workers do not each hold a copy of the model. Messages are JSON and raw
+  float32 bytes, never pickles, so a peer cannot make the other side run code
+- hash: a deterministic stand-in that hashes tokens into the vector, with no
+  model or network access; for benchmarks and offline development only
+"""
+import hashlib
+import os
+import re
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+import orjson
+
+from app.config import (
+    EMBEDDING_DIMENSION,
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_MAX_SEQ_LENGTH,
+    EMBEDDING_ONNX_PATH,
+    EMBEDDING_SERVER_ADDRESS,
+    EMBEDDING_SERVER_AUTHKEY,
+    EMBEDDING_SERVER_BACKEND,
+    EMBEDDING_SERVER_TIMEOUT
+)
+
+BACKEND_NAMES = ["torch", "torch_int8", "onnx", "onnx_int8", "remote", "hash"]
+
+class TorchBackend:
+    """sentence-transformers model, optionally with int8 dynamic quantization"""
+
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME, quantize=False):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu" if quantize else None)
+        self.model.max_seq_length = EMBEDDING_MAX_SEQ_LENGTH
+        if quantize:
+            import torch
+
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        # The multi-process pool pickles the model, which quantized modules do not support
+        self.supports_process_pool = not quantize
+
+    def encode(self, texts, batch_size=32):
+        return np.asarray(self.model.encode(texts, batch_size=batch_size), dtype=np.float32)
+
+def get_int8_onnx_path(onnx_path):
+    root, ext = os.path.splitext(onnx_path)
+    return f"{root}.int8{ext}"
+
+def export_onnx(onnx_path=EMBEDDING_ONNX_PATH, model_name=EMBEDDING_MODEL_NAME, quantize=True):
+    """
+    Export the transformer (without pooling) to ONNX with dynamic batch and sequence
+    axes, and optionally write an int8 copy next to it
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = list(sample.keys())
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    os.makedirs(os.path.dirname(onnx_path) or ".", exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(sample[name] for name in input_names), onnx_path,
+                          input_names=input_names, output_names=["last_hidden_state"],
+                          dynamic_axes=dynamic_axes, opset_version=14)
+    print(f"Exported '{model_name}' to '{onnx_path}'")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = get_int8_onnx_path(onnx_path)
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QInt8)
+        print(f"Wrote int8 model to '{int8_path}'")
+
+class OnnxBackend:
+    """
+    The exported transformer on ONNX Runtime, with the mean pooling and
+    normalization of the sentence-transformers model done in NumPy
+    """
+
+    supports_process_pool = False
+
+    def __init__(self, onnx_path=EMBEDDING_ONNX_PATH, model_name=EMBEDDING_MODEL_NAME, quantize=False):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        if not os.path.exists(onnx_path) or (quantize and not os.path.exists(get_int8_onnx_path(onnx_path))):
+            export_onnx(onnx_path, model_name, quantize=quantize)
+        if quantize:
+            onnx_path = get_int8_onnx_path(onnx_path)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.session = onnxruntime.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def encode(self, texts, batch_size=32):
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            tokens = self.tokenizer(texts[start:start + batch_size], padding=True, truncation=True,
+                                    max_length=EMBEDDING_MAX_SEQ_LENGTH, return_tensors="np")
+            inputs = {name: tokens[name].astype(np.int64) for name in self.input_names}
+            token_embeddings = self.session.run(None, inputs)[0]
+
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            batches.append(pooled.astype(np.float32))
+
+        if not batches:
+            return np.empty((0, EMBEDDING_DIMENSION), dtype=np.float32)
+        return np.vstack(batches)
+
+class HashBackend:
+    """
+    Deterministic bag-of-words embedding: each token adds a signed unit to a
+    dimension chosen by its hash. Texts sharing words get similar vectors, which
+    is enough to exercise the search paths without the model.
+    """
+
+    supports_process_pool = False
+
+    def __init__(self, dimension=EMBEDDING_DIMENSION):
+        self.dimension = dimension
+        self._token_cache = {}
+
+    def _token_slot(self, token):
+        slot = self._token_cache.get(token)
+        if slot is None:
+            digest = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            slot = self._token_cache[token] = (digest % self.dimension, 1.0 if digest >> 63 else -1.0)
+        return slot
+
+    def encode(self, texts, batch_size=32):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in re.findall(r"\w+", text.lower()):
+                index, sign = self._token_slot(token)
+                vectors[row, index] += sign
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms > 0, norms, 1.0)
+        return vectors
+
+def parse_address(address):
+    """'host:port' is a TCP address, anything else a Unix socket path"""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return (host, int(port))
+    return address
+
+def get_authkey(address, authkey=EMBEDDING_SERVER_AUTHKEY):
+    """
+    The shared secret of a model server address, or None for an unauthenticated
+    Unix socket. Raises ValueError for a TCP address without EMBEDDING_SERVER_AUTHKEY.
+    """
+    if authkey:
+        return authkey.encode("utf-8")
+    if isinstance(address, tuple):
+        raise ValueError("A TCP embedding server address needs EMBEDDING_SERVER_AUTHKEY to be set")
+    return None
+
+def send_vectors(connection, vectors):
+    """Send a float32 array as a JSON header and its raw bytes"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    connection.send_bytes(orjson.dumps({"status": "ok", "shape": list(vectors.shape)}))
+    connection.send_bytes(vectors.tobytes())
+
+def recv_bytes(connection, timeout):
+    """Receive one message, raising TimeoutError if nothing arrives in time"""
+    if not connection.poll(timeout):
+        raise TimeoutError(f"No reply from the embedding server within {timeout}s")
+    return connection.recv_bytes()
+
+class RemoteBackend:
+    """
+    Client of a model server started with `python -m app.cli embedding-server`.
+    Each thread keeps its own connection, and a dropped connection is retried once.
+    """
+
+    supports_process_pool = False
+
+    def __init__(self, address=EMBEDDING_SERVER_ADDRESS, authkey=EMBEDDING_SERVER_AUTHKEY,
+                 timeout=EMBEDDING_SERVER_TIMEOUT):
+        self.address = parse_address(address)
+        self.authkey = get_authkey(self.address, authkey)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = Client(self.address, authkey=self.authkey)
+        return connection
+
+    def encode(self, texts, batch_size=32):
+        for attempt in range(2):
+            try:
+                connection = self._connection()
+                connection.send_bytes(orjson.dumps({"texts": list(texts), "batch_size": batch_size}))
+                header = orjson.loads(recv_bytes(connection, self.timeout))
+                if header["status"] == "ok":
+                    data = recv_bytes(connection, self.timeout)
+                break
+            except (EOFError, OSError):
+                # TimeoutError is an OSError; the late reply would be read as the next answer
+                self._local.connection = None
+                if attempt:
+                    raise
+        if header["status"] == "error":
+            raise RuntimeError(f"Embedding server error: {header['reason']}")
+        return np.frombuffer(data, dtype=np.float32).reshape(header["shape"])
+
+def create_backend(name):
+    """Create the backend with the given name"""
+    if name == "torch":
+        return TorchBackend()
+    if name == "torch_int8":
+        return TorchBackend(quantize=True)
+    if name == "onnx":
+        return OnnxBackend()
+    if name == "onnx_int8":
+        return OnnxBackend(quantize=True)
+    if name == "remote":
+        return RemoteBackend()
+    if name == "hash":
+        return HashBackend()
+    raise ValueError(f"Unknown embedding backend '{name}', expected one of {BACKEND_NAMES}")
+
+def get_model_key(name):
+    """
+    Name the embedding cache is keyed by. Quantized backends produce slightly
+    different vectors, so they get their own cache entries.
+    """
+    if name == "remote":
+        name = EMBEDDING_SERVER_BACKEND
+    if name == "hash":
+        return "hash"
+    return f"{EMBEDDING_MODEL_NAME}:int8" if name.endswith("_int8") else EMBEDDING_MODEL_NAME
+
+def _serve_connection(connection, backend, lock):
+    with connection:
+        while True:
+            try:
+                request = orjson.loads(connection.recv_bytes())
+            except (EOFError, OSError):
+                return
+            except orjson.JSONDecodeError:
+                print("Closing embedding client that sent an invalid request")
+                return
+            try:
+                texts, batch_size = [str(text) for text in request["texts"]], int(request["batch_size"])
+                with lock:
+                    vectors = backend.encode(texts, batch_size)
+            except Exception as e:
+                connection.send_bytes(orjson.dumps({"status": "error", "reason": str(e)}))
+                continue
+            send_vectors(connection, vectors)
+
+def serve_embeddings(address=EMBEDDING_SERVER_ADDRESS, backend_name=EMBEDDING_SERVER_BACKEND):
+    """
+    Load one model and serve encode requests from any number of worker processes.
+    Each connection is handled on its own thread; model calls are serialized, since
+    the model already uses all cores for a batch.
+
+    A Unix socket is only accessible to its owner. A TCP address is refused
+    unless EMBEDDING_SERVER_AUTHKEY is set.
+    """
+    if backend_name == "remote":
+        raise ValueError("The embedding server cannot use the remote backend")
+
+    address = parse_address(address)
+    authkey = get_authkey(address)
+    if isinstance(address, str):
+        os.makedirs(os.path.dirname(address) or ".", exist_ok=True)
+        if os.path.exists(address):
+            os.remove(address)
+
+    backend = create_backend(backend_name)
+    lock = threading.Lock()
+    with Listener(address, authkey=authkey) as listener:
+        if isinstance(address, str):
+            os.chmod(address, 0o600)
+        print(f"Embedding server ({backend_name}) listening on {address}")
+        while True:
+            try:
+                connection = listener.accept()
+            except (AuthenticationError, OSError) as e:
+                # A client that fails authentication should not stop the server
+                print(f"Rejected embedding client: {e}")
+                continue
+            threading.Thread(target=_serve_connection, args=(connection, backend, lock), daemon=True).start()
@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+from app.services.metrics import embedding_batch_size, embedding_queue_wait
+
+class EmbeddingBatcher:
+    """
+    Micro-batching dispatcher for query embeddings.
+
+    Concurrent embed() calls are collected for up to max_wait seconds or max_size
+    distinct texts, whichever comes first, and encoded with one embed_batch call
+    on the executor. Each caller awaits a future resolved with its own vector.
+    Callers asking for the same text while it is queued share one slot.
+    """
+
+    def __init__(self, embed_batch, executor, max_size, max_wait):
+        self.embed_batch = embed_batch
+        self.executor = executor
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.loop = asyncio.get_running_loop()
+        self._pending = {}
+        self._enqueued = []
+        self._timer = None
+
+    async def embed(self, text):
+        future = self._pending.get(text)
+        if future is None:
+            future = self._pending[text] = self.loop.create_future()
+            self._enqueued.append(time.perf_counter())
+            if len(self._pending) >= self.max_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = self.loop.call_later(self.max_wait, self._flush)
+        # A cancelled caller must not cancel the future other callers share
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, {}
+        enqueued, self._enqueued = self._enqueued, []
+        texts = list(batch)
+
+        def run():
+            # Queue wait includes time spent waiting for a free executor thread
+            started = time.perf_counter()
+            for enqueued_at in enqueued:
+                embedding_queue_wait.observe(started - enqueued_at)
+            embedding_batch_size.observe(len(texts))
+            return self.embed_batch(texts)
+
+        done = self.loop.run_in_executor(self.executor, run)
+        done.add_done_callback(lambda done: self._resolve(batch, done))
+
+    @staticmethod
+    def _resolve(batch, done):
+        # A batch cancelled before it ran (e.g. executor shutdown) cancels its waiters
+        cancelled = done.cancelled()
+        error = None if cancelled else done.exception()
+        embeddings = None if cancelled or error is not None else done.result()
+        for i, future in enumerate(batch.values()):
+            if future.done():
+                continue
+            if cancelled:
+                future.cancel()
+            elif error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(embeddings[i])
@@ -0,0 +1,173 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Pending last_used updates written at once, even before touch_seconds have passed
+TOUCH_BATCH_SIZE = 1000
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache with hit/miss counters
+    """
+    
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """Return the cached value or None, marking the key as recently used"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+    
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entries beyond max_size"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def stats(self):
+        return {"size": len(self._data), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache backed by SQLite.
+
+    Keys are the model name plus a hash of the normalized text, and vectors are
+    stored as float32 blobs. The number of entries is capped at max_entries, and
+    the least recently used entries are evicted first.
+
+    Reads do not write: the last_used time of hits is buffered and written in one
+    transaction every touch_seconds (or every TOUCH_BATCH_SIZE hits), and before
+    entries are evicted. Recency is therefore approximate to touch_seconds.
+    """
+    
+    def __init__(self, path, model_name, max_entries, touch_seconds=30):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.touch_seconds = touch_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._touched = {}
+        self._touched_at = time.monotonic()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+    
+    def make_key(self, text):
+        """Cache key for a normalized text"""
+        return hashlib.sha1(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+    
+    def get(self, text):
+        """Return the cached vector for a normalized text, or None"""
+        return self.get_many([text]).get(text)
+    
+    def get_many(self, texts):
+        """
+        Return a dict of text -> vector for the texts found in the cache
+        """
+        keys = {self.make_key(text): text for text in texts}
+        found = {}
+        
+        with self._lock:
+            key_list = list(keys)
+            # Stay below SQLite's bound parameter limit
+            for start in range(0, len(key_list), 500):
+                batch = key_list[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                now = time.time()
+                for key, blob in rows:
+                    found[keys[key]] = np.frombuffer(blob, dtype=np.float32).tolist()
+                    # Refresh the LRU position of the hit with the next write
+                    self._touched[key] = now
+            self._flush_touched()
+            
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        
+        return found
+    
+    def put(self, text, vector):
+        """Store the vector for a normalized text"""
+        self.put_many([(text, vector)])
+    
+    def put_many(self, items):
+        """
+        Store (text, vector) pairs and evict least recently used entries over the limit
+        """
+        now = time.time()
+        rows = [
+            (self.make_key(text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in items
+        ]
+        
+        with self._lock:
+            # A buffered touch must not overwrite the last_used of a fresh insert
+            for key, _, _ in rows:
+                self._touched.pop(key, None)
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+            
+            overflow = self._count() - self.max_entries
+            if overflow > 0:
+                # Evict by up-to-date recency
+                self._flush_touched(force=True)
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)", (overflow,)
+                )
+            self._conn.commit()
+    
+    def flush(self):
+        """Write the buffered last_used updates of cache hits"""
+        with self._lock:
+            self._flush_touched(force=True)
+    
+    def _flush_touched(self, force=False):
+        """Write the buffered touches when forced, due or numerous; the caller holds the lock"""
+        if not self._touched:
+            return
+        if not (force or len(self._touched) >= TOUCH_BATCH_SIZE
+                or time.monotonic() - self._touched_at >= self.touch_seconds):
+            return
+        self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                               [(now, key) for key, now in self._touched.items()])
+        self._conn.commit()
+        self._touched = {}
+        self._touched_at = time.monotonic()
+    
+    def _count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    
+    def stats(self):
+        with self._lock:
+            size = self._count()
+        return {"size": size, "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,160 @@
+"""
+Facet counts for faceted search and the filter sidebar, cached by index version.
+
+Counts depend only on the query and filters, not on the page, so a hot faceted
+query sends Elasticsearch one request for its hits and reuses cached counts.
+The unfiltered facet values shown in the sidebar come from the index instead
+of the metadata file written at build time.
+"""
+import threading
+import time
+
+from app.config import INDEX_NAME, FACET_WARM_ENTRIES
+from app.elasticsearch.client import es_client, async_es_client
+from app.elasticsearch.index import get_index_version, async_get_index_version
+from app.elasticsearch.search import (
+    build_facet_search,
+    build_facet_options_body,
+    get_facet_counts,
+    get_facet_options,
+    get_search_params,
+    facet_search,
+    async_facet_search
+)
+from app.services.result_cache import create_result_cache
+
+class FacetCache:
+    """
+    Facet counts keyed by the live index version, query and filters.
+
+    Lookups are counted per key so the hottest entries can be recomputed for the
+    new version right after a reindex, instead of on their next request.
+    """
+
+    def __init__(self, cache, warm_entries=FACET_WARM_ENTRIES):
+        self.cache = cache
+        self.warm_entries = warm_entries
+        self._requests = {}
+        self._lock = threading.Lock()
+
+    def make_key(self, query, filters):
+        return self.cache.make_key(query, "facets", filters, 0)
+
+    def get(self, query, filters):
+        return self.cache.get(self._track(query, filters))
+
+    async def aget(self, query, filters):
+        return await self.cache.aget(self._track(query, filters))
+
+    def _track(self, query, filters):
+        """Count a lookup of the key and return it"""
+        key = self.make_key(query, filters)
+        with self._lock:
+            count = self._requests.get(key, (0, query, filters))[0]
+            self._requests[key] = (count + 1, query, filters)
+            if len(self._requests) > 10 * self.warm_entries:
+                # Forget the coldest keys so tracking stays bounded
+                hottest = sorted(self._requests.items(), key=lambda item: item[1][0], reverse=True)
+                self._requests = dict(hottest[:self.warm_entries])
+        return key
+
+    def put(self, query, filters, facets, cost):
+        self.cache.put(self.make_key(query, filters), facets, cost)
+
+    async def aput(self, query, filters, facets, cost):
+        await self.cache.aput(self.make_key(query, filters), facets, cost)
+
+    def get_hot_requests(self):
+        """The (query, filters) of the most requested keys"""
+        with self._lock:
+            hottest = sorted(self._requests.values(), key=lambda item: item[0], reverse=True)
+        return [(query, filters) for _, query, filters in hottest[:self.warm_entries]]
+
+    def stats(self):
+        return {**self.cache.stats(), "tracked_keys": len(self._requests)}
+
+_result_cache = create_result_cache(get_index_version, async_get_index_version)
+facet_cache = FacetCache(_result_cache) if _result_cache is not None else None
+
+# Key of the sidebar options; no query or filters
+OPTIONS_KEY = ("", {})
+
+def get_faceted_results(query, filters=None, size=10, from_=0, pit=None, sort=None):
+    """
+    Run a faceted search, reusing cached facet counts when available
+    """
+    facets = facet_cache.get(query, filters) if facet_cache is not None else None
+    start = time.perf_counter()
+    results = facet_search(query, filters, size, from_, pit, include_facets=facets is None, sort=sort)
+    if facets is None:
+        if facet_cache is not None:
+            facet_cache.put(query, filters, results["facets"], time.perf_counter() - start)
+    else:
+        results["facets"] = facets
+    return results
+
+async def aget_faceted_results(query, filters=None, size=10, from_=0, pit=None, sort=None):
+    """
+    Async version of get_faceted_results
+    """
+    facets = await facet_cache.aget(query, filters) if facet_cache is not None else None
+    start = time.perf_counter()
+    results = await async_facet_search(query, filters, size, from_, pit, include_facets=facets is None, sort=sort)
+    if facets is None:
+        if facet_cache is not None:
+            await facet_cache.aput(query, filters, results["facets"], time.perf_counter() - start)
+    else:
+        results["facets"] = facets
+    return results
+
+async def aget_facet_options():
+    """
+    Every brand, category and manufacturer in the live index, or None if
+    Elasticsearch cannot be reached
+    """
+    if facet_cache is not None:
+        options = await facet_cache.aget(*OPTIONS_KEY)
+        if options is not None:
+            return options
+
+    start = time.perf_counter()
+    try:
+        response = await async_es_client.search(index=INDEX_NAME, body=build_facet_options_body(),
+                                                **get_search_params("", request_cache=True))
+    except Exception as e:
+        print(f"Could not load facet options: {e}")
+        return None
+    options = get_facet_options(response)
+    if facet_cache is not None:
+        await facet_cache.aput(*OPTIONS_KEY, options, time.perf_counter() - start)
+    return options
+
+def refresh_facets():
+    """
+    Recompute the sidebar options and the hottest facet counts for the current
+    index version, e.g. right after a reindex. Returns the number of entries refreshed.
+    """
+    if facet_cache is None:
+        return 0
+
+    facet_cache.cache.invalidate()
+    refreshed = 0
+    for query, filters in facet_cache.get_hot_requests():
+        start = time.perf_counter()
+        try:
+            if (query, filters) == OPTIONS_KEY:
+                response = es_client.search(index=INDEX_NAME, body=build_facet_options_body(),
+                                            **get_search_params(query, request_cache=True))
+                facets = get_facet_options(response)
+            else:
+                body = build_facet_search(query, filters).extra(size=0).to_dict()
+                response = es_client.search(index=INDEX_NAME, body=body,
+                                            **get_search_params(query, filters, request_cache=True))
+                facets = get_facet_counts(response["aggregations"])
+        except Exception as e:
+            print(f"Could not refresh facets for '{query}': {e}")
+            continue
+        facet_cache.put(query, filters, facets, time.perf_counter() - start)
+        refreshed += 1
+    print(f"Refreshed {refreshed} facet cache entries")
+    return refreshed
@@ -0,0 +1,204 @@
+"""
+Request timing spans, histograms and a Prometheus text exposition.
+
+A request is tracked with track_request(). Code running inside it (including
+tasks started with asyncio.gather, which inherit the context) records named
+spans with span() and the Elasticsearch `took` with record_es_took(). When the
+request finishes its spans are added to histograms labeled by search type, and
+requests slower than SLOW_QUERY_LOG_MS are logged.
+"""
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from app.config import SLOW_QUERY_LOG_MS
+
+# Seconds; covers cached responses up to slow hybrid queries
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Texts per micro-batch, and seconds a query waits before its batch is encoded
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_WAIT_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+class Histogram:
+    """
+    Cumulative histogram with labels, rendered in the Prometheus text format
+    """
+
+    def __init__(self, name, help, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    labels = format_labels(self.label_names + ("le",), label_values + (bound,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = format_labels(self.label_names + ("le",), label_values + ("+Inf",))
+                lines.append(f"{self.name}_bucket{labels} {series['count']}")
+                labels = format_labels(self.label_names, label_values)
+                lines.append(f"{self.name}_sum{labels} {series['sum']}")
+                lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name, help, label_names):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.label_names, label_values)} {value}")
+        return lines
+
+request_duration = Histogram("search_request_duration_seconds", "Time to handle a request",
+                             ("endpoint", "search_type"))
+span_duration = Histogram("search_span_duration_seconds", "Time spent in each stage of a request",
+                          ("search_type", "span"))
+es_took = Histogram("search_es_took_seconds", "Time Elasticsearch reported spending on the request (took)",
+                    ("search_type",))
+requests_total = Counter("search_requests_total", "Requests handled", ("endpoint", "search_type", "status"))
+slow_requests_total = Counter("search_slow_requests_total", "Requests slower than SLOW_QUERY_LOG_MS",
+                              ("endpoint", "search_type"))
+embedding_batch_size = Histogram("search_embedding_batch_size", "Query texts encoded per micro-batch", (),
+                                 buckets=BATCH_SIZE_BUCKETS)
+embedding_queue_wait = Histogram("search_embedding_queue_wait_seconds",
+                                 "Time a query embedding waited before its micro-batch was encoded", (),
+                                 buckets=QUEUE_WAIT_BUCKETS)
+
+METRICS = [request_duration, span_duration, es_took, requests_total, slow_requests_total,
+           embedding_batch_size, embedding_queue_wait]
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+class RequestTimer:
+    """Spans of one request, in seconds"""
+
+    def __init__(self, endpoint, search_type, query=None):
+        self.endpoint = endpoint
+        self.search_type = search_type
+        self.query = query
+        self.spans = {}
+        self.es_took_ms = None
+        self.start = time.perf_counter()
+        self.duration = None
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[name] = self.spans.get(name, 0.0) + time.perf_counter() - start
+
+    def server_timing(self):
+        """Spans formatted for a Server-Timing response header"""
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.spans.items()]
+        if self.es_took_ms is not None:
+            entries.append(f"es_took;dur={self.es_took_ms}")
+        return ", ".join(entries)
+
+    def finish(self, status):
+        self.duration = time.perf_counter() - self.start
+        request_duration.observe(self.duration, self.endpoint, self.search_type)
+        requests_total.inc(self.endpoint, self.search_type, status)
+        for name, seconds in self.spans.items():
+            span_duration.observe(seconds, self.search_type, name)
+        if self.es_took_ms is not None:
+            es_took.observe(self.es_took_ms / 1000, self.search_type)
+
+        if SLOW_QUERY_LOG_MS is not None and self.duration * 1000 >= SLOW_QUERY_LOG_MS:
+            slow_requests_total.inc(self.endpoint, self.search_type)
+            print("Slow query: " + json.dumps({
+                "endpoint": self.endpoint,
+                "search_type": self.search_type,
+                "query": self.query,
+                "status": status,
+                "total_ms": round(self.duration * 1000, 2),
+                "es_took_ms": self.es_took_ms,
+                "spans_ms": {name: round(seconds * 1000, 2) for name, seconds in self.spans.items()}
+            }))
+
+_current_timer = ContextVar("request_timer", default=None)
+
+@contextmanager
+def track_request(endpoint, search_type, query=None):
+    """
+    Time a request. Yields the RequestTimer that spans are recorded into.
+    """
+    timer = RequestTimer(endpoint, search_type, query)
+    token = _current_timer.set(timer)
+    status = "error"
+    try:
+        yield timer
+        status = "ok"
+    finally:
+        _current_timer.reset(token)
+        timer.finish(status)
+
+@contextmanager
+def span(name):
+    """
+    Time a stage of the current request; does nothing outside track_request.
+    Spans with the same name (e.g. concurrent searches) add up.
+    """
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    with timer.span(name):
+        yield
+
+def record_es_took(*responses):
+    """
+    Record the `took` of Elasticsearch responses for the current request. Concurrent
+    responses count once, with the largest took.
+    """
+    timer = _current_timer.get()
+    if timer is None:
+        return
+    took = max(response["took"] for response in responses)
+    timer.es_took_ms = took if timer.es_took_ms is None else max(timer.es_took_ms, took)
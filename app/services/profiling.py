@@ -0,0 +1,50 @@
+"""
+Per-request profiling for development builds.
+
+When PROFILING_ENABLED is set, a request sent with an `X-Profile` header is run
+under cProfile (or pyinstrument with PROFILER=pyinstrument, which needs
+`pip install pyinstrument`) and the profile report is returned instead of the
+response. One request is profiled at a time; others run normally.
+"""
+import cProfile
+import io
+import pstats
+import threading
+
+from app.config import PROFILER
+
+_profiling_lock = threading.Lock()
+
+def start_profiler():
+    """
+    Start profiling, or return None if another request is being profiled
+    """
+    if not _profiling_lock.acquire(blocking=False):
+        return None
+
+    try:
+        if PROFILER == "pyinstrument":
+            from pyinstrument import Profiler
+            profiler = Profiler(async_mode="enabled")
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+    except Exception:
+        _profiling_lock.release()
+        raise
+    return profiler
+
+def stop_profiler(profiler, limit=50):
+    """Stop profiling and return the report as text"""
+    try:
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(limit)
+            return output.getvalue()
+
+        profiler.stop()
+        return profiler.output_text(unicode=True)
+    finally:
+        _profiling_lock.release()
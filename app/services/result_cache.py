@@ -0,0 +1,333 @@
+import asyncio
+import fnmatch
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from app.config import (
+    RESULT_CACHE_BACKEND,
+    RESULT_CACHE_TTL,
+    RESULT_CACHE_MAX_ENTRIES,
+    RESULT_CACHE_VERSION_CHECK_SECONDS,
+    REDIS_URL
+)
+
+class InMemoryBackend:
+    """
+    In-process cache backend with per-entry TTL and LRU eviction
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    # Lookups never block, so the async path calls them directly
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aset(self, key, value, ttl):
+        self.set(key, value, ttl)
+
+class LocalRedis:
+    """
+    In-process stand-in for a Redis client with the commands RedisBackend uses,
+    for development and tests without a server (REDIS_URL=memory://)
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[name]
+                return None
+            return value
+
+    def set(self, name, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        with self._lock:
+            self._data[name] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(self._data.pop(name, None) is not None for name in names)
+
+    def scan_iter(self, match="*"):
+        with self._lock:
+            names = list(self._data)
+        return iter([name for name in names if fnmatch.fnmatchcase(name, match) and self.get(name) is not None])
+
+class RedisBackend:
+    """
+    Cache backend for a Redis-compatible client.
+
+    The client only needs get, set (with ex), delete and scan_iter, so any object
+    with those methods (such as LocalRedis) can be used. On the async path
+    async_client (a redis.asyncio client) is used when given; otherwise the
+    blocking calls run on the default executor. Eviction is left to the server's
+    maxmemory policy.
+    """
+
+    def __init__(self, client, prefix="search:", async_client=None):
+        self.client = client
+        self.prefix = prefix
+        self.async_client = async_client
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+
+    async def aget(self, key):
+        if self.async_client is None:
+            return await asyncio.get_running_loop().run_in_executor(None, self.get, key)
+        raw = await self.async_client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    async def aset(self, key, value, ttl):
+        if self.async_client is None:
+            await asyncio.get_running_loop().run_in_executor(None, self.set, key, value, ttl)
+            return
+        await self.async_client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + "*"))
+
+class ResultCache:
+    """
+    Search result cache keyed by the preprocessed query, search type, normalized
+    filters and size.
+
+    Keys are prefixed with the live index version, so entries are invalidated as
+    soon as a reindex swaps the alias or updates the index in place. The version
+    is looked up at most every version_check_seconds.
+
+    The async methods (aget, aput) never block the event loop: a stale version
+    is refreshed by a background task with async_version_provider while
+    requests keep using the previous one, and only the very first lookup waits.
+    """
+
+    def __init__(self, backend, ttl, version_provider, version_check_seconds, async_version_provider=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.version_provider = version_provider
+        self.async_version_provider = async_version_provider
+        self.version_check_seconds = version_check_seconds
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._version = None
+        self._version_checked_at = 0.0
+        self._version_task = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize_filters(filters):
+        """Make equivalent filters produce the same key"""
+        normalized = {}
+        for field, values in (filters or {}).items():
+            if isinstance(values, list):
+                if not values:
+                    continue
+                values = sorted(values)
+            normalized[field] = values
+        return normalized
+
+    def make_key(self, query, search_type, filters, size, **extra):
+        """Build the cache key for a search request"""
+        payload = json.dumps({
+            "query": query,
+            "search_type": search_type,
+            "filters": self.normalize_filters(filters),
+            "size": size,
+            **extra
+        }, sort_keys=True)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def get_version(self):
+        """
+        Return the current index version, or None if it cannot be determined
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._version_checked_at < self.version_check_seconds:
+                return self._version
+
+        try:
+            version = self.version_provider()
+        except Exception as e:
+            print(f"Result cache disabled, could not read index version: {e}")
+            version = None
+        return self._set_version(version, now)
+
+    def _set_version(self, version, checked_at):
+        with self._lock:
+            if self._version is not None and version != self._version and isinstance(self.backend, InMemoryBackend):
+                # Free entries of the previous version right away
+                self.backend.clear()
+            self._version = version
+            self._version_checked_at = checked_at
+        return version
+
+    async def _arefresh_version(self):
+        now = time.monotonic()
+        try:
+            if self.async_version_provider is not None:
+                version = await self.async_version_provider()
+            else:
+                version = await asyncio.get_running_loop().run_in_executor(None, self.version_provider)
+        except Exception as e:
+            print(f"Result cache disabled, could not read index version: {e}")
+            version = None
+        return self._set_version(version, now)
+
+    async def aget_version(self):
+        """
+        Async version of get_version. A stale version is returned while one
+        background task looks up the current one.
+        """
+        with self._lock:
+            version = self._version
+            fresh = version is not None and time.monotonic() - self._version_checked_at < self.version_check_seconds
+        if fresh:
+            return version
+
+        task = self._version_task
+        if task is None or task.done():
+            task = self._version_task = asyncio.ensure_future(self._arefresh_version())
+        if version is None:
+            return await asyncio.shield(task)
+        return version
+
+    def invalidate(self):
+        """Force the index version to be checked again on the next request"""
+        with self._lock:
+            self._version_checked_at = 0.0
+
+    def get(self, key):
+        """
+        Return the cached payload for a key, or None
+        """
+        version = self.get_version()
+        if version is None:
+            return None
+
+        return self._count(self.backend.get(f"{version}:{key}"))
+
+    async def aget(self, key):
+        """
+        Async version of get
+        """
+        version = await self.aget_version()
+        if version is None:
+            return None
+        return self._count(await self.backend.aget(f"{version}:{key}"))
+
+    def _count(self, entry):
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.saved_seconds += entry["cost"]
+        return entry["payload"]
+
+    def put(self, key, payload, cost):
+        """
+        Store a payload along with the seconds it took to compute
+        """
+        version = self.get_version()
+        if version is None:
+            return
+        self.backend.set(f"{version}:{key}", {"payload": payload, "cost": cost}, self.ttl)
+
+    async def aput(self, key, payload, cost):
+        """
+        Async version of put
+        """
+        version = await self.aget_version()
+        if version is None:
+            return
+        await self.backend.aset(f"{version}:{key}", {"payload": payload, "cost": cost}, self.ttl)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "index_version": self._version,
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "latency_saved_seconds": self.saved_seconds
+        }
+
+def create_redis_backend(url=None):
+    """
+    RedisBackend for a Redis URL, or for an in-process LocalRedis when the URL is memory://
+    """
+    url = url or REDIS_URL
+    if url.startswith("memory://"):
+        return RedisBackend(LocalRedis())
+    import redis
+    import redis.asyncio
+    return RedisBackend(redis.Redis.from_url(url), async_client=redis.asyncio.Redis.from_url(url))
+
+def create_result_cache(version_provider, async_version_provider=None):
+    """
+    Create the result cache configured by RESULT_CACHE_BACKEND, or None if disabled
+    """
+    if RESULT_CACHE_BACKEND == "none":
+        return None
+
+    if RESULT_CACHE_BACKEND == "redis":
+        backend = create_redis_backend()
+    else:
+        backend = InMemoryBackend(RESULT_CACHE_MAX_ENTRIES)
+
+    return ResultCache(backend, RESULT_CACHE_TTL, version_provider, RESULT_CACHE_VERSION_CHECK_SECONDS,
+                       async_version_provider)
@@ -2,11 +2,53 @@ from app.elasticsearch.search import (
     basic_search,
     fuzzy_search,
     suggestion_search,
-    facet_search,
     semantic_search,
-    hybrid_search
+    hybrid_search,
+    rrf_hybrid_search,
+    async_basic_search,
+    async_fuzzy_search,
+    async_suggestion_search,
+    async_semantic_search,
+    async_hybrid_search,
+    async_rrf_hybrid_search,
+    async_get_product_reviews,
+    open_point_in_time,
+    async_open_point_in_time,
+    close_point_in_time,
+    async_close_point_in_time,
+    SORT_OPTIONS
 )
+from app.elasticsearch.index import get_index_version, async_get_index_version
+from app.services.embedding import get_query_embedding, aget_query_embedding
+from app.services.facets import facet_cache, get_faceted_results, aget_faceted_results
+from app.services.result_cache import create_result_cache
+from app.services.vector_index import local_semantic_search, alocal_semantic_search
+from app.services.autocomplete import get_autocomplete, record_query
+from app.services.spelling import correct_query, acorrect_query
+from app.services.metrics import span
+from app.utils.data_loader import build_review_summary
+from app.config import SEMANTIC_BACKEND, HYBRID_RRF_SERVER_SIDE
+import asyncio
+import base64
+import json
 import re
+import time
+
+# Fields of each result besides id and highlight
+RESULT_FIELDS = ["name", "brand", "categories", "manufacturer", "review_count", "avg_rating", "rating_histogram",
+                 "review_preview"]
+
+# Search types that embed the query
+VECTOR_SEARCH_TYPES = ["semantic", "hybrid", "hybrid_rrf"]
+
+# Search types that support cursor (point in time + search_after) paging
+CURSOR_SEARCH_TYPES = ["basic", "fuzzy", "faceted", "hybrid"]
+
+# Search types whose hits can be sorted by rating or review count; kNN hits are only ranked by similarity
+SORT_SEARCH_TYPES = ["basic", "fuzzy", "faceted", "hybrid"]
+
+# Cache of formatted search responses, invalidated when the index version changes
+result_cache = create_result_cache(get_index_version, async_get_index_version)
 
 class SearchService:
     """
@@ -33,30 +75,387 @@ class SearchService:
         return query
     
     @staticmethod
-    def search(query, search_type="basic", filters=None, size=10):
+    def with_correction(payload, processed_query, corrected_query):
+        """Add the corrected query to a response payload when the spelling was corrected"""
+        if corrected_query != processed_query:
+            return {**payload, "corrected_query": corrected_query}
+        return payload
+    
+    @staticmethod
+    def format_hit(hit_id, source, highlight=None):
+        """
+        Build the compact result of one hit: product fields, review count, average
+        rating, a preview of the first reviews and the highlights. Full reviews are
+        served by get_product_reviews.
+        """
+        if "review_preview" not in source and "reviews" in source:
+            # Indices built before the summary fields were added
+            source = {**source, **build_review_summary(source.pop("reviews"))}
+        result = {"id": hit_id}
+        for field in RESULT_FIELDS:
+            result[field] = source.get(field)
+        if highlight:
+            result["highlight"] = highlight
+        return result
+    
+    @staticmethod
+    def format_results(results, search_type):
         """
-        Execute search based on the specified search type
+        Convert raw search results to the JSON response payload
         """
-        processed_query = SearchService.preprocess_query(query)
-        if not processed_query:
-            return []
+        if search_type in ["semantic", "hybrid", "hybrid_rrf"]:
+            # Hits from a direct ES response
+            hits = [SearchService.format_hit(hit["_id"], hit["_source"], hit.get("highlight")) for hit in results]
+        else:
+            # Hits from an elasticsearch_dsl response
+            hits = []
+            for hit in (results["hits"] if search_type == "faceted" else results):
+                highlight = getattr(hit.meta, "highlight", None)
+                hits.append(SearchService.format_hit(hit.meta.id, hit.to_dict(),
+                                                     highlight.to_dict() if highlight is not None else None))
+        
+        if search_type == "faceted":
+            return {"results": hits, "facets": results["facets"]}
+        return {"results": hits}
+    
+    @staticmethod
+    def encode_cursor(pit_id, search_after):
+        """Encode a point in time id and sort values as an opaque cursor"""
+        raw = json.dumps({"pit": pit_id, "search_after": search_after}).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        """
+        Decode a cursor returned by a previous page. Raises ValueError if it is invalid.
+        """
+        try:
+            decoded = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            return {"id": decoded["pit"], "search_after": decoded["search_after"]}
+        except Exception:
+            raise ValueError("Invalid cursor")
+    
+    @staticmethod
+    def get_next_cursor(results, search_type, pit, size):
+        """
+        Return the cursor of the next page, or None if this was the last page.
+        pit holds the point in time id returned with this page, which may differ
+        from the id the page was requested with.
+        """
+        hits = results["hits"] if search_type == "faceted" else results
+        if len(hits) < size:
+            return None
+        last = hits[-1]
+        sort = list(last.meta.sort) if hasattr(last, "meta") else last["sort"]
+        return SearchService.encode_cursor(pit["id"], sort)
+    
+    @staticmethod
+    def make_cache_key(processed_query, search_type, filters, size, from_=0, num_candidates=None, sort=None):
+        """
+        Result cache key shared by the single and multi search paths, so both
+        reuse the same entries. No sort means relevance.
+        """
+        return result_cache.make_key(processed_query, search_type, filters, size, from_=from_,
+                                     num_candidates=num_candidates, sort=sort or "relevance")
+    
+    @staticmethod
+    def check_cursor(search_type, cursor):
+        """Raise ValueError if cursor paging is requested for a search type that can't use it"""
+        if cursor is not None and search_type not in CURSOR_SEARCH_TYPES:
+            raise ValueError(f"Cursor paging is not supported for {search_type} search")
+    
+    @staticmethod
+    def check_from(search_type, from_):
+        """Raise ValueError if from paging is requested for a search type that can't use it"""
+        if from_ and search_type == "hybrid_rrf" and HYBRID_RRF_SERVER_SIDE:
+            raise ValueError("Paging with from is not supported for hybrid_rrf search with server-side RRF")
+    
+    @staticmethod
+    def check_sort(search_type, sort):
+        """Raise ValueError for an unknown sort, or a sort the search type can't apply"""
+        if sort is None or sort == "relevance":
+            return
+        if sort not in SORT_OPTIONS:
+            raise ValueError(f"Unknown sort: {sort}")
+        if search_type not in SORT_SEARCH_TYPES:
+            raise ValueError(f"Sorting by {sort} is not supported for {search_type} search")
+    
+    @staticmethod
+    def search(query, search_type="basic", filters=None, size=10, from_=0, cursor=None,
+               num_candidates=None, sort=None, correct=True):
+        """
+        Execute search based on the specified search type and return the response payload.
+
+        Pages are selected with from_, or with a cursor: pass "*" for the first page
+        and the returned next_cursor for the following ones. num_candidates overrides
+        the kNN candidates of semantic and hybrid_rrf search. sort is relevance,
+        rating or reviews. With correct, misspelled query terms are rewritten before
+        searching and the payload includes the corrected_query.
+        """
+        SearchService.check_cursor(search_type, cursor)
+        SearchService.check_from(search_type, from_)
+        SearchService.check_sort(search_type, sort)
+        original_query = SearchService.preprocess_query(query)
+        if not original_query:
+            return {"results": []}
+        processed_query = correct_query(original_query) if correct else original_query
+        record_query(processed_query)
+        
+        # Cursor pages are tied to a point in time and never cached
+        use_cache = result_cache is not None and cursor is None
+        if use_cache:
+            key = SearchService.make_cache_key(processed_query, search_type, filters, size, from_, num_candidates,
+                                               sort)
+            cached = result_cache.get(key)
+            if cached is not None:
+                return SearchService.with_correction(cached, original_query, processed_query)
+        
+        pit = None
+        if cursor == "*":
+            pit = {"id": open_point_in_time(), "search_after": None}
+        elif cursor is not None:
+            pit = SearchService.decode_cursor(cursor)
+        
+        start = time.perf_counter()
         
         if search_type == "basic":
-            return basic_search(processed_query, size)
+            results = basic_search(processed_query, size, from_, pit, sort)
         elif search_type == "fuzzy":
-            return fuzzy_search(processed_query, size)
+            results = fuzzy_search(processed_query, size, from_, pit, sort)
         elif search_type == "faceted":
-            return facet_search(processed_query, filters, size)
+            results = get_faceted_results(processed_query, filters, size, from_, pit, sort)
+        elif search_type == "semantic" and SEMANTIC_BACKEND == "local":
+            results = local_semantic_search(get_query_embedding(processed_query), filters, from_ + size)[from_:]
         elif search_type == "semantic":
-            return semantic_search(processed_query, filters, size)
+            results = semantic_search(processed_query, filters, size, from_, num_candidates)
         elif search_type == "hybrid":
-            return hybrid_search(processed_query, filters, size)
+            results = hybrid_search(processed_query, filters, size, from_, pit, sort=sort)
+        elif search_type == "hybrid_rrf":
+            results = rrf_hybrid_search(processed_query, filters, size, from_, num_candidates)
         else:
-            return basic_search(processed_query, size)  # Default to basic search
+            search_type = "basic"
+            results = basic_search(processed_query, size, from_, pit)  # Default to basic search
+        
+        payload = SearchService.format_results(results, search_type)
+        
+        if pit is not None:
+            payload["next_cursor"] = SearchService.get_next_cursor(results, search_type, pit, size)
+            if payload["next_cursor"] is None:
+                close_point_in_time(pit["id"])
+        
+        if use_cache:
+            result_cache.put(key, payload, time.perf_counter() - start)
+        
+        return SearchService.with_correction(payload, original_query, processed_query)
     
     @staticmethod
     def get_suggestions(prefix, size=5):
         """
-        Get search suggestions based on prefix
+        Get search suggestions based on prefix, from the in-memory autocomplete
+        when it has been built and from Elasticsearch otherwise
+        """
+        autocomplete = get_autocomplete()
+        if autocomplete is not None:
+            return autocomplete.suggest(prefix, size)
+        return suggestion_search(prefix, size)
+    
+    @staticmethod
+    async def async_search(query, search_type="basic", filters=None, size=10, from_=0, cursor=None,
+                           num_candidates=None, sort=None, correct=True):
+        """
+        Execute search based on the specified search type without blocking the event loop
+        """
+        SearchService.check_cursor(search_type, cursor)
+        SearchService.check_from(search_type, from_)
+        SearchService.check_sort(search_type, sort)
+        with span("preprocess"):
+            original_query = SearchService.preprocess_query(query)
+            if not original_query:
+                return {"results": []}
+            processed_query = await acorrect_query(original_query) if correct else original_query
+        record_query(processed_query)
+        
+        # Cursor pages are tied to a point in time and never cached
+        use_cache = result_cache is not None and cursor is None
+        if use_cache:
+            with span("result_cache"):
+                key = SearchService.make_cache_key(processed_query, search_type, filters, size, from_,
+                                                   num_candidates, sort)
+                cached = await result_cache.aget(key)
+            if cached is not None:
+                return SearchService.with_correction(cached, original_query, processed_query)
+        
+        pit = None
+        if cursor == "*":
+            pit = {"id": await async_open_point_in_time(), "search_after": None}
+        elif cursor is not None:
+            pit = SearchService.decode_cursor(cursor)
+        
+        start = time.perf_counter()
+        results, search_type = await SearchService.async_execute(search_type, processed_query, filters, size, from_,
+                                                                 pit, num_candidates, sort=sort)
+        
+        with span("format"):
+            payload = SearchService.format_results(results, search_type)
+        
+        if pit is not None:
+            payload["next_cursor"] = SearchService.get_next_cursor(results, search_type, pit, size)
+            if payload["next_cursor"] is None:
+                await async_close_point_in_time(pit["id"])
+        
+        if use_cache:
+            await result_cache.aput(key, payload, time.perf_counter() - start)
+        
+        return SearchService.with_correction(payload, original_query, processed_query)
+    
+    @staticmethod
+    async def async_execute(search_type, processed_query, filters=None, size=10, from_=0, pit=None,
+                            num_candidates=None, query_vector=None, sort=None):
+        """
+        Run one search type for a preprocessed query. Returns the raw results and
+        the search type that was run. query_vector skips embedding the query.
+        """
+        if query_vector is None and search_type in VECTOR_SEARCH_TYPES:
+            with span("embedding"):
+                query_vector = await aget_query_embedding(processed_query)
+        
+        if search_type == "semantic" and SEMANTIC_BACKEND == "local":
+            with span("vector_index"):
+                results = (await alocal_semantic_search(query_vector, filters, from_ + size))[from_:]
+            return results, search_type
+        
+        with span("elasticsearch"):
+            if search_type == "basic":
+                results = await async_basic_search(processed_query, size, from_, pit, sort)
+            elif search_type == "fuzzy":
+                results = await async_fuzzy_search(processed_query, size, from_, pit, sort)
+            elif search_type == "faceted":
+                results = await aget_faceted_results(processed_query, filters, size, from_, pit, sort)
+            elif search_type == "semantic":
+                results = await async_semantic_search(processed_query, filters, size, from_, num_candidates,
+                                                      query_vector)
+            elif search_type == "hybrid":
+                results = await async_hybrid_search(processed_query, filters, size, from_, pit, query_vector, sort)
+            elif search_type == "hybrid_rrf":
+                results = await async_rrf_hybrid_search(processed_query, filters, size, from_, num_candidates,
+                                                        query_vector)
+            else:
+                search_type = "basic"
+                results = await async_basic_search(processed_query, size, from_, pit)  # Default to basic search
+        return results, search_type
+    
+    @staticmethod
+    async def async_multi_search(query, search_types, filters=None, size=10, from_=0, num_candidates=None,
+                                 correct=True):
+        """
+        Run several search types for one query concurrently.
+
+        The query is preprocessed, spelling corrected and embedded once, and the searches are sent to
+        Elasticsearch at the same time, so the total latency follows the slowest
+        search type. A failing search type is reported with an error instead of
+        failing the others. Returns the payload and timing of each search type.
+        """
+        search_types = list(dict.fromkeys(search_types))
+        with span("preprocess"):
+            original_query = SearchService.preprocess_query(query)
+            if not original_query:
+                return {
+                    "results": {search_type: {"results": []} for search_type in search_types},
+                    "timings": {
+                        "modes_ms": {search_type: 0.0 for search_type in search_types},
+                        "embedding_ms": 0.0,
+                        "total_ms": 0.0
+                    }
+                }
+            processed_query = await acorrect_query(original_query) if correct else original_query
+        record_query(processed_query)
+        
+        start = time.perf_counter()
+        payloads, keys, timings = {}, {}, {}
+        
+        if result_cache is not None:
+            for search_type in search_types:
+                keys[search_type] = SearchService.make_cache_key(processed_query, search_type, filters, size, from_,
+                                                                 num_candidates)
+                cached = await result_cache.aget(keys[search_type])
+                if cached is not None:
+                    payloads[search_type] = cached
+                    timings[search_type] = 0.0
+        pending = [search_type for search_type in search_types if search_type not in payloads]
+        
+        query_vector = None
+        if any(search_type in VECTOR_SEARCH_TYPES for search_type in pending):
+            with span("embedding"):
+                query_vector = await aget_query_embedding(processed_query)
+        embedding_ms = (time.perf_counter() - start) * 1000
+        
+        async def run(search_type):
+            mode_start = time.perf_counter()
+            results, _ = await SearchService.async_execute(search_type, processed_query, filters, size, from_,
+                                                           num_candidates=num_candidates, query_vector=query_vector)
+            payload = SearchService.format_results(results, search_type)
+            elapsed = time.perf_counter() - mode_start
+            timings[search_type] = elapsed * 1000
+            if result_cache is not None:
+                await result_cache.aput(keys[search_type], payload, elapsed)
+            return payload
+        
+        outcomes = await asyncio.gather(*(run(search_type) for search_type in pending), return_exceptions=True)
+        for search_type, outcome in zip(pending, outcomes):
+            if isinstance(outcome, Exception):
+                print(f"Multi search {search_type} failed: {outcome}")
+                payloads[search_type] = {"results": [], "error": str(outcome)}
+            else:
+                payloads[search_type] = outcome
+        
+        return SearchService.with_correction({
+            "results": {search_type: payloads[search_type] for search_type in search_types},
+            "timings": {
+                "modes_ms": timings,
+                "embedding_ms": embedding_ms,
+                "total_ms": (time.perf_counter() - start) * 1000
+            }
+        }, original_query, processed_query)
+    
+    @staticmethod
+    def get_cache_stats():
+        """
+        Hit ratio and latency saved by the result cache
+        """
+        return result_cache.stats() if result_cache is not None else None
+    
+    @staticmethod
+    def get_facet_cache_stats():
+        """
+        Hit ratio of the facet count cache
+        """
+        return facet_cache.stats() if facet_cache is not None else None
+    
+    @staticmethod
+    def invalidate_cache():
+        """
+        Check the index version again on the next request, e.g. after a reindex
+        """
+        if result_cache is not None:
+            result_cache.invalidate()
+    
+    @staticmethod
+    async def async_get_product_reviews(product_id, from_=0, size=20):
+        """
+        Get a page of the full reviews of a product, or None if it does not exist
+        """
+        page = await async_get_product_reviews(product_id, from_, size)
+        if page is None:
+            return None
+        total, reviews = page
+        return {"id": product_id, "total": total, "reviews": reviews}
+    
+    @staticmethod
+    async def async_get_suggestions(prefix, size=5):
+        """
+        Get search suggestions based on prefix without blocking the event loop
         """
-        return suggestion_search(prefix, size)
\ No newline at end of file
+        autocomplete = get_autocomplete()
+        if autocomplete is not None:
+            return autocomplete.suggest(prefix, size)
+        return await async_suggestion_search(prefix, size)
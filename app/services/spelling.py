@@ -0,0 +1,242 @@
+"""
+Query spelling correction with a SymSpell style delete dictionary.
+
+The dictionary is built at index time from the terms of product names, brands,
+manufacturers and categories, plus review terms so that correctly spelled
+review words are left alone. Every term is stored under each string obtained
+by deleting up to max_distance characters from its prefix; a query term looks
+up its own deletes, which finds all terms within the edit distance without
+scanning the vocabulary or asking Elasticsearch for fuzzy expansions.
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+from collections import Counter
+
+from app.config import SPELLING_PATH, SPELLING_MAX_EDIT_DISTANCE, SPELLING_PREFIX_LENGTH, SPELLING_MIN_COUNT
+
+# Product field terms outrank review terms at the same edit distance
+PRODUCT_TERM_WEIGHT = 10
+
+WORD_PATTERN = re.compile(r"\w+(?:'\w+)?")
+# Words made of letters only; numbers and model codes are never corrected
+TERM_PATTERN = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+def get_terms(text):
+    """Lowercased letter-only words of a text"""
+    if not text:
+        return []
+    return [word for word in WORD_PATTERN.findall(str(text).lower()) if TERM_PATTERN.fullmatch(word)]
+
+def get_max_distance(term, max_distance=None):
+    """Edits allowed for a term, following Elasticsearch's fuzziness AUTO"""
+    max_distance = SPELLING_MAX_EDIT_DISTANCE if max_distance is None else max_distance
+    if len(term) < 3:
+        return 0
+    return min(max_distance, 1 if len(term) < 6 else 2)
+
+def get_deletes(term, max_distance):
+    """Every string obtained by deleting up to max_distance characters from term"""
+    deletes = {term}
+    edits = {term}
+    for _ in range(max_distance):
+        edits = {edit[:i] + edit[i + 1:] for edit in edits for i in range(len(edit))}
+        deletes |= edits
+    return deletes
+
+def edit_distance(source, target, max_distance):
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent transpositions),
+    or max_distance + 1 once it is known to exceed max_distance
+    """
+    if abs(len(source) - len(target)) > max_distance:
+        return max_distance + 1
+    previous_previous = None
+    previous = list(range(len(target) + 1))
+    for i in range(1, len(source) + 1):
+        current = [i] + [0] * len(target)
+        for j in range(1, len(target) + 1):
+            cost = 0 if source[i - 1] == target[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous_previous is not None and i > 1 and j > 1 and source[i - 1] == target[j - 2]
+                    and source[i - 2] == target[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        # A transposition on the next row reads this row's predecessor, so both must exceed the limit
+        if min(current) > max_distance and min(previous) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+class SpellingCorrector:
+    """
+    In-memory delete dictionary over term counts.
+
+    Deletes are taken from the first prefix_length characters of each term only,
+    which bounds the dictionary size; candidates are then verified with the full
+    edit distance. Known terms are never rewritten.
+    """
+
+    def __init__(self, counts, max_distance=None, prefix_length=None):
+        # counts is a dict of term -> count
+        self.counts = counts
+        self.max_distance = SPELLING_MAX_EDIT_DISTANCE if max_distance is None else max_distance
+        self.prefix_length = prefix_length or SPELLING_PREFIX_LENGTH
+        self.deletes = {}
+        for term in counts:
+            for delete in get_deletes(term[:self.prefix_length], self.max_distance):
+                self.deletes.setdefault(delete, []).append(term)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def correct_term(self, term):
+        """Return the most frequent known term closest to term, or term itself"""
+        if term in self.counts or not TERM_PATTERN.fullmatch(term):
+            return term
+        max_distance = get_max_distance(term, self.max_distance)
+        if max_distance == 0:
+            return term
+
+        best, best_key = term, None
+        seen = set()
+        for delete in get_deletes(term[:self.prefix_length], max_distance):
+            for candidate in self.deletes.get(delete, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = edit_distance(term, candidate, max_distance)
+                if distance > max_distance:
+                    continue
+                key = (distance, -self.counts[candidate])
+                if best_key is None or key < best_key:
+                    best, best_key = candidate, key
+        return best
+
+    def correct(self, query):
+        """
+        Correct each term of a preprocessed query. Returns the corrected query,
+        which equals the query when nothing was rewritten.
+        """
+        return WORD_PATTERN.sub(lambda match: self.correct_term(match.group(0)), query)
+
+class SpellingBuilder:
+    """
+    Count terms at index time and write the spelling dictionary file.
+
+    Each product contributes its name, brand, manufacturer and category terms
+    PRODUCT_TERM_WEIGHT times and its review terms once.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def add(self, document):
+        product_text = " ".join([str(document.get("name") or ""), str(document.get("brand") or ""),
+                                 str(document.get("manufacturer") or "")] + list(document.get("categories") or []))
+        for term in get_terms(product_text):
+            self.counts[term] += PRODUCT_TERM_WEIGHT
+        for review in document.get("reviews") or []:
+            for field in ("title", "text"):
+                value = review.get(field)
+                if isinstance(value, str):
+                    self.counts.update(get_terms(value))
+
+    def save(self, path=None, min_count=None):
+        """
+        Write the terms seen at least min_count times, which drops most typos
+        in review text from the dictionary
+        """
+        path = path or SPELLING_PATH
+        min_count = SPELLING_MIN_COUNT if min_count is None else min_count
+        terms = {term: count for term, count in self.counts.items() if count >= min_count}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"terms": terms}, f)
+        os.replace(tmp_path, path)
+        print(f"Saved spelling dictionary with {len(terms)} terms to '{path}'")
+
+def load_spelling(path):
+    """Build the in-memory corrector from a spelling dictionary file"""
+    with open(path, "r") as f:
+        return SpellingCorrector(json.load(f)["terms"])
+
+# (corrector, file mtime), replaced in a single assignment so readers never see a half-built dictionary
+_loaded = (None, None)
+_load_lock = threading.Lock()
+_reload_task = None
+
+def get_spelling_mtime():
+    """The mtime of SPELLING_PATH, or None if it has not been built or correction is disabled"""
+    if not SPELLING_PATH:
+        return None
+    try:
+        return os.path.getmtime(SPELLING_PATH)
+    except OSError:
+        return None
+
+def get_spelling():
+    """
+    Return the corrector for SPELLING_PATH, reloading it after a reindex, or
+    None if the dictionary has not been built or correction is disabled
+    """
+    global _loaded
+    mtime = get_spelling_mtime()
+    if mtime is None:
+        return None
+    spelling, loaded_mtime = _loaded
+    if spelling is not None and mtime == loaded_mtime:
+        return spelling
+
+    with _load_lock:
+        spelling, loaded_mtime = _loaded
+        if spelling is None or mtime != loaded_mtime:
+            spelling = load_spelling(SPELLING_PATH)
+            _loaded = (spelling, mtime)
+        return spelling
+
+async def _areload(previous):
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, get_spelling)
+    except Exception as e:
+        print(f"Could not reload the spelling dictionary: {e}")
+        return previous
+
+async def aget_spelling():
+    """
+    Async version of get_spelling. The dictionary is built on the default
+    executor; after a reindex the previous one keeps correcting queries until
+    the new one is swapped in.
+    """
+    global _reload_task
+    mtime = get_spelling_mtime()
+    if mtime is None:
+        return None
+    spelling, loaded_mtime = _loaded
+    if spelling is not None and mtime == loaded_mtime:
+        return spelling
+
+    task = _reload_task
+    if task is None or task.done():
+        task = _reload_task = asyncio.ensure_future(_areload(spelling))
+    if spelling is None:
+        return await asyncio.shield(task)
+    return spelling
+
+def correct_query(query):
+    """
+    Return the spelling corrected version of a preprocessed query, or the query
+    unchanged when no dictionary has been built
+    """
+    spelling = get_spelling()
+    return spelling.correct(query) if spelling is not None else query
+
+async def acorrect_query(query):
+    """
+    Async version of correct_query
+    """
+    spelling = await aget_spelling()
+    return spelling.correct(query) if spelling is not None else query
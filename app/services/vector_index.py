@@ -0,0 +1,423 @@
+import asyncio
+import glob
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from app.config import (
+    EMBEDDING_DIMENSION,
+    VECTOR_INDEX_PATH,
+    VECTOR_INDEX_MODE,
+    VECTOR_INDEX_NLIST,
+    VECTOR_INDEX_NPROBE
+)
+
+# Fields returned in _source by semantic search
+SOURCE_FIELDS = ["id", "name", "brand", "categories", "manufacturer", "review_count", "avg_rating", "rating_histogram",
+                 "review_preview"]
+
+class VectorIndex:
+    """
+    In-process vector index over product embeddings.
+
+    Vectors are kept as one contiguous float32 array of L2-normalized rows (a
+    np.memmap when loaded from disk), so exact search is a single matrix-vector
+    product followed by argpartition. An optional IVF layer (spherical k-means
+    centroids plus inverted lists) restricts scoring to the nprobe closest lists.
+
+    Filter metadata mirrors the filters built for semantic_search: brand and
+    manufacturer are stored as integer codes, categories as a flat array with
+    per-document offsets and the average rating as one float per document.
+    """
+
+    def __init__(self, ids, vectors, brand_vocab, brand_codes, manufacturer_vocab, manufacturer_codes,
+                 category_vocab, category_codes, category_offsets, avg_ratings,
+                 sources_path=None, source_offsets=None):
+        self.ids = ids
+        self.vectors = vectors
+        self.brand_vocab = {value: code for code, value in enumerate(brand_vocab)}
+        self.brand_codes = brand_codes
+        self.manufacturer_vocab = {value: code for code, value in enumerate(manufacturer_vocab)}
+        self.manufacturer_codes = manufacturer_codes
+        self.category_vocab = {value: code for code, value in enumerate(category_vocab)}
+        self.category_codes = category_codes
+        self.category_offsets = category_offsets
+        self.category_docs = self._owner_docs(category_offsets)
+        self.avg_ratings = avg_ratings
+        self.sources_path = sources_path
+        self.source_offsets = source_offsets
+        self._sources_fd = None
+        self._sources_size = None
+        self.centroids = None
+        self.list_offsets = None
+        self.list_members = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _owner_docs(offsets):
+        """Map each entry of a flat per-document array back to its document"""
+        counts = np.diff(offsets)
+        return np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+
+    @classmethod
+    def from_documents(cls, documents):
+        """
+        Build an in-memory index from embedded product documents
+        """
+        builder = VectorIndexBuilder()
+        for document in documents:
+            builder.add(document)
+        return builder.build()
+
+    def save(self, path):
+        """
+        Write the index to a new {path}.v{timestamp} directory and atomically
+        point the path symlink at it. Readers always find a complete index, and
+        one that is still loaded keeps reading its own files. Versions older than
+        the previous one are deleted. Returns the version directory.
+        """
+        version_path = f"{path}.v{time.time_ns()}"
+        os.makedirs(version_path)
+
+        np.save(os.path.join(version_path, "vectors.npy"), np.ascontiguousarray(self.vectors, dtype=np.float32))
+        arrays = {
+            "brand_codes": self.brand_codes,
+            "manufacturer_codes": self.manufacturer_codes,
+            "category_codes": self.category_codes,
+            "category_offsets": self.category_offsets,
+            "avg_ratings": self.avg_ratings,
+            "source_offsets": self.source_offsets
+        }
+        if self.centroids is not None:
+            arrays.update(centroids=self.centroids, list_offsets=self.list_offsets, list_members=self.list_members)
+        np.savez(os.path.join(version_path, "arrays.npz"), **arrays)
+
+        shutil.copyfile(self.sources_path, os.path.join(version_path, "sources.jsonl"))
+        with open(os.path.join(version_path, "meta.json"), "w") as f:
+            json.dump({
+                "ids": self.ids,
+                "brand_vocab": list(self.brand_vocab),
+                "manufacturer_vocab": list(self.manufacturer_vocab),
+                "category_vocab": list(self.category_vocab)
+            }, f)
+
+        previous_path = os.path.realpath(path) if os.path.islink(path) else None
+        if os.path.isdir(path) and not os.path.islink(path):
+            # Indexes saved as a plain directory are replaced by the symlink once
+            shutil.rmtree(path)
+        link_path = f"{path}.link.tmp"
+        if os.path.lexists(link_path):
+            os.remove(link_path)
+        # A relative target keeps the link valid when the data directory is mounted elsewhere
+        os.symlink(os.path.basename(version_path), link_path)
+        os.replace(link_path, path)
+
+        keep = {os.path.realpath(version_path), previous_path}
+        for old_path in glob.glob(f"{glob.escape(path)}.v*"):
+            if os.path.realpath(old_path) not in keep:
+                shutil.rmtree(old_path, ignore_errors=True)
+        return version_path
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load an index written by save, memory-mapping the vectors by default
+        """
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r" if mmap else None)
+        with np.load(os.path.join(path, "arrays.npz")) as data:
+            arrays = {name: data[name] for name in data.files}
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+
+        index = cls(
+            meta["ids"], vectors,
+            meta["brand_vocab"], arrays["brand_codes"],
+            meta["manufacturer_vocab"], arrays["manufacturer_codes"],
+            meta["category_vocab"], arrays["category_codes"], arrays["category_offsets"],
+            arrays["avg_ratings"],
+            os.path.join(path, "sources.jsonl"), arrays["source_offsets"]
+        )
+        # Pin this version's sources, even after a rebuild replaces the files
+        index._open_sources()
+        if "centroids" in arrays:
+            index.centroids = arrays["centroids"]
+            index.list_offsets = arrays["list_offsets"]
+            index.list_members = arrays["list_members"]
+        return index
+
+    def build_ivf(self, nlist, iterations=10, seed=0):
+        """
+        Cluster the vectors with spherical k-means and build the inverted lists
+        """
+        rng = np.random.default_rng(seed)
+        nlist = max(1, min(nlist, len(self)))
+        centroids = np.array(self.vectors[rng.choice(len(self), nlist, replace=False)], dtype=np.float32)
+
+        for _ in range(iterations):
+            assignments = self._assign(centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, self.vectors)
+            counts = np.bincount(assignments, minlength=nlist)
+
+            # Reseed empty lists with random vectors
+            empty = counts == 0
+            sums[empty] = self.vectors[rng.choice(len(self), int(empty.sum()))]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+        assignments = self._assign(centroids)
+        self.centroids = centroids.astype(np.float32)
+        self.list_members = np.argsort(assignments, kind="stable").astype(np.int32)
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=nlist))]).astype(np.int64)
+
+    def _assign(self, centroids, chunk_size=65536):
+        """Closest centroid of every vector, computed in chunks"""
+        assignments = np.empty(len(self), dtype=np.int32)
+        for start in range(0, len(self), chunk_size):
+            assignments[start:start + chunk_size] = np.argmax(self.vectors[start:start + chunk_size] @ centroids.T, axis=1)
+        return assignments
+
+    def filter_mask(self, filters):
+        """
+        Boolean mask of the documents matching the semantic_search filters, or None
+        """
+        mask = None
+        for field, values in (filters or {}).items():
+            if field == "avg_rating" and isinstance(values, dict) and "range" in values:
+                field_mask = self._rating_mask(values["range"])
+            else:
+                if not isinstance(values, list):
+                    values = [values]
+                if not values:
+                    continue
+                if field == "brand":
+                    field_mask = self._code_mask(self.brand_codes, self.brand_vocab, values)
+                elif field == "manufacturer":
+                    field_mask = self._code_mask(self.manufacturer_codes, self.manufacturer_vocab, values)
+                elif field == "categories":
+                    field_mask = self._category_mask(values)
+                elif field == "primary_category":
+                    field_mask = self._primary_category_mask(values)
+                else:
+                    raise ValueError(f"Unsupported filter field for the local vector index: {field}")
+            mask = field_mask if mask is None else mask & field_mask
+        return mask
+
+    def _code_mask(self, codes, vocab, values):
+        wanted = [vocab[value] for value in values if value in vocab]
+        return np.isin(codes, wanted)
+
+    def _category_mask(self, values):
+        wanted = [self.category_vocab[value] for value in values if value in self.category_vocab]
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self.category_docs[np.isin(self.category_codes, wanted)]] = True
+        return mask
+
+    def _primary_category_mask(self, values):
+        # The primary category is the first category of each document
+        wanted = [self.category_vocab[value] for value in values if value in self.category_vocab]
+        mask = np.zeros(len(self), dtype=bool)
+        has_categories = np.diff(self.category_offsets) > 0
+        mask[has_categories] = np.isin(self.category_codes[self.category_offsets[:-1][has_categories]], wanted)
+        return mask
+
+    def _rating_mask(self, range_params):
+        # Products without a rating (NaN) never match, like documents missing avg_rating in ES
+        mask = ~np.isnan(self.avg_ratings)
+        if "gte" in range_params:
+            mask &= self.avg_ratings >= range_params["gte"]
+        if "gt" in range_params:
+            mask &= self.avg_ratings > range_params["gt"]
+        if "lte" in range_params:
+            mask &= self.avg_ratings <= range_params["lte"]
+        if "lt" in range_params:
+            mask &= self.avg_ratings < range_params["lt"]
+        return mask
+
+    def search(self, query_vector, k=10, filters=None, mode=None, nprobe=None):
+        """
+        Return the top-k (document position, cosine similarity) pairs.
+
+        mode is "exact" or "ivf"; IVF falls back to exact search if no lists were built.
+        """
+        mode = mode or VECTOR_INDEX_MODE
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        mask = self.filter_mask(filters)
+        if mode == "ivf" and self.centroids is not None:
+            probes = np.argsort(-(self.centroids @ query))[:nprobe or VECTOR_INDEX_NPROBE]
+            candidates = np.concatenate([
+                self.list_members[self.list_offsets[probe]:self.list_offsets[probe + 1]] for probe in probes
+            ])
+            if mask is not None:
+                candidates = candidates[mask[candidates]]
+            # Sorted positions keep reads from the memory-mapped vectors sequential
+            candidates = np.sort(candidates)
+        elif mask is not None:
+            candidates = np.flatnonzero(mask)
+        else:
+            candidates = None
+
+        if candidates is None:
+            scores = self.vectors @ query
+        else:
+            scores = self.vectors[candidates] @ query
+
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        positions = top if candidates is None else candidates[top]
+        return list(zip(positions.tolist(), scores[top].tolist()))
+
+    def _open_sources(self):
+        if self._sources_fd is None:
+            self._sources_fd = os.open(self.sources_path, os.O_RDONLY)
+            self._sources_size = os.fstat(self._sources_fd).st_size
+        return self._sources_fd
+
+    def close(self):
+        """Close the sources file"""
+        if self._sources_fd is not None:
+            os.close(self._sources_fd)
+            self._sources_fd = None
+
+    def __del__(self):
+        self.close()
+
+    def get_source(self, position):
+        """
+        Read the stored _source of a document. The sources file stays open for the
+        life of the index and is read with pread, so threads can share it.
+        """
+        fd = self._open_sources()
+        start = int(self.source_offsets[position])
+        end = int(self.source_offsets[position + 1]) if position + 1 < len(self.source_offsets) else self._sources_size
+        return json.loads(os.pread(fd, end - start, start))
+
+    def to_hits(self, results):
+        """
+        Format search results like Elasticsearch kNN hits (score = (1 + cosine) / 2)
+        """
+        return [
+            {"_id": self.ids[position], "_score": (1.0 + score) / 2.0, "_source": self.get_source(position)}
+            for position, score in results
+        ]
+
+class VectorIndexBuilder:
+    """
+    Accumulate embedded product documents and build a VectorIndex.
+
+    Sources are streamed to a JSON lines file as documents are added, so only
+    vectors and filter metadata are held in memory.
+    """
+
+    def __init__(self, sources_path=None):
+        self.sources_path = sources_path or f"{VECTOR_INDEX_PATH}.sources.jsonl"
+        os.makedirs(os.path.dirname(self.sources_path) or ".", exist_ok=True)
+        self._sources = open(self.sources_path, "wb")
+        self.ids = []
+        self.vectors = []
+        self.source_offsets = []
+        self.brand_vocab, self.brand_codes = {}, []
+        self.manufacturer_vocab, self.manufacturer_codes = {}, []
+        self.category_vocab, self.category_codes, self.category_counts = {}, [], []
+        self.avg_ratings = []
+
+    def add(self, document):
+        self.ids.append(document["id"])
+        self.vectors.append(np.asarray(document["text_vector"], dtype=np.float32))
+
+        self.source_offsets.append(self._sources.tell())
+        source = {field: document.get(field) for field in SOURCE_FIELDS}
+        self._sources.write(json.dumps(source, default=str).encode("utf-8") + b"\n")
+
+        self.brand_codes.append(self.brand_vocab.setdefault(document["brand"], len(self.brand_vocab)))
+        self.manufacturer_codes.append(
+            self.manufacturer_vocab.setdefault(document["manufacturer"], len(self.manufacturer_vocab))
+        )
+        for category in document["categories"]:
+            self.category_codes.append(self.category_vocab.setdefault(category, len(self.category_vocab)))
+        self.category_counts.append(len(document["categories"]))
+        avg_rating = document.get("avg_rating")
+        self.avg_ratings.append(np.nan if avg_rating is None else avg_rating)
+
+    def build(self):
+        self._sources.close()
+        vectors = np.vstack(self.vectors) if self.vectors else np.empty((0, EMBEDDING_DIMENSION), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        def offsets(counts):
+            return np.concatenate([[0], np.cumsum(counts, dtype=np.int64)]).astype(np.int64)
+
+        return VectorIndex(
+            self.ids, vectors,
+            list(self.brand_vocab), np.asarray(self.brand_codes, dtype=np.int32),
+            list(self.manufacturer_vocab), np.asarray(self.manufacturer_codes, dtype=np.int32),
+            list(self.category_vocab), np.asarray(self.category_codes, dtype=np.int32), offsets(self.category_counts),
+            np.asarray(self.avg_ratings, dtype=np.float32),
+            self.sources_path, np.asarray(self.source_offsets, dtype=np.int64)
+        )
+
+    def save(self, path=None):
+        """
+        Build the index (with IVF lists in ivf mode) and write it to disk
+        """
+        path = path or VECTOR_INDEX_PATH
+        index = self.build()
+        if VECTOR_INDEX_MODE == "ivf" and len(index):
+            index.build_ivf(VECTOR_INDEX_NLIST)
+        version_path = index.save(path)
+        index.close()
+        os.remove(self.sources_path)
+        index.sources_path = os.path.join(version_path, "sources.jsonl")
+        print(f"Saved local vector index with {len(index)} vectors to '{version_path}' behind '{path}'")
+        return index
+
+class VectorIndexUnavailable(RuntimeError):
+    """The local vector index has not been built, or could not be loaded"""
+
+_loaded_index = None
+_loaded_version = None
+_load_lock = threading.Lock()
+
+def get_vector_index():
+    """
+    Return the vector index at VECTOR_INDEX_PATH, reloading it after a rebuild.
+    Raises VectorIndexUnavailable if it has not been built.
+    """
+    global _loaded_index, _loaded_version
+    # Resolve the symlink once, so every file is read from the same version
+    version_path = os.path.realpath(VECTOR_INDEX_PATH)
+    try:
+        version = (version_path, os.path.getmtime(os.path.join(version_path, "meta.json")))
+    except OSError:
+        raise VectorIndexUnavailable(f"Local vector index not found at '{VECTOR_INDEX_PATH}'. "
+                                     f"Build it with `SEMANTIC_BACKEND=local python -m app.cli index`.")
+
+    with _load_lock:
+        if _loaded_index is None or version != _loaded_version:
+            _loaded_index = VectorIndex.load(version_path)
+            _loaded_version = version
+        return _loaded_index
+
+def local_semantic_search(query_vector, filters=None, size=10):
+    """
+    Semantic search against the local vector index, returning ES-style hits
+    """
+    index = get_vector_index()
+    return index.to_hits(index.search(query_vector, size, filters))
+
+async def alocal_semantic_search(query_vector, filters=None, size=10):
+    """
+    Async version of local_semantic_search. Loading a rebuilt index, scoring and
+    reading the sources run on the default executor.
+    """
+    return await asyncio.get_running_loop().run_in_executor(None, local_semantic_search, query_vector, filters, size)
@@ -6,6 +6,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const searchResults = document.getElementById('search-results');
     const loadingIndicator = document.getElementById('loading-indicator');
     const noResults = document.getElementById('no-results');
+    const correctedQuery = document.getElementById('corrected-query');
     const loadMoreButton = document.getElementById('load-more');
     const applyFiltersButton = document.getElementById('apply-filters');
     const resetFiltersButton = document.getElementById('reset-filters');
@@ -28,13 +29,14 @@ document.addEventListener('DOMContentLoaded', () => {
         searchResults.classList.add('d-none');
         noResults.classList.add('d-none');
         loadMoreButton.classList.add('d-none');
+        correctedQuery.classList.add('d-none');
         
         // Get selected search type
         const searchTypeRadio = document.querySelector('input[name="search-type"]:checked');
         currentSearchType = searchTypeRadio ? searchTypeRadio.value : 'hybrid';
         
         // Build URL with query parameters
-        let url = `/api/search?q=${encodeURIComponent(query)}&search_type=${currentSearchType}&size=12`;
+        let url = `/api/search?q=${encodeURIComponent(query)}&search_type=${currentSearchType}&size=12&from=${(page - 1) * 12}`;
         
         // Add filters to URL if they exist
         if (filters.categories && filters.categories.length) {
@@ -63,6 +65,12 @@ document.addEventListener('DOMContentLoaded', () => {
             url += `&max_rating=${filters.maxRating}`;
         }
         
+        // kNN based search types are only ranked by similarity
+        const sort = document.getElementById('sort-select').value;
+        if (sort !== 'relevance' && !['semantic', 'hybrid_rrf'].includes(currentSearchType)) {
+            url += `&sort=${sort}`;
+        }
+        
         // Execute search
         try {
             const response = await fetch(url);
@@ -72,6 +80,15 @@ document.addEventListener('DOMContentLoaded', () => {
             loadingIndicator.classList.add('d-none');
             searchResults.classList.remove('d-none');
             
+            // Misspelled terms were corrected by the server
+            if (data.corrected_query) {
+                correctedQuery.innerHTML = '';
+                const label = document.createElement('strong');
+                label.textContent = data.corrected_query;
+                correctedQuery.append('Showing results for ', label);
+                correctedQuery.classList.remove('d-none');
+            }
+            
             // Display results or no results message
             if (data.results && data.results.length > 0) {
                 displayResults(data.results);
@@ -120,28 +137,16 @@ document.addEventListener('DOMContentLoaded', () => {
             }
             
             // Get first review for preview
-            const firstReview = product.reviews && product.reviews.length > 0 ? product.reviews[0] : null;
+            const firstReview = product.review_preview && product.review_preview.length > 0 ? product.review_preview[0] : null;
             
             // Format categories
             const categories = Array.isArray(product.categories) 
                 ? product.categories.slice(0, 3).join(', ')
                 : (product.categories || '').split(',').slice(0, 3).join(', ');
                 
-            // Calculate average rating
-            let avgRating = 0;
-            let ratingCount = 0;
-            
-            if (product.reviews && product.reviews.length) {
-                const sum = product.reviews.reduce((acc, review) => {
-                    if (review.rating) {
-                        return acc + review.rating;
-                    }
-                    return acc;
-                }, 0);
-                
-                ratingCount = product.reviews.length;
-                avgRating = ratingCount > 0 ? (sum / ratingCount).toFixed(1) : 0;
-            }
+            // Review count and average rating are computed at index time
+            const avgRating = product.avg_rating ? product.avg_rating.toFixed(1) : 0;
+            const ratingCount = product.review_count || 0;
             
             // Create HTML for product card
             productCard.innerHTML = `
@@ -149,24 +154,25 @@ document.addEventListener('DOMContentLoaded', () => {
                     <div class="card-body">
                         <h5 class="card-title">${highlightQuery(product.name, currentQuery)}</h5>
                         <div class="d-flex justify-content-between align-items-center mb-2">
-                            <span class="product-brand">Brand: ${product.brand || 'Unknown'}</span>
+                            <span class="product-brand">Brand: ${escapeHtml(product.brand || 'Unknown')}</span>
                             <span class="product-rating">★ ${avgRating} (${ratingCount})</span>
                         </div>
                         <div class="product-categories mb-2">
                             ${categories.split(',').map(cat => 
-                                `<span class="badge rounded-pill category-badge">${cat.trim()}</span>`
+                                `<span class="badge rounded-pill category-badge">${escapeHtml(cat.trim())}</span>`
                             ).join('')}
                         </div>
                         ${firstReview ? `
                             <div class="review-preview">
-                                <h6 class="review-title">${firstReview.title || 'Review'}</h6>
+                                <h6 class="review-title">${escapeHtml(firstReview.title || 'Review')}</h6>
                                 <p class="review-text text-muted mb-0">${highlightQuery(truncateText(firstReview.text, 100), currentQuery)}</p>
                             </div>
                         ` : ''}
+                        <div class="all-reviews d-none"></div>
                     </div>
                     <div class="card-footer bg-transparent">
                         <button class="btn btn-sm btn-outline-secondary w-100 show-details" 
-                                data-product-id="${product.id}">
+                                data-product-id="${escapeHtml(product.id)}">
                             View Details
                         </button>
                     </div>
@@ -177,30 +183,70 @@ document.addEventListener('DOMContentLoaded', () => {
         });
         
         // Add event listeners to "View Details" buttons
-        document.querySelectorAll('.show-details').forEach(button => {
-            button.addEventListener('click', () => {
-                // Implementation for showing product details would go here
-                // This could open a modal with detailed product information
-                alert(`Product details for ID: ${button.dataset.productId}`);
-            });
+        searchResults.querySelectorAll('.show-details:not([data-bound])').forEach(button => {
+            button.dataset.bound = 'true';
+            button.addEventListener('click', () => showReviews(button));
         });
     };
     
+    // Fetch the full reviews of a product, which search results only preview
+    const showReviews = async (button) => {
+        const container = button.closest('.product-card').querySelector('.all-reviews');
+        if (!container.classList.contains('d-none')) {
+            container.classList.add('d-none');
+            return;
+        }
+        
+        try {
+            const response = await fetch(`/api/products/${encodeURIComponent(button.dataset.productId)}/reviews?size=20`);
+            const data = await response.json();
+            container.innerHTML = (data.reviews || []).map(review => `
+                <div class="review-preview mt-2">
+                    <h6 class="review-title">${escapeHtml(review.title || 'Review')} ${review.rating ? `<small>★ ${escapeHtml(review.rating)}</small>` : ''}</h6>
+                    <p class="review-text text-muted mb-0">${highlightQuery(review.text || '', currentQuery)}</p>
+                </div>
+            `).join('') + (data.total > 20 ? `<p class="text-muted small mt-2">Showing 20 of ${escapeHtml(data.total)} reviews</p>` : '');
+            container.classList.remove('d-none');
+        } catch (error) {
+            console.error('Reviews error:', error);
+        }
+    };
+    
     // Update facets in the UI
     const updateFacets = (facets) => {
-        // Implementation would update the filter checkboxes with counts
-        console.log('Facets received:', facets);
+        // Show the count of each filter value next to its checkbox
+        const facetInputs = {category: facets.categories, brand: facets.brands, manufacturer: facets.manufacturers};
+        Object.entries(facetInputs).forEach(([name, buckets]) => {
+            const counts = new Map((buckets || []).map(bucket => [bucket.key, bucket.doc_count]));
+            document.querySelectorAll(`input[name="${name}"]`).forEach(input => {
+                const label = document.querySelector(`label[for="${input.id}"]`);
+                if (label) {
+                    // Only the top buckets of each facet are returned
+                    label.textContent = counts.has(input.value) ? `${input.value} (${counts.get(input.value)})` : input.value;
+                }
+            });
+        });
     };
     
     // Helper function to highlight the search query in text
     const highlightQuery = (text, query) => {
-        if (!text || !query) return text || '';
+        if (!text) return '';
         
-        const words = query.split(' ').filter(word => word.length > 2).map(escapeRegExp);
-        if (words.length === 0) return text;
+        const words = (query || '').split(' ').filter(word => word.length > 2).map(escapeRegExp);
+        if (words.length === 0) return escapeHtml(text);
         
+        // Odd parts are the matches; every part is escaped, since text comes from product and review content
         const regex = new RegExp(`(${words.join('|')})`, 'gi');
-        return text.replace(regex, '<span class="highlight">$1</span>');
+        return text.split(regex)
+            .map((part, i) => i % 2 ? `<span class="highlight">${escapeHtml(part)}</span>` : escapeHtml(part))
+            .join('');
+    };
+    
+    // Escape text before it is interpolated into HTML
+    const escapeHtml = (value) => {
+        return String(value).replace(/[&<>"']/g, char => ({
+            '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+        })[char]);
     };
     
     // Escape special regex characters
@@ -372,4 +418,11 @@ document.addEventListener('DOMContentLoaded', () => {
             }
         });
     });
+    
+    // Change sort order
+    document.getElementById('sort-select').addEventListener('change', () => {
+        if (currentQuery) {
+            performSearch(currentQuery, 1, currentFilters);
+        }
+    });
 });
\ No newline at end of file
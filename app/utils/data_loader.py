@@ -1,27 +1,56 @@
 import pandas as pd
+import numpy as np
 import os
 import json
+import hashlib
+import math
 
-def load_csv_data(csv_path):
+from app.config import INDEX_CHUNK_SIZE, REVIEW_PREVIEW_SIZE, REVIEW_PREVIEW_CHARS
+from app.services.autocomplete import build_suggest_field
+
+# Product columns; rows with the same values belong to one product
+PRODUCT_COLUMNS = ['id', 'name', 'brand', 'categories', 'manufacturer']
+
+# Review columns, mapped to the keys of the review objects
+REVIEW_COLUMNS = {
+    'reviews.date': 'date',
+    'reviews.rating': 'rating',
+    'reviews.text': 'text',
+    'reviews.title': 'title',
+    'reviews.username': 'username'
+}
+
+# Only these columns are read. Product columns repeat on every review row, so
+# they are read as categoricals.
+CSV_DTYPES = {
+    'id': 'category',
+    'name': 'category',
+    'brand': 'category',
+    'categories': 'category',
+    'manufacturer': 'category',
+    'reviews.date': str,
+    'reviews.rating': 'float64',
+    'reviews.text': str,
+    'reviews.title': str,
+    'reviews.username': str
+}
+
+def load_csv_data(csv_path, chunksize=None):
     """
-    Load data from CSV file
+    Load the columns used for indexing from the CSV file, or an iterator of
+    chunks when chunksize is given
     """
     if not os.path.exists(csv_path):
         raise FileNotFoundError(f"CSV file not found: {csv_path}")
-    
-    df = pd.read_csv(csv_path)
-    return df
+
+    return pd.read_csv(csv_path, usecols=list(CSV_DTYPES), dtype=CSV_DTYPES, chunksize=chunksize)
 
 def get_unique_categories(df):
     """
     Extract all unique categories from the dataset
     """
-    categories = set()
-    for cat_list in df['categories'].dropna():
-        for cat in cat_list.split(','):
-            categories.add(cat.strip())
-    
-    return sorted(list(categories))
+    categories = df['categories'].dropna().astype(str).str.split(',').explode().str.strip()
+    return sorted(categories.unique().tolist())
 
 def get_unique_brands(df):
     """
@@ -35,19 +64,156 @@ def get_unique_manufacturers(df):
     """
     return sorted(df['manufacturer'].dropna().unique().tolist())
 
+class MetadataCollector:
+    """
+    Collect categories, brands and manufacturers from the data frames (or chunks)
+    loaded for indexing, so the metadata file needs no extra pass over the CSV
+    """
+
+    def __init__(self):
+        self.categories = set()
+        self.brands = set()
+        self.manufacturers = set()
+
+    def update(self, df):
+        self.categories.update(get_unique_categories(df))
+        self.brands.update(get_unique_brands(df))
+        self.manufacturers.update(get_unique_manufacturers(df))
+
+    def add_document(self, document):
+        """Add the values of a prepared product document"""
+        self.categories.update(category.strip() for category in document["categories"])
+        self.brands.add(document["brand"])
+        if document["manufacturer"]:
+            self.manufacturers.add(document["manufacturer"])
+
+    def to_dict(self):
+        return {
+            "categories": sorted(self.categories),
+            "brands": sorted(self.brands),
+            "manufacturers": sorted(self.manufacturers)
+        }
+
+    def save(self, output_path):
+        """Write the metadata file used for the filter options"""
+        metadata = self.to_dict()
+        with open(output_path, 'w') as f:
+            json.dump(metadata, f, indent=2)
+        return metadata
+
 def create_metadata_file(csv_path, output_path):
     """
     Create metadata file with categories, brands, and manufacturers
     """
-    df = load_csv_data(csv_path)
-    
-    metadata = {
-        "categories": get_unique_categories(df),
-        "brands": get_unique_brands(df),
-        "manufacturers": get_unique_manufacturers(df)
+    collector = MetadataCollector()
+    collector.update(load_csv_data(csv_path))
+    return collector.save(output_path)
+
+def iter_product_documents(df):
+    """
+    Group review rows by product and yield product documents (without vectors).
+
+    Rows are grouped with one vectorized groupby, and each column is converted to
+    a Python list once rather than building a Series per row.
+    """
+    # Products with a missing product field are dropped, and only reviews with text are kept
+    df = df.dropna(subset=PRODUCT_COLUMNS)
+    df = df[df['reviews.text'].notna()]
+    if df.empty:
+        return
+
+    # Row positions of each product, in CSV order within the product
+    codes = df.groupby(PRODUCT_COLUMNS, sort=True, observed=True).ngroup().to_numpy()
+    order = np.argsort(codes, kind='stable')
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(codes))])
+
+    products = {column: df[column].astype(object).tolist() for column in PRODUCT_COLUMNS}
+    reviews = {key: df[column].astype(object).tolist() for column, key in REVIEW_COLUMNS.items()}
+    reviews['rating'] = df['reviews.rating'].astype(float).tolist()
+
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        rows = order[start:end]
+        first = rows[0]
+
+        document = {
+            'id': products['id'][first],
+            'name': products['name'][first],
+            'brand': products['brand'][first],
+            'categories': products['categories'][first].split(','),
+            'manufacturer': products['manufacturer'][first],
+            'reviews': [{key: values[row] for key, values in reviews.items()} for row in rows]
+        }
+        document['primary_category'] = document['categories'][0]
+        document['content_hash'] = compute_content_hash(document)
+        document['suggest'] = build_suggest_field(document)
+        document.update(build_review_summary(document['reviews']))
+
+        yield document
+
+# Part of every content hash. Bump it when the fields derived from a product change
+# (such as the review summary), so the next incremental update rewrites every product.
+CONTENT_HASH_VERSION = 2
+
+def compute_content_hash(document):
+    """
+    Hash the product fields and reviews so unchanged products can be skipped on reindex
+    """
+    content = {field: document[field] for field in ('name', 'brand', 'categories', 'manufacturer', 'reviews')}
+    content['version'] = CONTENT_HASH_VERSION
+    payload = json.dumps(content, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+def build_review_summary(reviews):
+    """
+    Review count, average rating, rating histogram and a short preview of the first
+    reviews, stored with the product so search results do not need to ship every
+    review and rating filters, facets and sorts run on one value per product
+    """
+    ratings = [review['rating'] for review in reviews if not is_missing(review['rating'])]
+    histogram = {str(star): 0 for star in range(1, 6)}
+    for rating in ratings:
+        histogram[str(min(max(int(round(rating)), 1), 5))] += 1
+    preview = []
+    for review in reviews[:REVIEW_PREVIEW_SIZE]:
+        review = {key: None if is_missing(value) else value for key, value in review.items()}
+        if review['text'] and len(review['text']) > REVIEW_PREVIEW_CHARS:
+            review['text'] = review['text'][:REVIEW_PREVIEW_CHARS].rsplit(' ', 1)[0] + '...'
+        preview.append(review)
+
+    return {
+        'review_count': len(reviews),
+        'avg_rating': round(sum(ratings) / len(ratings), 2) if ratings else None,
+        'rating_histogram': histogram,
+        'review_preview': preview
     }
-    
-    with open(output_path, 'w') as f:
-        json.dump(metadata, f, indent=2)
-    
-    return metadata
\ No newline at end of file
+
+def iter_csv_chunks(csv_path, chunk_size=None, metadata=None):
+    """
+    Read the CSV in chunks of rows and yield the product documents of each chunk.
+
+    Rows of the last product in a chunk are carried over to the next chunk so a
+    product is never split. This assumes the CSV rows are grouped by product id,
+    as they are in data.csv. Each chunk is also added to the metadata collector.
+    """
+    chunk_size = chunk_size or INDEX_CHUNK_SIZE
+    carry = None
+
+    for chunk in load_csv_data(csv_path, chunksize=chunk_size):
+        if metadata is not None:
+            metadata.update(chunk)
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+
+        # Hold back the (possibly incomplete) last product
+        is_last_product = chunk['id'] == chunk['id'].iloc[-1]
+        carry = chunk[is_last_product]
+        chunk = chunk[~is_last_product]
+
+        if not chunk.empty:
+            yield list(iter_product_documents(chunk))
+
+    if carry is not None and not carry.empty:
+        yield list(iter_product_documents(carry))
@@ -0,0 +1,141 @@
+"""
+Columnar staging file of prepared (embedded) product documents.
+
+Documents are written as an Arrow IPC file with the vectors in a fixed-size
+float32 list column, so a later run or another node can load Elasticsearch or
+the local vector index without parsing the CSV or running the model. The file
+is read through a memory map and the vectors of each record batch are a
+zero-copy numpy view. Requires `pip install pyarrow`.
+"""
+import math
+import os
+
+import numpy as np
+
+from app.config import EMBEDDING_DIMENSION, EMBEDDING_MODEL_NAME
+from app.services.autocomplete import build_suggest_field
+from app.utils.data_loader import build_review_summary
+
+# Documents per record batch
+STAGING_BATCH_SIZE = 1024
+
+REVIEW_FIELDS = ["date", "rating", "text", "title", "username"]
+
+def get_staging_schema(pa):
+    """Arrow schema of the staging file"""
+    review_type = pa.struct([
+        ("date", pa.string()),
+        ("rating", pa.float64()),
+        ("text", pa.string()),
+        ("title", pa.string()),
+        ("username", pa.string())
+    ])
+    return pa.schema([
+        ("id", pa.string()),
+        ("name", pa.string()),
+        ("brand", pa.string()),
+        ("categories", pa.list_(pa.string())),
+        ("manufacturer", pa.string()),
+        ("reviews", pa.list_(review_type)),
+        ("text_vector", pa.list_(pa.float32(), EMBEDDING_DIMENSION)),
+        ("content_hash", pa.string())
+    ], metadata={"embedding_model": EMBEDDING_MODEL_NAME, "embedding_dimension": str(EMBEDDING_DIMENSION)})
+
+def clean_value(value):
+    """Missing CSV values are NaN floats; store them as nulls"""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+class StagingWriter:
+    """
+    Write embedded product documents to a staging file.
+
+    The file is written to a temporary path and only moved into place by close(),
+    so an interrupted build never leaves a truncated file behind.
+    """
+
+    def __init__(self, path, batch_size=STAGING_BATCH_SIZE):
+        import pyarrow as pa
+
+        self.pa = pa
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.batch_size = batch_size
+        self.schema = get_staging_schema(pa)
+        self.count = 0
+        self._batch = []
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._writer = pa.ipc.new_file(self.tmp_path, self.schema)
+
+    def add(self, document):
+        self._batch.append(document)
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._batch:
+            return
+
+        pa = self.pa
+        documents, self._batch = self._batch, []
+        vectors = np.asarray([document["text_vector"] for document in documents], dtype=np.float32)
+        columns = [
+            pa.array([str(document["id"]) for document in documents], pa.string()),
+            pa.array([clean_value(document["name"]) for document in documents], pa.string()),
+            pa.array([clean_value(document["brand"]) for document in documents], pa.string()),
+            pa.array([document["categories"] for document in documents], pa.list_(pa.string())),
+            pa.array([clean_value(document["manufacturer"]) for document in documents], pa.string()),
+            pa.array([
+                [{field: clean_value(review[field]) for field in REVIEW_FIELDS} for review in document["reviews"]]
+                for document in documents
+            ], self.schema.field("reviews").type),
+            pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel(), pa.float32()), EMBEDDING_DIMENSION),
+            pa.array([document["content_hash"] for document in documents], pa.string())
+        ]
+        self._writer.write_batch(pa.record_batch(columns, schema=self.schema))
+        self.count += len(documents)
+
+    def close(self):
+        """Write the last batch and move the file into place"""
+        self._flush()
+        self._writer.close()
+        os.replace(self.tmp_path, self.path)
+        print(f"Wrote {self.count} staged documents to '{self.path}'")
+
+    def abort(self):
+        """Discard the partially written file"""
+        self._writer.close()
+        os.remove(self.tmp_path)
+
+def iter_staged_documents(path):
+    """
+    Yield the documents of a staging file one record batch at a time.
+
+    The text_vector of each document is a row of a zero-copy float32 view of the
+    memory-mapped file. Raises ValueError if the file was embedded with another model.
+    """
+    import pyarrow as pa
+
+    # Arrow buffers (and numpy views of them) keep the mapping alive
+    reader = pa.ipc.open_file(pa.memory_map(path, "r"))
+    metadata = reader.schema.metadata or {}
+    model = metadata.get(b"embedding_model", b"").decode("utf-8")
+    if model != EMBEDDING_MODEL_NAME:
+        raise ValueError(f"Staging file '{path}' was embedded with '{model}', not '{EMBEDDING_MODEL_NAME}'")
+
+    for i in range(reader.num_record_batches):
+        batch = reader.get_batch(i)
+        vectors = batch.column("text_vector").flatten().to_numpy(zero_copy_only=True)
+        vectors = vectors.reshape(-1, EMBEDDING_DIMENSION)
+        fields = {name: batch.column(name).to_pylist() for name in batch.schema.names if name != "text_vector"}
+
+        documents = []
+        for row in range(batch.num_rows):
+            document = {name: values[row] for name, values in fields.items()}
+            document["text_vector"] = vectors[row]
+            document["primary_category"] = document["categories"][0] if document["categories"] else None
+            document["suggest"] = build_suggest_field(document)
+            document.update(build_review_summary(document["reviews"]))
+            documents.append(document)
+        yield documents
@@ -0,0 +1,136 @@
+"""
+Compare the embedding backends: cold start, per-query latency, batch throughput,
+peak RSS and agreement with the torch backend.
+
+Each backend runs in its own process, so cold start (import + model load +
+first encode) and RSS are measured separately. The remote backend is measured
+against a model server started by the benchmark; the RSS of the server is
+reported next to the (small) RSS of the client.
+
+    python -m benchmarks.bench_backends --backends torch,torch_int8,onnx,onnx_int8,remote
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import random_sentence
+
+def make_texts(count, min_words, max_words, seed):
+    rng = random.Random(seed)
+    return [random_sentence(rng, min_words, max_words) for _ in range(count)]
+
+def run_backend(args):
+    """Measure the backend named by EMBEDDING_BACKEND in this process and print JSON"""
+    start = time.perf_counter()
+    from app.services.embedding import get_model
+
+    model = get_model()
+    model.encode(["warm up query"])
+    cold_start = time.perf_counter() - start
+
+    latencies = []
+    for query in make_texts(args.queries, 2, 6, seed=1):
+        query_start = time.perf_counter()
+        model.encode([query])
+        latencies.append(time.perf_counter() - query_start)
+
+    documents = make_texts(args.documents, 40, 120, seed=2)
+    batch_start = time.perf_counter()
+    vectors = model.encode(documents, batch_size=args.batch_size)
+    batch_seconds = time.perf_counter() - batch_start
+
+    np.save(args.vectors_path, np.asarray(vectors[:args.compare], dtype=np.float32))
+    # ru_maxrss is in kilobytes on Linux
+    print(json.dumps({
+        "cold_start_s": cold_start,
+        "query_p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "query_p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "docs_per_s": len(documents) / batch_seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }))
+
+def get_peak_rss_mb(pid):
+    """Peak RSS of another process, from /proc (Linux)"""
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return None
+
+def start_server(backend, address, timeout=300):
+    server = subprocess.Popen([sys.executable, "-m", "app.cli", "embedding-server",
+                               "--backend", backend, "--address", address])
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(address):
+        if server.poll() is not None or time.monotonic() > deadline:
+            server.kill()
+            raise RuntimeError("Embedding server did not start")
+        time.sleep(0.1)
+    return server
+
+def measure(backend, args, tmp, server_backend):
+    env = dict(os.environ, EMBEDDING_BACKEND=backend, EMBEDDING_CACHE_PATH="")
+    vectors_path = os.path.join(tmp, f"{backend}.npy")
+    server = None
+    if backend == "remote":
+        address = os.path.join(tmp, "embedding.sock")
+        env["EMBEDDING_SERVER_ADDRESS"] = address
+        server = start_server(server_backend, address)
+
+    try:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_backends", "--run", "--vectors-path", vectors_path,
+             "--queries", str(args.queries), "--documents", str(args.documents),
+             "--batch-size", str(args.batch_size), "--compare", str(args.compare)],
+            env=env, check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        if server is not None:
+            result["server_rss_mb"] = get_peak_rss_mb(server.pid)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    result["vectors"] = np.load(vectors_path)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backends", default="torch,torch_int8,onnx,onnx_int8,remote")
+    parser.add_argument("--server-backend", default="torch", help="Backend the model server runs for `remote`")
+    parser.add_argument("--queries", type=int, default=200, help="Single-query encodes timed")
+    parser.add_argument("--documents", type=int, default=1000, help="Review-length texts encoded in batches")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--compare", type=int, default=200, help="Vectors compared with the torch backend")
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--vectors-path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_backend(args)
+        return
+
+    backends = args.backends.split(",")
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {backend: measure(backend, args, tmp, args.server_backend) for backend in backends}
+
+    reference = results.get("torch", {}).get("vectors")
+    for backend, result in results.items():
+        # Vectors are normalized, so the row-wise dot product is the cosine similarity
+        cosine = f"{np.min(np.sum(reference * result['vectors'], axis=1)):.4f}" if reference is not None else "n/a"
+        server = f"  server RSS {result['server_rss_mb']:7.1f} MB" if "server_rss_mb" in result else ""
+        print(f"{backend:<11} cold start {result['cold_start_s']:6.2f}s | query p50 {result['query_p50_ms']:6.2f}ms "
+              f"p99 {result['query_p99_ms']:6.2f}ms | {result['docs_per_s']:8.1f} docs/sec | "
+              f"RSS {result['peak_rss_mb']:7.1f} MB{server} | min cosine vs torch {cosine}")
+
+if __name__ == "__main__":
+    main()
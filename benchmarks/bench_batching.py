@@ -0,0 +1,90 @@
+"""
+Benchmark query embedding under concurrency: one model call per query on the
+embedding thread pool against the micro-batcher.
+
+Each client embeds a stream of distinct queries (no cache hits), so every
+request reaches the model. Reports queries per second and p50/p99 latency for
+each concurrency level, and the micro-batch sizes that were formed.
+
+    python -m benchmarks.bench_batching --concurrency 1,8,32,128 --max-wait-ms 2
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import numpy as np
+
+from app.services import embedding
+from app.services.embedding import _embed_queries, _embed_query, _embedding_executor, get_model
+from app.services.embedding_batcher import EmbeddingBatcher
+from benchmarks.synthetic import random_sentence
+
+def make_queries(count, seed):
+    rng = random.Random(seed)
+    return [f"{random_sentence(rng, 2, 6)} {i}" for i in range(count)]
+
+async def run_clients(embed, queries, concurrency):
+    """Embed the queries with `concurrency` clients; returns elapsed seconds and latencies"""
+    latencies = []
+    iterator = iter(queries)
+
+    async def client():
+        for query in iterator:
+            start = time.perf_counter()
+            await embed(query)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies
+
+async def run_level(concurrency, args, seed):
+    loop = asyncio.get_running_loop()
+
+    async def unbatched(query):
+        return await loop.run_in_executor(_embedding_executor, _embed_query, query)
+
+    batch_sizes = []
+
+    def embed_batch(queries):
+        batch_sizes.append(len(queries))
+        return _embed_queries(queries)
+
+    batcher = EmbeddingBatcher(embed_batch, _embedding_executor, args.max_batch, args.max_wait_ms / 1000)
+    modes = {"unbatched": unbatched, "micro-batched": batcher.embed}
+
+    for offset, (mode, embed) in enumerate(modes.items()):
+        queries = make_queries(args.queries, seed + offset)
+        embedding.query_embedding_cache.clear()
+        elapsed, latencies = await run_clients(embed, queries, concurrency)
+
+        batches = f" | mean batch {np.mean(batch_sizes):5.1f}" if mode == "micro-batched" else ""
+        latencies_ms = np.asarray(latencies) * 1000
+        print(f"  {mode:<14} {len(queries) / elapsed:8.1f} q/s | p50 {np.percentile(latencies_ms, 50):7.2f}ms "
+              f"p99 {np.percentile(latencies_ms, 99):7.2f}ms{batches}")
+
+def parse_ints(value):
+    return [int(item) for item in value.split(",")]
+
+async def main_async(args):
+    # Load the model up front so neither mode pays for it
+    get_model().encode(["warm up"])
+    for level, concurrency in enumerate(args.concurrency):
+        print(f"concurrency {concurrency}")
+        await run_level(concurrency, args, seed=level * 10)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=parse_ints, default=[1, 8, 32, 128])
+    parser.add_argument("--queries", type=int, default=1000, help="Queries embedded per mode and level")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--max-batch", type=int, default=32)
+    args = parser.parse_args()
+
+    # Every query should reach the model
+    embedding.embedding_cache = None
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
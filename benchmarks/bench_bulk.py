@@ -0,0 +1,88 @@
+"""
+Benchmark bulk ingestion against the local stub Elasticsearch: the old
+helpers.bulk path (one thread, 500 documents per request, vectors as float
+lists) against the BulkIngestor at several thread counts.
+
+Documents are synthetic products with embedding-sized float32 vectors, and the
+stub adds a fixed delay per request, so the numbers show how well each mode
+overlaps serialization with request latency. --reject-rate makes the stub
+answer that share of the items with 429 to exercise retries and backoff.
+Reports docs/s and MB/s of bulk payload for each mode.
+
+    python -m benchmarks.bench_bulk --documents 20000 --threads 1,2,4,8 --es-latency-ms 20
+    python -m benchmarks.bench_bulk --reject-rate 0.05
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.stub_es import start_stub_es
+from benchmarks.synthetic import random_sentence
+
+def make_documents(count, reviews_per_product, dims, seed=42):
+    rng = random.Random(seed)
+    vectors = np.random.default_rng(seed).random((count, dims), dtype=np.float32)
+    documents = []
+    for i in range(count):
+        reviews = [{"date": "2017-01-01T00:00:00.000Z", "rating": float(rng.randint(1, 5)),
+                    "text": random_sentence(rng, 10, 40), "title": random_sentence(rng, 1, 4), "username": f"user{i}"}
+                   for _ in range(rng.randint(0, 2 * reviews_per_product))]
+        documents.append({"id": f"product-{i}", "name": random_sentence(rng, 2, 6), "brand": "Amazon",
+                          "categories": ["Electronics"], "reviews": reviews, "text_vector": vectors[i]})
+    return documents
+
+def run_legacy(documents, index_name):
+    from elasticsearch.helpers import bulk
+    from app.elasticsearch.client import es_client
+
+    actions = [{"_index": index_name, "_id": document["id"],
+                "_source": {**document, "text_vector": document["text_vector"].tolist()}} for document in documents]
+    start = time.perf_counter()
+    indexed, _ = bulk(es_client, actions, chunk_size=500, raise_on_error=False)
+    return indexed, time.perf_counter() - start
+
+def run_ingestor(documents, index_name, thread_count, dead_letter_path):
+    from app.elasticsearch.bulk import BulkIngestor
+
+    ingestor = BulkIngestor(thread_count=thread_count, dead_letter_path=dead_letter_path).start()
+    ingestor.add_all({"_index": index_name, "_id": document["id"], "_source": document} for document in documents)
+    report = ingestor.close()
+    return report
+
+def parse_ints(value):
+    return [int(item) for item in value.split(",")]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--reviews-per-product", type=int, default=5)
+    parser.add_argument("--dims", type=int, default=384, help="Vector dimensions")
+    parser.add_argument("--threads", type=parse_ints, default=[1, 2, 4, 8])
+    parser.add_argument("--es-latency-ms", type=float, default=20.0, help="Stub Elasticsearch response delay")
+    parser.add_argument("--reject-rate", type=float, default=0.0, help="Share of bulk items the stub rejects with 429")
+    args = parser.parse_args()
+
+    server, port = start_stub_es(latency_ms=args.es_latency_ms, reject_rate=args.reject_rate)
+    os.environ["ELASTICSEARCH_HOST"] = "127.0.0.1"
+    os.environ["ELASTICSEARCH_PORT"] = str(port)
+    os.environ.setdefault("BULK_INITIAL_BACKOFF", "0.05")
+
+    documents = make_documents(args.documents, args.reviews_per_product, args.dims)
+    index_name = "bench_bulk"
+
+    indexed, seconds = run_legacy(documents, index_name)
+    print(f"{'helpers.bulk':<14} {indexed:>8} docs  {indexed / seconds:10.1f} docs/s  (rejected items are not retried)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for thread_count in args.threads:
+            report = run_ingestor(documents, index_name, thread_count, os.path.join(tmp, "dead_letters.jsonl"))
+            print(f"{f'ingestor x{thread_count}':<14} {report['indexed']:>8} docs  {report['docs_per_sec']:10.1f} docs/s  "
+                  f"{report['mb_per_sec']:7.2f} MB/s  retries {report['retries']}  failed {report['failed']}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark the indexing embedding pipeline: per-doc, batched and multi-process.
+
+    python -m benchmarks.bench_embedding --products 2000 --workers 4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from app.elasticsearch.index import iter_product_documents, get_embedding_text, prepare_documents_from_csv
+from app.services import embedding
+from app.services.embedding import get_text_embedding, stop_process_pool
+from benchmarks.synthetic import write_synthetic_csv
+
+def run_per_doc(csv_path):
+    """Old behaviour: one model call per product"""
+    df = pd.read_csv(csv_path)
+    count = 0
+    for document in iter_product_documents(df):
+        document['text_vector'] = get_text_embedding(get_embedding_text(document))
+        count += 1
+    return count
+
+def run_batched(csv_path, batch_size, workers=1):
+    """Batched model calls, optionally across a process pool"""
+    return len(prepare_documents_from_csv(csv_path, batch_size=batch_size, workers=workers))
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    count = func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<16} {count:>7} docs  {elapsed:8.2f}s  {count / elapsed:10.1f} docs/sec")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--reviews-per-product", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--use-cache", action="store_true", help="Keep the persistent embedding cache enabled")
+    args = parser.parse_args()
+
+    if not args.use_cache:
+        # Later modes would otherwise be served from vectors cached by earlier ones
+        embedding.embedding_cache = None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = write_synthetic_csv(os.path.join(tmp, "data.csv"), args.products, args.reviews_per_product)
+
+        timed("per-doc", run_per_doc, csv_path)
+        timed("batched", run_batched, csv_path, args.batch_size)
+        if args.workers > 1:
+            try:
+                timed(f"multi-process x{args.workers}", run_batched, csv_path, args.batch_size, args.workers)
+            finally:
+                stop_process_pool()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Compare the script_score hybrid search with the RRF hybrid mode on a live Elasticsearch.
+
+For each corpus size a synthetic catalog is indexed into a temporary index and
+both modes are run for the same queries. Reports p50/p99 latency, the recall of
+the kNN leg against exact cosine ground truth computed with NumPy, the share of
+the exact semantic top-k that each mode surfaces, and the overlap between modes.
+
+    python -m benchmarks.bench_hybrid --sizes 1000,5000,20000 --queries 50
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+from elasticsearch.helpers import bulk
+
+from app.config import HYBRID_RRF_BM25_WEIGHT, HYBRID_RRF_KNN_WEIGHT, HYBRID_RRF_RANK_CONSTANT
+from app.elasticsearch.client import es_client
+from app.elasticsearch.index import create_index, prepare_documents_from_csv
+from app.elasticsearch.search import build_hybrid_body, build_rrf_bodies, reciprocal_rank_fusion
+from app.services.embedding import get_query_embedding
+from benchmarks.synthetic import WORDS, write_synthetic_csv
+
+def percentile(values, pct):
+    return float(np.percentile(np.asarray(values) * 1000, pct))
+
+def exact_top_k(matrix, ids, query_vector, k):
+    """Exact cosine top-k over all documents"""
+    query = np.asarray(query_vector, dtype=np.float32)
+    query /= np.linalg.norm(query) or 1.0
+    scores = matrix @ query
+    top = np.argpartition(-scores, min(k, len(scores) - 1))[:k]
+    return {ids[i] for i in top}
+
+def load_corpus(index_name, num_products, reviews_per_product):
+    """Index a synthetic catalog and return its normalized vectors and ids"""
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = write_synthetic_csv(os.path.join(tmp, "data.csv"), num_products, reviews_per_product)
+        actions = prepare_documents_from_csv(csv_path, index_name=index_name)
+
+    es_client.indices.delete(index=index_name, ignore_unavailable=True)
+    create_index(index_name)
+    bulk(es_client, actions)
+    es_client.indices.refresh(index=index_name)
+
+    ids = [action["_id"] for action in actions]
+    matrix = np.asarray([action["_source"]["text_vector"] for action in actions], dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    return ids, matrix
+
+def run_size(num_products, args):
+    index_name = f"bench_hybrid_{num_products}"
+    ids, matrix = load_corpus(index_name, num_products, args.reviews_per_product)
+    rng = random.Random(7)
+    k = args.k
+
+    script_latency, rrf_latency = [], []
+    knn_recall, script_semantic, rrf_semantic, overlap = [], [], [], []
+
+    for _ in range(args.queries):
+        query = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+        query_vector = get_query_embedding(query)
+        exact = exact_top_k(matrix, ids, query_vector, k)
+
+        start = time.perf_counter()
+        response = es_client.search(index=index_name, body=build_hybrid_body(query, query_vector, None, k))
+        script_latency.append(time.perf_counter() - start)
+        script_ids = {hit["_id"] for hit in response["hits"]["hits"]}
+
+        start = time.perf_counter()
+        bm25_body, knn_body = build_rrf_bodies(query, query_vector, None, k)
+        response = es_client.msearch(searches=[{"index": index_name}, bm25_body, {"index": index_name}, knn_body])
+        bm25_hits, knn_hits = (item["hits"]["hits"] for item in response["responses"])
+        fused = reciprocal_rank_fusion([bm25_hits, knn_hits], [HYBRID_RRF_BM25_WEIGHT, HYBRID_RRF_KNN_WEIGHT],
+                                       HYBRID_RRF_RANK_CONSTANT, k)
+        rrf_latency.append(time.perf_counter() - start)
+        rrf_ids = {hit["_id"] for hit in fused}
+
+        knn_recall.append(len({hit["_id"] for hit in knn_hits[:k]} & exact) / k)
+        script_semantic.append(len(script_ids & exact) / k)
+        rrf_semantic.append(len(rrf_ids & exact) / k)
+        overlap.append(len(script_ids & rrf_ids) / k)
+
+    print(f"{num_products:>8} docs | script_score p50 {percentile(script_latency, 50):7.1f}ms "
+          f"p99 {percentile(script_latency, 99):7.1f}ms semantic@{k} {np.mean(script_semantic):.2f} | "
+          f"rrf p50 {percentile(rrf_latency, 50):7.1f}ms p99 {percentile(rrf_latency, 99):7.1f}ms "
+          f"semantic@{k} {np.mean(rrf_semantic):.2f} | knn recall@{k} {np.mean(knn_recall):.2f} | "
+          f"overlap {np.mean(overlap):.2f}")
+
+    if not args.keep:
+        es_client.indices.delete(index=index_name, ignore_unavailable=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="1000,5000,20000", help="Comma-separated product counts")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--reviews-per-product", type=int, default=3)
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark indices")
+    args = parser.parse_args()
+
+    for size in (int(value) for value in args.sizes.split(",")):
+        run_size(size, args)
+
+if __name__ == "__main__":
+    main()
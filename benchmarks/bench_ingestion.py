@@ -0,0 +1,122 @@
+"""
+Benchmark CSV ingestion: the old double read + iterrows grouping against the
+single-pass vectorized loader. Each mode runs in its own process so peak RSS
+is measured separately.
+
+    python -m benchmarks.bench_ingestion --csv data/data.csv --replicate 10
+    python -m benchmarks.bench_ingestion --products 20000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from app.utils.data_loader import (
+    MetadataCollector,
+    load_csv_data,
+    iter_product_documents,
+    compute_content_hash,
+    get_unique_brands,
+    get_unique_manufacturers
+)
+from benchmarks.synthetic import write_synthetic_csv
+
+def legacy_ingest(csv_path):
+    """Old behaviour: read the CSV for the metadata and again for the documents, then iterrows"""
+    df = pd.read_csv(csv_path)
+    categories = set()
+    for cat_list in df['categories'].dropna():
+        for cat in cat_list.split(','):
+            categories.add(cat.strip())
+    metadata = {"categories": sorted(categories), "brands": get_unique_brands(df),
+                "manufacturers": get_unique_manufacturers(df)}
+    del df
+
+    df = pd.read_csv(csv_path)
+    count = 0
+    for (id, name, brand, categories, manufacturer), group in df.groupby(['id', 'name', 'brand', 'categories', 'manufacturer']):
+        reviews = []
+        for _, row in group.iterrows():
+            if pd.notna(row['reviews.text']):
+                reviews.append({
+                    'date': row.get('reviews.date', ''),
+                    'rating': float(row.get('reviews.rating', 0)),
+                    'text': row.get('reviews.text', ''),
+                    'title': row.get('reviews.title', ''),
+                    'username': row.get('reviews.username', '')
+                })
+        if not reviews:
+            continue
+        document = {'id': id, 'name': name, 'brand': brand, 'categories': categories.split(','),
+                    'manufacturer': manufacturer, 'reviews': reviews}
+        document['content_hash'] = compute_content_hash(document)
+        count += 1
+    return count, metadata
+
+def single_pass_ingest(csv_path):
+    """Load once with explicit dtypes, collect the metadata and group with vectorized operations"""
+    df = load_csv_data(csv_path)
+    metadata = MetadataCollector()
+    metadata.update(df)
+    count = sum(1 for _ in iter_product_documents(df))
+    return count, metadata.to_dict()
+
+MODES = {"legacy": legacy_ingest, "single-pass": single_pass_ingest}
+
+def run_mode(mode, csv_path):
+    """Run one mode in this process and print its timing and peak RSS as JSON"""
+    start = time.perf_counter()
+    count, metadata = MODES[mode](csv_path)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"mode": mode, "documents": count, "seconds": elapsed, "peak_rss_mb": peak_rss_mb,
+                      "categories": len(metadata["categories"])}))
+
+def replicate_csv(csv_path, output_path, copies):
+    """Write copies of the CSV with the product ids made unique per copy"""
+    with open(output_path, "w", newline="") as f:
+        for copy in range(copies):
+            for chunk_number, chunk in enumerate(pd.read_csv(csv_path, chunksize=100000, dtype=str)):
+                chunk['id'] = chunk['id'] + f"-{copy}"
+                chunk.to_csv(f, header=(copy == 0 and chunk_number == 0), index=False)
+    return output_path
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", help="CSV to replicate; a synthetic CSV is generated if omitted")
+    parser.add_argument("--replicate", type=int, default=10, help="Copies of --csv to ingest")
+    parser.add_argument("--products", type=int, default=20000, help="Synthetic products if --csv is omitted")
+    parser.add_argument("--reviews-per-product", type=int, default=5)
+    parser.add_argument("--run", choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_mode(args.run, args.csv)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "data.csv")
+        if args.csv:
+            replicate_csv(args.csv, csv_path, args.replicate)
+        else:
+            write_synthetic_csv(csv_path, args.products, args.reviews_per_product)
+        print(f"Ingesting {os.path.getsize(csv_path) / 1e6:.1f} MB")
+
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_ingestion", "--run", mode, "--csv", csv_path],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:<12} {result['documents']:>8} docs  {result['seconds']:8.2f}s  "
+                  f"peak RSS {result['peak_rss_mb']:8.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Sweep text_vector storage and kNN settings on a live Elasticsearch.
+
+For each index type (hnsw, int8_hnsw) and HNSW m / ef_construction, synthetic
+clustered vectors are indexed into a temporary index, then kNN queries are run
+with each num_candidates value. Reports recall@k against exact cosine ground
+truth computed with NumPy, p50/p99 latency and the index size on disk.
+
+    python -m benchmarks.bench_knn --docs 50000 --index-types hnsw,int8_hnsw --m 16,32
+"""
+import argparse
+import itertools
+import time
+
+import numpy as np
+from elasticsearch.helpers import bulk
+
+from app.config import EMBEDDING_DIMENSION
+from app.elasticsearch.client import es_client
+from app.elasticsearch.index import create_index, get_vector_index_options
+from app.elasticsearch.search import build_semantic_body
+
+def percentile(values, pct):
+    return float(np.percentile(np.asarray(values) * 1000, pct))
+
+def make_vectors(num_docs, num_clusters, seed=0):
+    """Unit vectors drawn around random centroids, so neighborhoods are not uniform"""
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((num_clusters, EMBEDDING_DIMENSION)).astype(np.float32)
+    assignments = rng.integers(0, num_clusters, num_docs)
+    vectors = centroids[assignments] + 0.5 * rng.standard_normal((num_docs, EMBEDDING_DIMENSION)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+def exact_top_k(matrix, query, k):
+    """Exact cosine top-k document positions"""
+    scores = matrix @ query
+    top = np.argpartition(-scores, k)[:k]
+    return set(top.tolist())
+
+def load_index(index_name, vectors, options):
+    es_client.indices.delete(index=index_name, ignore_unavailable=True)
+    create_index(index_name, bulk_load=True, vector_index_options=options)
+    actions = ({"_index": index_name, "_id": str(i), "_source": {"id": str(i), "text_vector": vector.tolist()}}
+               for i, vector in enumerate(vectors))
+    start = time.perf_counter()
+    bulk(es_client, actions, chunk_size=500, request_timeout=120)
+    es_client.indices.refresh(index=index_name)
+    # One segment per shard, so results do not depend on when merges happened
+    es_client.indices.forcemerge(index=index_name, max_num_segments=1, request_timeout=600)
+    load_seconds = time.perf_counter() - start
+    size_mb = es_client.indices.stats(index=index_name, metric="store")["_all"]["primaries"]["store"]["size_in_bytes"] / 1e6
+    return load_seconds, size_mb
+
+def run_config(index_type, m, ef_construction, vectors, queries, truth, args):
+    index_name = f"bench_knn_{index_type}_{m}_{ef_construction}"
+    options = get_vector_index_options(index_type, m, ef_construction)
+    load_seconds, size_mb = load_index(index_name, vectors, options)
+    print(f"{index_type} m={m} ef_construction={ef_construction}: loaded in {load_seconds:.1f}s, {size_mb:.1f} MB")
+
+    for num_candidates in args.num_candidates:
+        latencies, recalls = [], []
+        for query, exact in zip(queries, truth):
+            body = build_semantic_body(query.tolist(), None, args.k, num_candidates=num_candidates)
+            body["_source"] = False
+            start = time.perf_counter()
+            response = es_client.search(index=index_name, body=body)
+            latencies.append(time.perf_counter() - start)
+            found = {int(hit["_id"]) for hit in response["hits"]["hits"]}
+            recalls.append(len(found & exact) / args.k)
+
+        print(f"    num_candidates {num_candidates:>5} | recall@{args.k} {np.mean(recalls):.3f} | "
+              f"p50 {percentile(latencies, 50):6.1f}ms p99 {percentile(latencies, 99):6.1f}ms")
+
+    if not args.keep:
+        es_client.indices.delete(index=index_name, ignore_unavailable=True)
+
+def parse_ints(value):
+    return [int(item) for item in value.split(",")]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=50000)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--index-types", default="hnsw,int8_hnsw", help="int8_hnsw needs Elasticsearch 8.12+")
+    parser.add_argument("--m", type=parse_ints, default=[16])
+    parser.add_argument("--ef-construction", type=parse_ints, default=[100])
+    parser.add_argument("--num-candidates", type=parse_ints, default=[10, 25, 50, 100, 200, 500])
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark indices")
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.docs, args.clusters)
+    # Queries are perturbed corpus vectors, like real queries close to some products
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, args.docs, args.queries)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = [exact_top_k(vectors, query, args.k) for query in queries]
+
+    for index_type, m, ef_construction in itertools.product(args.index_types.split(","), args.m, args.ef_construction):
+        run_config(index_type, m, ef_construction, vectors, queries, truth, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark search response payloads: the old full-review results serialized with
+the standard JSON encoder against the compact results (review preview, count,
+average rating and highlights) serialized with orjson.
+
+Hits are built from synthetic products in the shape each search type gets them
+from Elasticsearch, so no cluster is needed. Reports payload bytes and
+formatting + serialization time per search type.
+
+    python -m benchmarks.bench_payload --products 200 --reviews-per-product 100 --size 12
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import orjson
+from elasticsearch_dsl.response.hit import Hit
+
+from app.services.search import SearchService
+from app.utils.data_loader import load_csv_data, iter_product_documents
+from benchmarks.synthetic import write_synthetic_csv
+
+SEARCH_TYPES = ["basic", "fuzzy", "faceted", "semantic", "hybrid", "hybrid_rrf"]
+
+FACETS = {
+    "brands": [{"key": f"brand {i}", "doc_count": 100 - i} for i in range(20)],
+    "categories": [{"key": f"category {i}", "doc_count": 100 - i} for i in range(20)],
+    "manufacturers": [{"key": "Amazon", "doc_count": 100}],
+    "ratings": [{"key": f"{i}.0-{i + 1}.0", "doc_count": 20} for i in range(6)]
+}
+
+def make_raw_hits(documents, highlight):
+    """Hits as returned by Elasticsearch, with every stored field in _source"""
+    hits = []
+    for document in documents:
+        source = {field: value for field, value in document.items() if field not in ("suggest", "content_hash")}
+        hit = {"_index": "amazon_products_v1", "_id": document["id"], "_score": 1.0, "_source": source}
+        if highlight:
+            hit["highlight"] = {"name": [f"<strong>{document['name']}</strong>"],
+                                "reviews.text": [review["text"][:100] for review in document["reviews"][:5]]}
+        hits.append(hit)
+    return hits
+
+def make_results(search_type, raw_hits, compact):
+    """Results in the shape the search functions return them for a search type"""
+    if not compact:
+        # Before: _source included every review and none of the summary fields
+        raw_hits = [{**hit, "_source": {field: value for field, value in hit["_source"].items()
+                                        if field not in ("review_count", "avg_rating", "rating_histogram", "review_preview")}}
+                    for hit in raw_hits]
+    if search_type in ["semantic", "hybrid", "hybrid_rrf"]:
+        return raw_hits
+    hits = [Hit(hit) for hit in raw_hits]
+    return {"hits": hits, "facets": FACETS} if search_type == "faceted" else hits
+
+def legacy_payload(results, search_type):
+    """The old format_results: every _source field, and no highlights"""
+    if search_type in ["semantic", "hybrid", "hybrid_rrf"]:
+        return {"results": [{"id": hit["_id"], **hit["_source"]} for hit in results]}
+    if search_type == "faceted":
+        return {"results": [hit.to_dict() for hit in results["hits"]], "facets": FACETS}
+    return {"results": [hit.to_dict() for hit in results]}
+
+def legacy_dumps(payload):
+    """What the standard JSONResponse does"""
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        body = func()
+    return len(body), (time.perf_counter() - start) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--reviews-per-product", type=int, default=100)
+    parser.add_argument("--size", type=int, default=12, help="Results per response")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = write_synthetic_csv(os.path.join(tmp, "data.csv"), args.products, args.reviews_per_product)
+        documents = list(iter_product_documents(load_csv_data(csv_path)))
+    documents = sorted(documents, key=lambda document: len(document["reviews"]), reverse=True)[:args.size]
+
+    print(f"{'search type':<12} {'before':>10} {'after':>10} {'before ms':>10} {'after ms':>10}")
+    for search_type in SEARCH_TYPES:
+        raw_hits = make_raw_hits(documents, highlight=search_type in ["basic", "hybrid", "hybrid_rrf"])
+        before_results = make_results(search_type, raw_hits, compact=False)
+        after_results = make_results(search_type, raw_hits, compact=True)
+
+        before_bytes, before_ms = timed(lambda: legacy_dumps(legacy_payload(before_results, search_type)), args.repeat)
+        after_bytes, after_ms = timed(
+            lambda: orjson.dumps(SearchService.format_results(after_results, search_type)), args.repeat
+        )
+        print(f"{search_type:<12} {before_bytes / 1024:9.1f}K {after_bytes / 1024:9.1f}K "
+              f"{before_ms:10.2f} {after_ms:10.2f}")
+
+if __name__ == "__main__":
+    main()
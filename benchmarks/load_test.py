@@ -0,0 +1,107 @@
+"""
+Load test the search path against a local stub Elasticsearch.
+
+Runs concurrent clients through the blocking search path (sync client and
+model calls inside the event loop, as the handlers used to do) and through
+the async path, and reports p50/p99 latency and throughput for each.
+
+    python -m benchmarks.load_test --clients 32 --requests 20 --search-type hybrid
+
+With --multi, one request per mode (sent one after another) is compared with a
+single /api/search/multi style fan-out over the same modes:
+
+    python -m benchmarks.load_test --multi basic,fuzzy,semantic,hybrid,hybrid_rrf
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from benchmarks.stub_es import start_stub_es
+
+QUERIES = [
+    "kindle paperwhite", "echo dot speaker", "fire tablet for kids", "alexa smart plug",
+    "long battery life", "great sound quality", "easy to set up", "good gift for mom",
+]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def run_clients(search, clients, requests_per_client, search_type):
+    """Run concurrent clients and return per-request latencies in seconds"""
+    latencies = []
+
+    async def client(client_id):
+        rng = random.Random(client_id)
+        for _ in range(requests_per_client):
+            query = f"{rng.choice(QUERIES)} {rng.randint(0, 1000)}"
+            start = time.perf_counter()
+            await search(query, search_type)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    return latencies
+
+def report(label, latencies, elapsed):
+    print(f"{label:<8} requests={len(latencies):<6} "
+          f"p50={percentile(latencies, 50) * 1000:8.1f}ms "
+          f"p99={percentile(latencies, 99) * 1000:8.1f}ms "
+          f"throughput={len(latencies) / elapsed:8.1f} req/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=20, help="Requests per client")
+    parser.add_argument("--search-type", default="hybrid",
+                        choices=["basic", "fuzzy", "faceted", "semantic", "hybrid", "hybrid_rrf"])
+    parser.add_argument("--multi", help="Comma-separated search types to compare separate requests with one fan-out")
+    parser.add_argument("--es-latency-ms", type=float, default=20.0, help="Stub Elasticsearch response delay")
+    args = parser.parse_args()
+
+    server, port = start_stub_es(latency_ms=args.es_latency_ms)
+    os.environ["ELASTICSEARCH_HOST"] = "127.0.0.1"
+    os.environ["ELASTICSEARCH_PORT"] = str(port)
+    os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+    os.environ.setdefault("RESULT_CACHE_BACKEND", "none")
+
+    # Import after pointing the config at the stub
+    from app.services.search import SearchService
+    from app.elasticsearch.client import async_es_client
+
+    async def blocking_search(query, search_type):
+        return SearchService.search(query, search_type=search_type, size=10)
+
+    async def async_search(query, search_type):
+        return await SearchService.async_search(query, search_type=search_type, size=10)
+
+    async def separate_search(query, search_types):
+        for search_type in search_types:
+            await SearchService.async_search(query, search_type=search_type, size=10)
+
+    async def multi_search(query, search_types):
+        return await SearchService.async_multi_search(query, search_types, size=10)
+
+    if args.multi:
+        modes = (("separate", separate_search), ("multi", multi_search))
+        search_type = args.multi.split(",")
+    else:
+        modes = (("blocking", blocking_search), ("async", async_search))
+        search_type = args.search_type
+
+    async def run():
+        for label, search in modes:
+            start = time.perf_counter()
+            latencies = await run_clients(search, args.clients, args.requests, search_type)
+            report(label, latencies, time.perf_counter() - start)
+        await async_es_client.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
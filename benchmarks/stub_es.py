@@ -0,0 +1,283 @@
+"""
+Minimal HTTP stand-in for Elasticsearch used by the load tests and benchmarks.
+
+It answers the info request the client sends on first use and returns canned
+search responses after a configurable delay, so client-side behaviour can be
+measured without a cluster. Bulk requests are acknowledged item by item, and
+--reject-rate answers that share of the items with 429 to exercise retries.
+Responses recorded from a real cluster can be replayed instead of the canned ones:
+
+    # Record while running the app or a benchmark against port 9201
+    python -m benchmarks.stub_es --port 9201 --record recordings.json --upstream http://localhost:9200
+    # Replay offline
+    python -m benchmarks.stub_es --port 9201 --recordings recordings.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_REVIEWS = [
+    {"date": "2017-01-01T00:00:00.000Z", "rating": 5.0, "text": "great product, works as expected",
+     "title": "Great", "username": "stub"}
+]
+
+def make_hit(i):
+    """Canned product hit"""
+    return {
+        "_index": "amazon_products",
+        "_id": f"P{i:08d}",
+        "_score": 10.0 - i * 0.1,
+        "_source": {
+            "id": f"P{i:08d}",
+            "name": f"Stub product {i}",
+            "brand": "Amazon",
+            "categories": ["Electronics", "Tablets"],
+            "manufacturer": "Amazon",
+            "review_count": 1,
+            "avg_rating": 5.0,
+            "rating_histogram": {"1": 0, "2": 0, "3": 0, "4": 0, "5": 1},
+            "review_preview": STUB_REVIEWS
+        },
+        "highlight": {"name": [f"<strong>Stub</strong> product {i}"]}
+    }
+
+def make_aggregations(aggs):
+    """Aggregation results shaped like the requested aggregations"""
+    results = {}
+    for name, spec in aggs.items():
+        sub_aggs = spec.get("aggs", spec.get("aggregations", {}))
+        if "filter" in spec:
+            results[name] = {"doc_count": 10, **make_aggregations(sub_aggs)}
+        elif "range" in spec:
+            results[name] = {"buckets": [
+                {"key": f"{r.get('from', '*')}-{r.get('to', '*')}", "doc_count": 1} for r in spec["range"]["ranges"]
+            ]}
+        else:
+            field = spec.get("terms", {}).get("field", name)
+            results[name] = {"buckets": [{"key": f"{field} {i}", "doc_count": 10 - i} for i in range(3)]}
+    return results
+
+def make_search_response(body):
+    """Build a search response shaped like the request body"""
+    size = body.get("size", 10)
+    response = {
+        "took": 1,
+        "timed_out": False,
+        "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+        "hits": {
+            "total": {"value": size, "relation": "eq"},
+            "max_score": 10.0,
+            "hits": [make_hit(i) for i in range(size)]
+        }
+    }
+    if "aggs" in body or "aggregations" in body:
+        response["aggregations"] = make_aggregations(body.get("aggs", body.get("aggregations")))
+    if "suggest" in body:
+        response["suggest"] = {
+            name: [{"text": spec.get("prefix", ""), "offset": 0, "length": 0, "options": []}]
+            for name, spec in body["suggest"].items()
+        }
+    return response
+
+class Recordings:
+    """
+    Responses recorded from a real cluster, keyed by method, path and request body
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.responses = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.responses = json.load(f)
+
+    @staticmethod
+    def make_key(method, path, raw_body):
+        try:
+            # Equivalent JSON bodies get the same key
+            raw_body = json.dumps(json.loads(raw_body), sort_keys=True).encode("utf-8")
+        except ValueError:
+            pass
+        digest = hashlib.sha1(raw_body or b"").hexdigest()
+        return f"{method} {path.split('?')[0]} {digest}"
+
+    def get(self, key):
+        return self.responses.get(key)
+
+    def put(self, key, status, payload):
+        with self._lock:
+            self.responses[key] = {"status": status, "response": payload}
+
+    def save(self):
+        with self._lock:
+            with open(self.path, "w") as f:
+                json.dump(self.responses, f)
+        print(f"Saved {len(self.responses)} recorded responses to '{self.path}'")
+
+class StubElasticsearchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    recordings = None
+    upstream = None
+    reject_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        # Required by the official client's product check
+        self.send_header("X-Elastic-Product", "Elasticsearch")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.raw_body = self.rfile.read(length) if length else b""
+        if not self.raw_body:
+            return {}
+        if self.path.split("?")[0].endswith(("/_msearch", "/_bulk")):
+            # NDJSON header/body pairs
+            return [json.loads(line) for line in self.raw_body.splitlines() if line.strip()]
+        return json.loads(self.raw_body)
+
+    def _forward(self, method):
+        """Send the request to the upstream cluster and return (status, payload)"""
+        request = urllib.request.Request(self.upstream + self.path, data=self.raw_body or None, method=method,
+                                         headers={"Content-Type": self.headers.get("Content-Type", "application/json")})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read() or b"{}")
+
+    def _send_recorded(self, method):
+        """
+        Answer from the recordings (or record the upstream answer). Returns False
+        if the canned response should be used.
+        """
+        if self.recordings is None:
+            return False
+        key = Recordings.make_key(method, self.path, self.raw_body)
+        if self.upstream:
+            status, payload = self._forward(method)
+            self.recordings.put(key, status, payload)
+        else:
+            recorded = self.recordings.get(key)
+            if recorded is None:
+                return False
+            status, payload = recorded["status"], recorded["response"]
+        self._send_json(payload, status)
+        return True
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("X-Elastic-Product", "Elasticsearch")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path.endswith("/_search"):
+            return self.do_POST()
+        self._read_body()
+        if self._send_recorded("GET"):
+            return
+        if "/_doc/" in path:
+            product_id = path.rsplit("/", 1)[1]
+            return self._send_json({"_index": "amazon_products", "_id": product_id, "found": True,
+                                    "_source": {"reviews": STUB_REVIEWS * 20}})
+        self._send_json({"name": "stub", "version": {"number": "8.9.0"}, "tagline": "You Know, for Search"})
+
+    def do_POST(self):
+        body = self._read_body()
+        time.sleep(self.latency)
+        if self._send_recorded("POST"):
+            return
+        path = self.path.split("?")[0]
+        if path.endswith("/_search"):
+            self._send_json(make_search_response(body))
+        elif path.endswith("/_msearch"):
+            self._send_json({"took": 1, "responses": [make_search_response(search) for search in body[1::2]]})
+        elif path.endswith("/_bulk"):
+            self._send_json(self._make_bulk_response(body))
+        else:
+            self._send_json({"acknowledged": True})
+
+    def _make_bulk_response(self, lines):
+        items, errors = [], False
+        position = 0
+        while position < len(lines):
+            (op_type, meta), = lines[position].items()
+            position += 1 if op_type == "delete" else 2
+            if random.random() < self.reject_rate:
+                errors = True
+                items.append({op_type: {"_id": meta.get("_id"), "status": 429, "error": {
+                    "type": "es_rejected_execution_exception", "reason": "rejected execution (stub)"}}})
+            else:
+                items.append({op_type: {"_id": meta.get("_id"), "status": 201, "result": "created"}})
+        return {"took": 1, "errors": errors, "items": items}
+
+def start_stub_es(port=0, latency_ms=20.0, recordings=None, upstream=None, reject_rate=0.0):
+    """
+    Start the stub server in a background thread and return (server, port).
+
+    With recordings (a Recordings), recorded responses are replayed, or recorded
+    from the upstream cluster URL when upstream is given. reject_rate is the
+    share of bulk items answered with 429.
+    """
+    handler = type("Handler", (StubElasticsearchHandler,), {
+        "latency": latency_ms / 1000.0,
+        "recordings": recordings,
+        "upstream": upstream.rstrip("/") if upstream else None,
+        "reject_rate": reject_rate
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9201)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to canned and replayed responses")
+    parser.add_argument("--recordings", help="Replay the responses recorded in this file")
+    parser.add_argument("--record", metavar="PATH", help="Record the upstream responses to this file")
+    parser.add_argument("--upstream", help="Elasticsearch URL to record from")
+    parser.add_argument("--reject-rate", type=float, default=0.0, help="Share of bulk items rejected with 429")
+    args = parser.parse_args()
+
+    if args.record and not args.upstream:
+        parser.error("--record needs --upstream")
+    recordings = None
+    if args.record:
+        recordings = Recordings(args.record)
+    elif args.recordings:
+        recordings = Recordings(args.recordings)
+
+    server, port = start_stub_es(args.port, args.latency_ms, recordings, args.upstream if args.record else None,
+                                 args.reject_rate)
+    print(f"Stub Elasticsearch listening on http://127.0.0.1:{port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        if args.record:
+            recordings.save()
+
+if __name__ == "__main__":
+    main()
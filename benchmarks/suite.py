@@ -0,0 +1,351 @@
+"""
+Offline benchmark suite for the indexing and search hot paths.
+
+Every stage runs in its own process against a synthetic catalog and a local
+stub Elasticsearch (canned or recorded responses), using the deterministic
+`hash` embedding backend unless --backend names a real one, so no network is
+needed. Reports throughput, latency percentiles and peak RSS per stage, saves
+them as JSON and compares them with a baseline run.
+
+    python -m benchmarks.suite --products 20000 --output baseline.json
+    python -m benchmarks.suite --products 20000 --baseline baseline.json --output run.json
+    python -m benchmarks.suite --stages embed_query,search_hybrid --backend torch
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.stub_es import Recordings, start_stub_es
+from benchmarks.synthetic import random_sentence, write_synthetic_catalog
+
+SEARCH_TYPES = ["basic", "fuzzy", "faceted", "semantic", "hybrid", "hybrid_rrf"]
+
+# Filters used by the query builder and search stages
+FILTERS = {"brand": ["Amazon", "Fire"], "avg_rating": {"range": {"gte": 3.0, "lte": 5.0}}}
+
+# Metrics compared with the baseline, and whether higher values are better
+COMPARED_METRICS = {"throughput": True, "p50_ms": False, "p95_ms": False, "p99_ms": False, "peak_rss_mb": False}
+
+def make_queries(count, seed=7):
+    rng = random.Random(seed)
+    return [random_sentence(rng, 1, 4) for _ in range(count)]
+
+def timed_each(func, items):
+    """Call func on each item; returns the per-call latencies in seconds"""
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def stage_csv_load(context):
+    from app.utils.data_loader import MetadataCollector, load_csv_data
+
+    start = time.perf_counter()
+    df = load_csv_data(context["csv"])
+    MetadataCollector().update(df)
+    return {"items": len(df), "seconds": time.perf_counter() - start}
+
+def stage_group_documents(context):
+    from app.utils.data_loader import iter_product_documents, load_csv_data
+
+    df = load_csv_data(context["csv"])
+    context["mark_start"]()
+    start = time.perf_counter()
+    count = sum(1 for _ in iter_product_documents(df))
+    return {"items": count, "seconds": time.perf_counter() - start}
+
+def stage_prepare_documents(context):
+    from app.elasticsearch.index import prepare_documents_from_csv
+    from app.services.embedding import get_model
+
+    get_model()
+    context["mark_start"]()
+    start = time.perf_counter()
+    count = len(prepare_documents_from_csv(context["csv"], workers=1))
+    return {"items": count, "seconds": time.perf_counter() - start}
+
+def stage_embed_query(context):
+    from app.services.embedding import get_model, get_text_embedding
+
+    get_model().encode(["warm up"])
+    context["mark_start"]()
+    latencies = timed_each(get_text_embedding, context["queries"])
+    return {"items": len(latencies), "seconds": sum(latencies), "latencies": latencies}
+
+def stage_embed_batch(context):
+    from app.services.embedding import get_model, get_text_embeddings
+
+    get_model().encode(["warm up"])
+    rng = random.Random(3)
+    texts = [random_sentence(rng, 10, 60) for _ in range(context["args"].batch_texts)]
+    context["mark_start"]()
+    start = time.perf_counter()
+    get_text_embeddings(texts, workers=1)
+    return {"items": len(texts), "seconds": time.perf_counter() - start}
+
+def stage_preprocess_query(context):
+    from app.services.search import SearchService
+
+    queries = context["queries"] * 20
+    latencies = timed_each(SearchService.preprocess_query, queries)
+    return {"items": len(latencies), "seconds": sum(latencies), "latencies": latencies}
+
+def add_typo(rng, word):
+    """Drop, swap or replace one character of a word of four or more letters"""
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    edit = rng.choice(["drop", "swap", "replace"])
+    if edit == "drop":
+        return word[:i] + word[i + 1:]
+    if edit == "swap":
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + word[i + 1:]
+
+def stage_spell_correct(context):
+    from app.config import SPELLING_PATH
+    from app.services.spelling import SpellingBuilder, get_spelling
+    from app.utils.data_loader import iter_product_documents, load_csv_data
+
+    # Also leaves the dictionary for the search stages that run after this one
+    builder = SpellingBuilder()
+    for document in iter_product_documents(load_csv_data(context["csv"])):
+        builder.add(document)
+    builder.save(SPELLING_PATH)
+    spelling = get_spelling()
+    rng = random.Random(5)
+    queries = [" ".join(add_typo(rng, word) for word in query.split()) for query in context["queries"]]
+    context["mark_start"]()
+    latencies = timed_each(spelling.correct, queries * 5)
+    return {"items": len(latencies), "seconds": sum(latencies), "latencies": latencies}
+
+def get_query_builders():
+    from app.elasticsearch.search import (
+        build_basic_search,
+        build_facet_search,
+        build_fuzzy_search,
+        build_hybrid_body,
+        build_rrf_bodies,
+        build_semantic_body
+    )
+
+    return {
+        "basic": lambda query, vector: build_basic_search(query).to_dict(),
+        "fuzzy": lambda query, vector: build_fuzzy_search(query).to_dict(),
+        "faceted": lambda query, vector: build_facet_search(query, FILTERS).to_dict(),
+        "semantic": lambda query, vector: build_semantic_body(vector, FILTERS),
+        "hybrid": lambda query, vector: build_hybrid_body(query, vector, FILTERS),
+        "hybrid_rrf": lambda query, vector: build_rrf_bodies(query, vector, FILTERS)
+    }
+
+def make_build_stage(search_type):
+    def stage(context):
+        from app.services.embedding import get_text_embeddings
+
+        build = get_query_builders()[search_type]
+        pairs = list(zip(context["queries"], get_text_embeddings(context["queries"], workers=1)))
+        context["mark_start"]()
+        latencies = timed_each(lambda pair: build(*pair), pairs * 5)
+        return {"items": len(latencies), "seconds": sum(latencies), "latencies": latencies}
+    return stage
+
+def make_search_stage(search_type):
+    def stage(context):
+        from app.services.search import SearchService
+
+        async def run():
+            for query in context["queries"][:5]:
+                await SearchService.async_search(query, search_type, FILTERS, size=12)
+            context["mark_start"]()
+            latencies = []
+            # Distinct queries, so the query embedding cache does not hide the embedding cost
+            for i, query in enumerate(context["queries"]):
+                start = time.perf_counter()
+                await SearchService.async_search(f"{query} {i}", search_type, FILTERS, size=12)
+                latencies.append(time.perf_counter() - start)
+            return latencies
+
+        latencies = asyncio.run(run())
+        return {"items": len(latencies), "seconds": sum(latencies), "latencies": latencies}
+    return stage
+
+STAGES = {
+    "csv_load": stage_csv_load,
+    "group_documents": stage_group_documents,
+    "prepare_documents": stage_prepare_documents,
+    "embed_query": stage_embed_query,
+    "embed_batch": stage_embed_batch,
+    "preprocess_query": stage_preprocess_query,
+    "spell_correct": stage_spell_correct,
+    **{f"build_{search_type}": make_build_stage(search_type) for search_type in SEARCH_TYPES},
+    **{f"search_{search_type}": make_search_stage(search_type) for search_type in SEARCH_TYPES}
+}
+
+def get_rss_mb():
+    """Current RSS from /proc (Linux), or None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+def run_stage(name, args):
+    """Run one stage in this process and print its metrics as JSON"""
+    rss = {"start": get_rss_mb()}
+    context = {
+        "args": args,
+        "csv": args.csv,
+        "queries": make_queries(args.queries),
+        # Stages call this after their setup, so setup memory is not counted in rss_delta_mb
+        "mark_start": lambda: rss.update(start=get_rss_mb())
+    }
+    result = STAGES[name](context)
+
+    latencies = result.pop("latencies", None)
+    metrics = {
+        "items": result["items"],
+        "seconds": result["seconds"],
+        "throughput": result["items"] / result["seconds"] if result["seconds"] else None,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+    if rss["start"] is not None:
+        metrics["rss_delta_mb"] = metrics["peak_rss_mb"] - rss["start"]
+    if latencies:
+        latencies_ms = np.asarray(latencies) * 1000
+        for pct in (50, 95, 99):
+            metrics[f"p{pct}_ms"] = float(np.percentile(latencies_ms, pct))
+    print(json.dumps(metrics))
+
+def get_git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline, threshold):
+    """Print the change of each metric against the baseline; returns the regressions"""
+    regressions = []
+    print(f"\n{'stage':<20} {'metric':<12} {'baseline':>12} {'current':>12} {'change':>9}")
+    for stage, metrics in results["stages"].items():
+        old_metrics = baseline["stages"].get(stage)
+        if old_metrics is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = old_metrics.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            regressed = change < -threshold if higher_is_better else change > threshold
+            if regressed:
+                regressions.append((stage, metric, change))
+            print(f"{stage:<20} {metric:<12} {old:12.3f} {new:12.3f} {change:+8.1f}%{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+def print_results(results):
+    print(f"{'stage':<20} {'items':>9} {'items/s':>12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak RSS':>10}")
+    for stage, metrics in results["stages"].items():
+        percentiles = " ".join(f"{metrics[key]:9.3f}" if key in metrics else f"{'-':>9}"
+                               for key in ("p50_ms", "p95_ms", "p99_ms"))
+        print(f"{stage:<20} {metrics['items']:>9} {metrics['throughput'] or 0:12.1f} {percentiles} "
+              f"{metrics['peak_rss_mb']:9.1f}M")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", help=f"Comma separated stages (default all): {', '.join(STAGES)}")
+    parser.add_argument("--csv", help="Catalog CSV; a synthetic one is generated if omitted")
+    parser.add_argument("--products", type=int, default=20000, help="Synthetic products")
+    parser.add_argument("--reviews-per-product", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=500, help="Queries per query and search stage")
+    parser.add_argument("--batch-texts", type=int, default=2000, help="Texts embedded by embed_batch")
+    parser.add_argument("--backend", default="hash", help="Embedding backend (hash needs no model)")
+    parser.add_argument("--es-latency-ms", type=float, default=0.0, help="Delay added by the stub Elasticsearch")
+    parser.add_argument("--recordings", help="Replay Elasticsearch responses recorded with benchmarks.stub_es")
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Change in percent reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on a regression")
+    parser.add_argument("--run-stage", choices=list(STAGES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        run_stage(args.run_stage, args)
+        return
+
+    stages = args.stages.split(",") if args.stages else list(STAGES)
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(unknown)}")
+
+    recordings = Recordings(args.recordings) if args.recordings else None
+    server, port = start_stub_es(latency_ms=args.es_latency_ms, recordings=recordings)
+    results = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "git_commit": get_git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {key: value for key, value in vars(args).items() if key != "run_stage"}
+        },
+        "stages": {}
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = args.csv
+        if csv_path is None:
+            csv_path = write_synthetic_catalog(os.path.join(tmp, "data.csv"), args.products, args.reviews_per_product)
+        env = dict(
+            os.environ,
+            ELASTICSEARCH_HOST="127.0.0.1",
+            ELASTICSEARCH_PORT=str(port),
+            EMBEDDING_BACKEND=args.backend,
+            EMBEDDING_CACHE_PATH="",
+            RESULT_CACHE_BACKEND="none",
+            SEMANTIC_BACKEND="elasticsearch",
+            AUTOCOMPLETE_PATH=os.path.join(tmp, "autocomplete.json"),
+            AUTOCOMPLETE_QUERIES_PATH=os.path.join(tmp, "popular_queries.json"),
+            SPELLING_PATH=os.path.join(tmp, "spelling.json")
+        )
+
+        for stage in stages:
+            command = [sys.executable, "-m", "benchmarks.suite", "--run-stage", stage, "--csv", csv_path,
+                       "--queries", str(args.queries), "--batch-texts", str(args.batch_texts)]
+            completed = subprocess.run(command, env=env, capture_output=True, text=True)
+            if completed.returncode != 0:
+                print(f"Stage {stage} failed:\n{completed.stderr}")
+                continue
+            results["stages"][stage] = json.loads(completed.stdout.strip().splitlines()[-1])
+            print(f"{stage} done")
+    server.shutdown()
+
+    print()
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to '{args.output}'")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import csv
+import random
+
+# Columns of data.csv used by the indexer
+CSV_COLUMNS = [
+    "id", "name", "brand", "categories", "manufacturer",
+    "reviews.date", "reviews.rating", "reviews.text", "reviews.title", "reviews.username"
+]
+
+BRANDS = ["Amazon", "AmazonBasics", "Fire", "Kindle", "Echo", "Sandisk", "Anker", "Logitech"]
+CATEGORIES = [
+    "Electronics", "Tablets", "Fire Tablets", "Kindle E-readers", "Amazon Echo",
+    "Smart Home", "Batteries", "Health & Household", "Computers & Accessories", "Audio"
+]
+WORDS = (
+    "great product love easy use battery life screen fast slow charge kids gift price "
+    "quality sound speaker alexa music read book light weight works perfect recommend "
+    "bought second return broke cheap sturdy value setup wifi app display bright"
+).split()
+
+def random_sentence(rng, min_words, max_words):
+    """Build a random sentence from the synthetic vocabulary"""
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+def write_synthetic_csv(path, num_products=1000, reviews_per_product=5, seed=42):
+    """
+    Write a synthetic CSV with the same columns as data.csv.
+
+    Rows are written grouped by product id, like the real dataset.
+    """
+    rng = random.Random(seed)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for product in range(num_products):
+            brand = rng.choice(BRANDS)
+            categories = ",".join(rng.sample(CATEGORIES, rng.randint(1, 4)))
+            name = f"{brand} {random_sentence(rng, 2, 5)} {product}"
+            for review in range(rng.randint(1, 2 * reviews_per_product - 1)):
+                writer.writerow([
+                    f"P{product:08d}",
+                    name,
+                    brand,
+                    categories,
+                    "Amazon" if rng.random() < 0.8 else f"{brand} Inc.",
+                    f"2017-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00.000Z",
+                    float(rng.randint(1, 5)),
+                    random_sentence(rng, 10, 60),
+                    random_sentence(rng, 2, 6),
+                    f"user{rng.randint(0, 100000)}"
+                ])
+    return path
+
+def write_synthetic_catalog(path, num_products=100000, reviews_per_product=5, seed=42, chunk_products=20000,
+                            missing_rate=0.01):
+    """
+    Write a large synthetic CSV with the same columns as data.csv.
+
+    Rows are generated with NumPy one chunk of products at a time, and review
+    texts, titles and names are drawn from pools of synthetic sentences, so
+    millions of review rows take seconds and memory is bounded by the chunk.
+    A fraction of review titles and texts are left empty, like the real data.
+    Rows are grouped by product id.
+    """
+    import numpy as np
+    import pandas as pd
+
+    sentence_rng = random.Random(seed)
+    texts = np.array([random_sentence(sentence_rng, 10, 60) for _ in range(5000)], dtype=object)
+    titles = np.array([random_sentence(sentence_rng, 2, 6) for _ in range(1000)], dtype=object)
+    phrases = [random_sentence(sentence_rng, 2, 5) for _ in range(2000)]
+    category_sets = [",".join(sentence_rng.sample(CATEGORIES, sentence_rng.randint(1, 4))) for _ in range(200)]
+    dates = np.array([f"2017-{month:02d}-{day:02d}T00:00:00.000Z" for month in range(1, 13) for day in range(1, 29)],
+                     dtype=object)
+
+    rng = np.random.default_rng(seed)
+    with open(path, "w", newline="") as f:
+        for start in range(0, num_products, chunk_products):
+            products = range(start, min(start + chunk_products, num_products))
+            counts = rng.integers(1, 2 * reviews_per_product, len(products))
+            rows = int(counts.sum())
+
+            brands = [BRANDS[i] for i in rng.integers(0, len(BRANDS), len(products))]
+            phrase_ids = rng.integers(0, len(phrases), len(products))
+            category_ids = rng.integers(0, len(category_sets), len(products))
+            manufacturer_is_amazon = rng.random(len(products)) < 0.8
+
+            chunk = pd.DataFrame({
+                "id": np.repeat([f"P{product:08d}" for product in products], counts),
+                "name": np.repeat([f"{brand} {phrases[phrase]} {product}"
+                                   for brand, phrase, product in zip(brands, phrase_ids, products)], counts),
+                "brand": np.repeat(brands, counts),
+                "categories": np.repeat([category_sets[i] for i in category_ids], counts),
+                "manufacturer": np.repeat([
+                    "Amazon" if is_amazon else f"{brand} Inc."
+                    for brand, is_amazon in zip(brands, manufacturer_is_amazon)
+                ], counts),
+                "reviews.date": dates[rng.integers(0, len(dates), rows)],
+                "reviews.rating": rng.integers(1, 6, rows).astype(float),
+                "reviews.text": texts[rng.integers(0, len(texts), rows)],
+                "reviews.title": titles[rng.integers(0, len(titles), rows)],
+                "reviews.username": np.char.add("user", rng.integers(0, 100000, rows).astype(str))
+            }, columns=CSV_COLUMNS)
+            chunk.loc[rng.random(rows) < missing_rate, "reviews.title"] = None
+            chunk.loc[rng.random(rows) < missing_rate, "reviews.text"] = None
+
+            chunk.to_csv(f, header=(start == 0), index=False)
+    return path
@@ -0,0 +1,132 @@
+"""
+Bulk ingestion tests against an in-process client: 429 retries, dead letters
+and their replay. No cluster needed.
+
+    python -m pytest tests
+"""
+import threading
+
+import orjson
+import pytest
+
+pytest.importorskip("elasticsearch")
+
+from app.elasticsearch import bulk
+from app.elasticsearch.bulk import BulkIngestor, iter_dead_letters, replay_dead_letters
+
+class FakeIndices:
+    def __init__(self, aliases=None, indices=()):
+        self.aliases = aliases or {}
+        self.indices = set(indices) | {index for names in self.aliases.values() for index in names}
+
+    def exists_alias(self, name):
+        return name in self.aliases
+
+    def get_alias(self, name):
+        return {index: {"aliases": {name: {}}} for index in self.aliases[name]}
+
+    def exists(self, index):
+        return index in self.indices
+
+class FakeClient:
+    """
+    Answers bulk requests item by item: documents in rejections are rejected
+    with 429 that many times, documents in failures always fail with 400
+    """
+
+    def __init__(self, rejections=None, failures=(), indices=None):
+        self.rejections = dict(rejections or {})
+        self.failures = set(failures)
+        self.indices = indices or FakeIndices()
+        self.indexed = []
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def bulk(self, operations):
+        items = []
+        lines = iter(operations)
+        with self._lock:
+            self.requests += 1
+            for line in lines:
+                ((op_type, meta),) = orjson.loads(line).items()
+                if op_type != "delete":
+                    next(lines)
+                doc_id = meta["_id"]
+                if doc_id in self.failures:
+                    result = {"status": 400, "error": {"type": "mapper_parsing_exception"}}
+                elif self.rejections.get(doc_id, 0) > 0:
+                    self.rejections[doc_id] -= 1
+                    result = {"status": 429, "error": {"type": "es_rejected_execution_exception"}}
+                else:
+                    self.indexed.append((meta["_index"], doc_id))
+                    result = {"status": 201}
+                items.append({op_type: {"_index": meta["_index"], "_id": doc_id, **result}})
+        return {"errors": any("error" in next(iter(item.values())) for item in items), "items": items}
+
+def actions(index_name, doc_ids):
+    return [{"_index": index_name, "_id": doc_id, "_source": {"name": doc_id}} for doc_id in doc_ids]
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(bulk, "BULK_INITIAL_BACKOFF", 0.0)
+
+def test_rejected_documents_are_retried(tmp_path):
+    client = FakeClient(rejections={"b": 2})
+    dead_letters = tmp_path / "dead_letters.jsonl"
+    with BulkIngestor(client=client, thread_count=2, max_retries=3, dead_letter_path=str(dead_letters)) as ingestor:
+        ingestor.add_all(actions("products_v1", ["a", "b", "c"]))
+    report = ingestor.report()
+
+    assert sorted(doc_id for _, doc_id in client.indexed) == ["a", "b", "c"]
+    assert (report["indexed"], report["failed"], report["rejected"], report["retries"]) == (3, 0, 2, 2)
+    assert not dead_letters.exists()
+
+def test_failed_and_exhausted_documents_are_dead_lettered(tmp_path):
+    client = FakeClient(rejections={"b": 5}, failures={"c"})
+    dead_letters = tmp_path / "dead_letters.jsonl"
+    with BulkIngestor(client=client, thread_count=1, max_retries=1, dead_letter_path=str(dead_letters)) as ingestor:
+        ingestor.add_all(actions("products_v1", ["a", "b", "c"]))
+
+    assert ingestor.report()["failed"] == 2
+    entries = {entry["action"]["index"]["_id"]: entry for _, entry in iter_dead_letters(str(dead_letters))}
+    assert sorted(entries) == ["b", "c"]
+    assert entries["b"]["error"]["status"] == 429
+    assert entries["c"]["alias"] == "products"
+    assert entries["c"]["source"] == {"name": "c"}
+
+def test_replay_only_writes_to_the_live_index(tmp_path, monkeypatch):
+    dead_letters = tmp_path / "dead_letters.jsonl"
+    failing = FakeClient(failures={"live", "stale", "gone"})
+    with BulkIngestor(client=failing, thread_count=1, dead_letter_path=str(dead_letters)) as ingestor:
+        ingestor.add_all(actions("products_v2", ["live"]) + actions("products_v1", ["stale"])
+                         + actions("reviews_v1", ["gone"]))
+
+    client = FakeClient(indices=FakeIndices(aliases={"products": {"products_v2"}}, indices={"products_v1"}))
+    monkeypatch.setattr(bulk, "es_client", client)
+    report = replay_dead_letters(str(dead_letters), thread_count=1)
+
+    assert client.indexed == [("products_v2", "live")]
+    assert (report["indexed"], report["skipped"]) == (1, 2)
+    # Entries for the replaced and the deleted index are kept for a later replay
+    kept = sorted(entry["action"]["index"]["_id"] for _, entry in iter_dead_letters(str(dead_letters)))
+    assert kept == ["gone", "stale"]
+    assert not (tmp_path / "dead_letters.jsonl.replaying").exists()
+
+def test_interrupted_replay_is_merged(tmp_path, monkeypatch):
+    dead_letters = tmp_path / "dead_letters.jsonl"
+    with BulkIngestor(client=FakeClient(failures={"a", "b"}), thread_count=1,
+                      dead_letter_path=str(dead_letters)) as ingestor:
+        ingestor.add_all(actions("products_v1", ["a", "b"]))
+    lines = dead_letters.read_bytes().splitlines(keepends=True)
+    # One entry was left by an interrupted replay, the other failed since
+    (tmp_path / "dead_letters.jsonl.replaying").write_bytes(lines[0])
+    dead_letters.write_bytes(lines[1])
+
+    client = FakeClient(indices=FakeIndices(aliases={"products": {"products_v1"}}))
+    monkeypatch.setattr(bulk, "es_client", client)
+    report = replay_dead_letters(str(dead_letters), thread_count=1)
+
+    assert sorted(doc_id for _, doc_id in client.indexed) == ["a", "b"]
+    assert report["indexed"] == 2
+    assert not dead_letters.exists()
+    assert replay_dead_letters(str(dead_letters)) is None
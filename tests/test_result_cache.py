@@ -0,0 +1,99 @@
+"""
+Result cache tests against the in-process Redis stand-in; no server or cluster needed.
+
+    python -m pytest tests
+"""
+import asyncio
+import time
+
+from app.services.result_cache import LocalRedis, RedisBackend, ResultCache, create_redis_backend
+
+def make_cache(versions, ttl=60, version_check_seconds=60):
+    """A cache over LocalRedis whose index version is read from the versions list"""
+    calls = []
+
+    def version_provider():
+        calls.append("sync")
+        return versions[-1]
+
+    async def async_version_provider():
+        calls.append("async")
+        await asyncio.sleep(0)
+        return versions[-1]
+
+    cache = ResultCache(RedisBackend(LocalRedis()), ttl, version_provider, version_check_seconds,
+                        async_version_provider)
+    return cache, calls
+
+def test_local_redis_expires_and_scans():
+    client = LocalRedis()
+    client.set("search:a", "1", ex=60)
+    client.set("search:b", "2", ex=60)
+    client.set("other", "3")
+    assert client.get("search:a") == b"1"
+    assert sorted(client.scan_iter(match="search:*")) == ["search:a", "search:b"]
+
+    client._data["search:a"] = (b"1", time.monotonic() - 1)
+    assert client.get("search:a") is None
+    assert client.delete("search:b", "missing") == 1
+    assert list(client.scan_iter(match="search:*")) == []
+
+def test_memory_url_uses_local_redis():
+    backend = create_redis_backend("memory://")
+    assert isinstance(backend.client, LocalRedis)
+    backend.set("key", {"payload": [1, 2]}, ttl=60)
+    assert backend.get("key") == {"payload": [1, 2]}
+    assert len(backend) == 1
+    backend.clear()
+    assert len(backend) == 0
+
+def test_sync_get_and_put_round_trip_through_json():
+    cache, _ = make_cache(["v1"])
+    key = cache.make_key("kindle", "basic", {"brand": ["b", "a"]}, 10)
+    assert key == cache.make_key("kindle", "basic", {"brand": ["a", "b"]}, 10)
+    assert cache.get(key) is None
+    cache.put(key, {"results": [{"id": "1"}]}, cost=0.2)
+    assert cache.get(key) == {"results": [{"id": "1"}]}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+def test_async_path_uses_async_version_provider():
+    cache, calls = make_cache(["v1"])
+
+    async def run():
+        await cache.aput("key", {"results": []}, cost=0.1)
+        return await cache.aget("key")
+
+    assert asyncio.run(run()) == {"results": []}
+    assert calls == ["async"]
+
+def test_stale_version_is_refreshed_in_the_background():
+    versions = ["v1"]
+    cache, calls = make_cache(versions, version_check_seconds=0)
+
+    async def run():
+        await cache.aput("key", {"results": ["old"]}, cost=0.1)
+        versions.append("v2")
+        # The stale version answers while the refresh task runs
+        stale = await cache.aget("key")
+        await cache._version_task
+        fresh = await cache.aget("key")
+        return stale, fresh
+
+    stale, fresh = asyncio.run(run())
+    assert stale == {"results": ["old"]}
+    assert fresh is None
+    assert cache._version == "v2"
+    assert "sync" not in calls
+
+def test_version_errors_disable_the_cache():
+    async def failing_provider():
+        raise RuntimeError("cluster down")
+
+    cache = ResultCache(RedisBackend(LocalRedis()), 60, lambda: None, 60, failing_provider)
+
+    async def run():
+        await cache.aput("key", {"results": []}, cost=0.1)
+        return await cache.aget("key")
+
+    assert asyncio.run(run()) is None
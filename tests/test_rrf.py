@@ -0,0 +1,42 @@
+"""
+Reciprocal Rank Fusion and server-side RRF request tests; no cluster needed.
+
+    python -m pytest tests
+"""
+import pytest
+
+pytest.importorskip("elasticsearch_dsl")
+
+from app.elasticsearch.search import build_rrf_server_body, reciprocal_rank_fusion
+
+def hits(*ids):
+    return [{"_id": doc_id, "_score": 1.0, "_source": {"id": doc_id}} for doc_id in ids]
+
+def test_documents_in_both_lists_rank_first():
+    fused = reciprocal_rank_fusion([hits("a", "b", "c"), hits("c", "d", "a")], [1.0, 1.0], rank_constant=60, size=4)
+    assert [hit["_id"] for hit in fused] == ["a", "c", "b", "d"]
+    assert fused[0]["_score"] == pytest.approx(1 / 61 + 1 / 63)
+
+def test_weights_favor_one_ranking():
+    fused = reciprocal_rank_fusion([hits("a", "b"), hits("b", "a")], [1.0, 3.0], rank_constant=60, size=2)
+    assert [hit["_id"] for hit in fused] == ["b", "a"]
+
+def test_first_list_copy_of_a_hit_is_kept():
+    bm25 = [{"_id": "a", "_score": 9.0, "highlight": {"name": ["<strong>a</strong>"]}}]
+    knn = [{"_id": "a", "_score": 0.8}]
+    (fused,) = reciprocal_rank_fusion([bm25, knn], [1.0, 1.0], size=10)
+    assert fused["highlight"] == {"name": ["<strong>a</strong>"]}
+
+def test_size_limits_the_fused_hits():
+    assert len(reciprocal_rank_fusion([hits("a", "b", "c")], [1.0], size=2)) == 2
+    assert reciprocal_rank_fusion([[], []], [1.0, 1.0]) == []
+
+def test_server_body_has_no_paging_or_highlights():
+    body = build_rrf_server_body("kindle", [0.1] * 384, size=5)
+    assert "highlight" not in body and "from" not in body
+    assert body["size"] == 5
+    assert "knn" in body and "rrf" in body["rank"]
+
+def test_server_body_rejects_later_pages():
+    with pytest.raises(ValueError):
+        build_rrf_server_body("kindle", [0.1] * 384, size=5, from_=5)
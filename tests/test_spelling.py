@@ -0,0 +1,64 @@
+"""
+Spelling correction tests over small in-memory dictionaries.
+
+    python -m pytest tests
+"""
+from app.services.spelling import (
+    PRODUCT_TERM_WEIGHT,
+    SpellingBuilder,
+    SpellingCorrector,
+    edit_distance,
+    get_terms,
+    load_spelling
+)
+
+def make_corrector(**counts):
+    return SpellingCorrector(counts, max_distance=2, prefix_length=7)
+
+def test_edit_distance_counts_transpositions_as_one_edit():
+    assert edit_distance("kindle", "kindle", 2) == 0
+    assert edit_distance("kindel", "kindle", 2) == 1
+    assert edit_distance("chargr", "charger", 2) == 1
+    assert edit_distance("tablet", "xylophone", 2) == 3
+
+def test_misspelled_terms_are_corrected():
+    corrector = make_corrector(kindle=100, charger=50, paperwhite=20)
+    assert corrector.correct("kindel chargr") == "kindle charger"
+    assert corrector.correct("papervhite") == "paperwhite"
+
+def test_known_short_and_numeric_terms_are_kept():
+    corrector = make_corrector(kindle=100, fire=80, hd=10)
+    assert corrector.correct("kindle fire") == "kindle fire"
+    # Terms under three letters get no edits, and numbers and model codes are never corrected
+    assert corrector.correct("hx 8 kindle10") == "hx 8 kindle10"
+    assert corrector.correct("unknownword") == "unknownword"
+
+def test_short_terms_get_one_edit_only():
+    corrector = make_corrector(case=100)
+    assert corrector.correct("cse") == "case"
+    assert corrector.correct("cxxe") == "cxxe"
+    assert corrector.correct("cx") == "cx"
+
+def test_closer_terms_win_before_frequent_ones():
+    corrector = make_corrector(table=1000, tablet=5)
+    assert corrector.correct("tablett") == "tablet"
+    # Same distance: the more frequent term wins
+    assert make_corrector(cable=10, table=1000).correct("xable") == "table"
+
+def test_builder_weights_product_fields_and_drops_rare_review_terms(tmp_path):
+    builder = SpellingBuilder()
+    builder.add({"name": "Kindle Paperwhite", "brand": "Amazon", "manufacturer": "Amazon",
+                 "categories": ["E-Readers"],
+                 "reviews": [{"title": "Great readr", "text": "great screen"}, {"title": None, "text": 5}]})
+    assert builder.counts["kindle"] == PRODUCT_TERM_WEIGHT
+    assert builder.counts["great"] == 2
+
+    path = str(tmp_path / "spelling.json")
+    builder.save(path, min_count=2)
+    corrector = load_spelling(path)
+    assert "readr" not in corrector.counts
+    assert corrector.correct("kindel") == "kindle"
+
+def test_get_terms_keeps_letter_only_words():
+    assert get_terms("Fire HD 8, kid's edition 2nd-gen") == ["fire", "hd", "kid's", "edition", "gen"]
+    assert get_terms(None) == []
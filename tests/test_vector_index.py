@@ -0,0 +1,98 @@
+"""
+Local vector index tests: exact and IVF search, filters and rebuilds on disk.
+
+    python -m pytest tests
+"""
+import os
+
+import numpy as np
+import pytest
+
+from app.services.vector_index import VectorIndexBuilder, VectorIndex
+
+PRODUCTS = [
+    # id, brand, categories, avg_rating
+    ("p0", "amazon", ["Tablets", "Electronics"], 4.5),
+    ("p1", "amazon", ["Electronics", "Tablets"], 3.0),
+    ("p2", "sony", ["Headphones"], 4.8),
+    ("p3", "sony", ["Electronics"], None),
+    ("p4", "bose", ["Headphones", "Electronics"], 2.0),
+    ("p5", "bose", ["Speakers"], 4.1),
+]
+
+def make_builder(tmp_path, products=PRODUCTS, dims=8, seed=0):
+    """A builder over products with random vectors; returns it with the vectors"""
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(len(products), dims)).astype(np.float32)
+    builder = VectorIndexBuilder(sources_path=str(tmp_path / "sources.jsonl"))
+    for (doc_id, brand, categories, avg_rating), vector in zip(products, vectors):
+        builder.add({"id": doc_id, "name": f"name {doc_id}", "brand": brand, "manufacturer": brand,
+                     "categories": categories, "avg_rating": avg_rating, "text_vector": vector})
+    return builder, vectors
+
+def result_ids(index, results):
+    return [index.ids[position] for position, _ in results]
+
+def test_exact_search_ranks_by_cosine(tmp_path):
+    builder, vectors = make_builder(tmp_path)
+    index = builder.build()
+    results = index.search(vectors[2] * 3, k=3, mode="exact")
+    assert result_ids(index, results)[0] == "p2"
+    assert results[0][1] == pytest.approx(1.0, abs=1e-5)
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+
+def test_filters_match_semantic_search(tmp_path):
+    index = make_builder(tmp_path)[0].build()
+    query = np.ones(8)
+
+    def matching(filters):
+        return sorted(result_ids(index, index.search(query, k=10, filters=filters, mode="exact")))
+
+    assert matching({"brand": ["sony"]}) == ["p2", "p3"]
+    assert matching({"categories": ["Headphones"]}) == ["p2", "p4"]
+    assert matching({"primary_category": ["Electronics"]}) == ["p1", "p3"]
+    # Unrated products never match a rating range
+    assert matching({"avg_rating": {"range": {"gte": 4.0}}}) == ["p0", "p2", "p5"]
+    assert matching({"brand": ["bose"], "avg_rating": {"range": {"gte": 4.0, "lte": 5.0}}}) == ["p5"]
+    assert matching({"brand": ["unknown"]}) == []
+
+def test_ivf_probing_every_list_matches_exact_search(tmp_path):
+    products = [(f"p{i}", "b", ["c"], 4.0) for i in range(200)]
+    builder, vectors = make_builder(tmp_path, products, dims=16)
+    index = builder.build()
+    index.build_ivf(8)
+    assert index.list_offsets[-1] == len(index)
+
+    query = vectors[17]
+    exact = index.search(query, k=10, mode="exact")
+    assert index.search(query, k=10, mode="ivf", nprobe=8) == exact
+    # One probe still finds the query's own vector, which sits in its closest list
+    assert result_ids(index, index.search(query, k=1, mode="ivf", nprobe=1)) == ["p17"]
+
+def test_saved_index_loads_and_serves_sources(tmp_path):
+    builder, vectors = make_builder(tmp_path)
+    path = str(tmp_path / "vector_index")
+    builder.save(path)
+    index = VectorIndex.load(path)
+    (hit,) = index.to_hits(index.search(vectors[4], k=1, mode="exact"))
+    assert hit["_id"] == "p4"
+    assert hit["_source"]["name"] == "name p4"
+    assert hit["_score"] == pytest.approx(1.0, abs=1e-5)
+
+def test_loaded_index_keeps_reading_its_version_after_a_rebuild(tmp_path):
+    path = str(tmp_path / "vector_index")
+    builder, vectors = make_builder(tmp_path)
+    builder.save(path)
+    old = VectorIndex.load(os.path.realpath(path))
+
+    reordered = [(f"new-{doc_id}", *rest) for doc_id, *rest in reversed(PRODUCTS)]
+    make_builder(tmp_path, reordered, seed=1)[0].save(path)
+    make_builder(tmp_path, reordered, seed=1)[0].save(path)
+    new = VectorIndex.load(os.path.realpath(path))
+    # The second rebuild deleted the old version's directory
+    assert not os.path.exists(old.sources_path)
+
+    (old_hit,) = old.to_hits(old.search(vectors[0], k=1, mode="exact"))
+    assert old_hit["_source"]["name"] == "name p0"
+    assert new.ids[0] == "new-p5"
+    assert os.path.islink(path)